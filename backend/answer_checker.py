@@ -0,0 +1,214 @@
+import ast
+import math
+import operator
+import random
+import re
+from fractions import Fraction
+from typing import Optional
+
+# Local answer checking for problems with an answer key (problem_bank.py).
+#
+# check_answer() returns True/False when the answer can be checked mechanically
+# and None when it can't (free-text explanations, word answers that aren't an
+# exact match, unparseable input) - verifier_node sends those to the LLM.
+#
+# Handles:
+#   numbers      42, -3.5, 1,250, $12, 45%, 12 cm (a number key wants a number back:
+#                "3 + 2" for a key of 5, a dropped % or a rounded decimal go to the LLM)
+#   fractions    3/4, 1 3/4 (mixed), 6/8 == 3/4 == 0.75
+#   expressions  2*3+1, 2(x+3) == 2x+6 (compared at random points)
+#   assignments  x = 4 vs 4
+#   choices      b, (B), c) ... against a letter key
+#   yes/no       true/false, yes/no
+#
+# Answers longer than MAX_ANSWER_CHARS, or expressions whose numbers grow past
+# MAX_BITS (9^99^99...), go to the LLM instead of being evaluated.
+
+REL_TOLERANCE = 1e-6
+ABS_TOLERANCE = 1e-9
+# Points an expression with variables is evaluated at
+SAMPLE_POINTS = 5
+MAX_ANSWER_CHARS = 200
+# Largest numerator/denominator (in bits) an intermediate result may have
+MAX_BITS = 4096
+
+_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Pow: operator.pow,
+}
+
+_BOOLEANS = {"true": True, "yes": True, "false": False, "no": False}
+
+def _clean(text: str) -> str:
+    text = str(text).strip().lower()
+    text = re.sub(r"^(the )?(final )?answer( is)?\s*:?\s*", "", text)
+    text = text.strip().rstrip(".!")
+    return text.strip()
+
+def _choice(text: str, labelled: bool = False) -> Optional[str]:
+    m = re.match(r"^\(?([a-e])\)?[.)]?$", text)
+    if m:
+        return m.group(1)
+    # Keys may carry the option text: "b) triangle"
+    m = re.match(r"^\(?([a-e])[.)]\s+\S", text)
+    if labelled and m:
+        return m.group(1)
+    # "option b" / "choice c"
+    m = re.match(r"^(option|choice)\s+\(?([a-e])\)?$", text)
+    return m.group(2) if m else None
+
+def _strip_assignment(text: str) -> str:
+    # "x = 4" -> "4" (only a single variable on the left)
+    m = re.match(r"^[a-z]\s*=\s*(.+)$", text)
+    return m.group(1) if m else text
+
+def _unit(text: str) -> str:
+    # Single letters only count as units after a space and if they aren't usual variables ("12 m", not "2x")
+    m = re.match(r"^\$?[-+]?[\d.,/\s]+?(?:\s*([a-z]{2,12}\.?|°)|\s+([mglsh]))$", text)
+    return (m.group(1) or m.group(2)).rstrip(".") if m else ""
+
+def _strip_units(text: str) -> str:
+    text = text.replace("$", "")
+    text = re.sub(r"(?<=\d),(?=\d{3}\b)", "", text)  # 1,250
+    # Trailing unit word: "12 cm", "5 apples"
+    unit = _unit(text)
+    if unit:
+        text = text[:text.rfind(unit)].strip()
+    return text
+
+def _to_expr(text: str) -> str:
+    text = text.replace("^", "**").replace("×", "*").replace("÷", "/").replace("−", "-")
+    # Mixed numbers: "1 3/4" -> "(1+3/4)"
+    text = re.sub(r"(?<![\d.])(\d+)\s+(\d+)\s*/\s*(\d+)", r"(\1+\2/\3)", text)
+    # Implicit multiplication: 2x, 2(x+1), (x+1)(x-1), x(x+1)
+    text = re.sub(r"(\d|\))\s*(?=[a-z(])", r"\1*", text)
+    text = re.sub(r"(?<![a-z])([a-z])\s*(?=\()", r"\1*", text)
+    return text
+
+def _eval(node, env):
+    if isinstance(node, ast.Expression):
+        return _eval(node.body, env)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return Fraction(node.value) if isinstance(node.value, int) else node.value
+    if isinstance(node, ast.Name) and len(node.id) == 1:
+        return env[node.id]
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        value = _eval(node.operand, env)
+        return -value if isinstance(node.op, ast.USub) else value
+    if isinstance(node, ast.BinOp) and type(node.op) in _OPS:
+        left, right = _eval(node.left, env), _eval(node.right, env)
+        if isinstance(node.op, ast.Pow) and abs(right) > 100:
+            raise ValueError("exponent too large")
+        if isinstance(node.op, ast.Pow) and isinstance(left, Fraction) and \
+                max(left.numerator.bit_length(), left.denominator.bit_length()) * abs(right) > MAX_BITS:
+            raise ValueError("result too large")
+        return _check_size(_OPS[type(node.op)](left, right))
+    raise ValueError(f"unsupported syntax: {type(node).__name__}")
+
+def _check_size(value):
+    if isinstance(value, Fraction) and max(value.numerator.bit_length(), value.denominator.bit_length()) > MAX_BITS:
+        raise ValueError("result too large")
+    return value
+
+def _parse(text: str):
+    """(ast, variable names) for a numeric/algebraic answer, or None."""
+    text = _strip_units(_strip_assignment(text))
+    percent = text.endswith("%")
+    if percent:
+        text = text[:-1].strip()
+    if not text or not re.fullmatch(r"[\d\sa-z+\-*/^().×÷−]+", text):
+        return None
+    try:
+        tree = ast.parse(_to_expr(text), mode="eval")
+    except SyntaxError:
+        return None
+    if percent:
+        tree = ast.Expression(body=ast.BinOp(left=tree.body, op=ast.Div(), right=ast.Constant(100)))
+    names = {n.id for n in ast.walk(tree) if isinstance(n, ast.Name)}
+    if any(len(n) != 1 for n in names):
+        return None
+    return tree, names
+
+def _number_text(text: str) -> str:
+    text = _strip_units(_strip_assignment(text)).replace("−", "-")
+    return text[:-1].strip() if text.endswith("%") else text
+
+def _literal(text: str) -> bool:
+    """Plain number, fraction or mixed number ("12", "-3.5", "3/4", "1 3/4", "45%")."""
+    return bool(re.fullmatch(r"[-+]?(\d+\s+)?(\d*\.?\d+)(\s*/\s*\d+)?", _number_text(text)))
+
+def _rounded(key, given: str) -> bool:
+    """True if the given decimal is the key rounded to that many places (1/3 vs 0.333)."""
+    m = re.fullmatch(r"[-+]?\d*\.(\d+)", _number_text(given))
+    key_tree, key_vars = key
+    if not m or key_vars:
+        return False
+    try:
+        value = Fraction(_eval(key_tree, {}))
+    except (ValueError, OverflowError, ZeroDivisionError, TypeError):
+        return False
+    scale = 10 ** len(m.group(1))
+    rounded = math.floor(abs(value) * scale + Fraction(1, 2)) / Fraction(scale)
+    return rounded == abs(Fraction(_number_text(given))) and (value < 0) == _number_text(given).startswith("-")
+
+def _close(a, b) -> bool:
+    return math.isclose(float(a), float(b), rel_tol=REL_TOLERANCE, abs_tol=ABS_TOLERANCE)
+
+def _equivalent(key, answer) -> Optional[bool]:
+    key_tree, key_vars = key
+    answer_tree, answer_vars = answer
+    names = sorted(key_vars | answer_vars)
+    rng = random.Random(0)  # same points every run
+    try:
+        for _ in range(SAMPLE_POINTS if names else 1):
+            env = {n: Fraction(rng.randint(2, 97), rng.randint(1, 13)) for n in names}
+            if not _close(_eval(key_tree, env), _eval(answer_tree, env)):
+                return False
+    except ZeroDivisionError:
+        return None
+    except (ValueError, OverflowError, KeyError, TypeError):
+        return None
+    return True
+
+def check_answer(expected: str, answer: str) -> Optional[bool]:
+    """True/False if the answer can be checked against the key locally, else None."""
+    if not expected or not answer:
+        return None
+    if len(str(expected)) > MAX_ANSWER_CHARS or len(str(answer)) > MAX_ANSWER_CHARS:
+        return None
+    key, given = _clean(expected), _clean(answer)
+    if not key or not given:
+        return None
+
+    key_choice = _choice(key, labelled=True)
+    if key_choice:
+        given_choice = _choice(given)
+        return given_choice == key_choice if given_choice else None
+
+    if key in _BOOLEANS:
+        return _BOOLEANS[key] == _BOOLEANS[given] if given in _BOOLEANS else None
+
+    # "12 cm" vs "12 m" needs judgement; a missing unit is fine
+    key_unit, given_unit = _unit(key), _unit(given)
+    if key_unit and given_unit and key_unit != given_unit:
+        return None
+
+    key_expr = _parse(key)
+    if key_expr:
+        given_expr = _parse(given)
+        if not given_expr:
+            return None
+        # A number key wants a number back; "3 + 2" may just be the question repeated
+        if _literal(key) and not _literal(given):
+            return None
+        verdict = _equivalent(key_expr, given_expr)
+        # "10" for 10% or 0.333 for 1/3 may be right in the student's terms: let the LLM judge
+        if verdict is False and (key.endswith("%") != given.endswith("%") or _rounded(key_expr, given)):
+            return None
+        return verdict
+
+    # Word answers: an exact match is right, anything else needs judgement
+    return True if key == given else None
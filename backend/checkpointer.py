@@ -0,0 +1,299 @@
+import asyncio
+import datetime
+import os
+from typing import Iterator, AsyncIterator, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+from langgraph.checkpoint.memory import MemorySaver
+from sqlalchemy import select, delete, func
+
+from .database import engine, async_engine, GraphCheckpoint, GraphCheckpointWrite
+
+# Graph session state stored in the app database (DATABASE_URL) instead of process
+# memory, so sessions survive restarts and can be served by any worker.
+#
+# Bounded in two ways:
+#   - each thread keeps only its newest CHECKPOINT_MAX_PER_THREAD checkpoints
+#     (older ones and their writes are dropped on every put)
+#   - threads with no new checkpoint for CHECKPOINT_TTL_SECONDS are evicted by
+#     the periodic sweep started in main.lifespan
+#
+# Every checkpoint row stores the full channel values, so dropping older rows never
+# breaks the ones that remain. This graph has no DeltaChannel state.
+#
+# Env:
+#   CHECKPOINT_BACKEND        - "sql" (default) or "memory" (old MemorySaver behaviour)
+#   CHECKPOINT_MAX_PER_THREAD - default 5
+#   CHECKPOINT_TTL_SECONDS    - default 6 hours
+#   CHECKPOINT_SWEEP_SECONDS  - default 10 minutes
+
+CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "sql").lower()
+CHECKPOINT_MAX_PER_THREAD = int(os.getenv("CHECKPOINT_MAX_PER_THREAD", "5"))
+CHECKPOINT_TTL_SECONDS = float(os.getenv("CHECKPOINT_TTL_SECONDS", str(6 * 3600)))
+CHECKPOINT_SWEEP_SECONDS = float(os.getenv("CHECKPOINT_SWEEP_SECONDS", "600"))
+
+checkpoints_t = GraphCheckpoint.__table__
+writes_t = GraphCheckpointWrite.__table__
+
+class SQLCheckpointSaver(BaseCheckpointSaver):
+    """
+    LangGraph checkpointer on SQLAlchemy. Sync methods use the sync engine, async
+    methods the async engine; both run the same connection-level functions below.
+    """
+
+    def __init__(self, sync_engine=None, aio_engine=None, max_per_thread: int = CHECKPOINT_MAX_PER_THREAD,
+                 ttl_seconds: float = CHECKPOINT_TTL_SECONDS, serde=None):
+        super().__init__(serde=serde)
+        self.sync_engine = sync_engine or engine
+        self.aio_engine = aio_engine or async_engine
+        self.max_per_thread = max_per_thread
+        self.ttl_seconds = ttl_seconds
+
+    # --- Connection-level operations (shared by sync and async paths) ---
+
+    def _config(self, thread_id, checkpoint_ns, checkpoint_id):
+        if not checkpoint_id:
+            return None
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}}
+
+    def _pending_writes(self, conn, thread_id, checkpoint_ns, checkpoint_id):
+        rows = conn.execute(select(writes_t).where(
+            writes_t.c.thread_id == thread_id,
+            writes_t.c.checkpoint_ns == checkpoint_ns,
+            writes_t.c.checkpoint_id == checkpoint_id
+        )).all()
+        rows.sort(key=lambda r: writes_sort_key(r.task_path or "", r.task_id, r.idx))
+        return [(r.task_id, r.channel, self.serde.loads_typed((r.value_type, r.value))) for r in rows]
+
+    def _to_tuple(self, conn, row) -> CheckpointTuple:
+        return CheckpointTuple(
+            config=self._config(row.thread_id, row.checkpoint_ns, row.checkpoint_id),
+            checkpoint=self.serde.loads_typed((row.checkpoint_type, row.checkpoint)),
+            metadata=self.serde.loads_typed((row.meta_type, row.meta)),
+            parent_config=self._config(row.thread_id, row.checkpoint_ns, row.parent_checkpoint_id),
+            pending_writes=self._pending_writes(conn, row.thread_id, row.checkpoint_ns, row.checkpoint_id),
+        )
+
+    def _get_tuple(self, conn, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        q = select(checkpoints_t).where(
+            checkpoints_t.c.thread_id == thread_id,
+            checkpoints_t.c.checkpoint_ns == checkpoint_ns
+        )
+        if checkpoint_id := get_checkpoint_id(config):
+            q = q.where(checkpoints_t.c.checkpoint_id == checkpoint_id)
+        else:
+            q = q.order_by(checkpoints_t.c.checkpoint_id.desc()).limit(1)
+        row = conn.execute(q).first()
+        return self._to_tuple(conn, row) if row else None
+
+    def _list(self, conn, config, filter, before, limit) -> list:
+        q = select(checkpoints_t)
+        if config:
+            q = q.where(checkpoints_t.c.thread_id == config["configurable"]["thread_id"])
+            if (ns := config["configurable"].get("checkpoint_ns")) is not None:
+                q = q.where(checkpoints_t.c.checkpoint_ns == ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                q = q.where(checkpoints_t.c.checkpoint_id == checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            q = q.where(checkpoints_t.c.checkpoint_id < before_id)
+        q = q.order_by(checkpoints_t.c.thread_id, checkpoints_t.c.checkpoint_ns, checkpoints_t.c.checkpoint_id.desc())
+
+        result = []
+        for row in conn.execute(q):
+            if limit is not None and len(result) >= limit:
+                break
+            tup = self._to_tuple(conn, row)
+            if filter and not all(tup.metadata.get(k) == v for k, v in filter.items()):
+                continue
+            result.append(tup)
+        return result
+
+    def _put(self, conn, config, checkpoint, metadata) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_type, checkpoint_blob = self.serde.dumps_typed(checkpoint)
+        meta_type, meta_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+
+        key = (
+            checkpoints_t.c.thread_id == thread_id,
+            checkpoints_t.c.checkpoint_ns == checkpoint_ns,
+            checkpoints_t.c.checkpoint_id == checkpoint["id"],
+        )
+        conn.execute(delete(checkpoints_t).where(*key))
+        conn.execute(checkpoints_t.insert().values(
+            thread_id=thread_id,
+            checkpoint_ns=checkpoint_ns,
+            checkpoint_id=checkpoint["id"],
+            parent_checkpoint_id=config["configurable"].get("checkpoint_id"),
+            checkpoint_type=checkpoint_type,
+            checkpoint=checkpoint_blob,
+            meta_type=meta_type,
+            meta=meta_blob,
+            created_at=datetime.datetime.utcnow(),
+        ))
+        self._trim(conn, thread_id, checkpoint_ns)
+        return self._config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    def _trim(self, conn, thread_id, checkpoint_ns) -> int:
+        # Compaction: keep the newest max_per_thread checkpoints for this thread/namespace
+        stale = [r[0] for r in conn.execute(
+            select(checkpoints_t.c.checkpoint_id).where(
+                checkpoints_t.c.thread_id == thread_id,
+                checkpoints_t.c.checkpoint_ns == checkpoint_ns
+            ).order_by(checkpoints_t.c.checkpoint_id.desc()).offset(self.max_per_thread)
+        )]
+        if stale:
+            conn.execute(delete(writes_t).where(
+                writes_t.c.thread_id == thread_id,
+                writes_t.c.checkpoint_ns == checkpoint_ns,
+                writes_t.c.checkpoint_id.in_(stale)
+            ))
+            conn.execute(delete(checkpoints_t).where(
+                checkpoints_t.c.thread_id == thread_id,
+                checkpoints_t.c.checkpoint_ns == checkpoint_ns,
+                checkpoints_t.c.checkpoint_id.in_(stale)
+            ))
+        return len(stale)
+
+    def _put_writes(self, conn, config, writes, task_id, task_path):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        key = (
+            writes_t.c.thread_id == thread_id,
+            writes_t.c.checkpoint_ns == checkpoint_ns,
+            writes_t.c.checkpoint_id == checkpoint_id,
+            writes_t.c.task_id == task_id,
+        )
+        existing = {r[0] for r in conn.execute(select(writes_t.c.idx).where(*key))}
+
+        rows = []
+        for i, (channel, value) in enumerate(writes):
+            idx = WRITES_IDX_MAP.get(channel, i)
+            if idx in existing:
+                # Regular writes are insert-once; special writes (negative idx) replace
+                if idx >= 0:
+                    continue
+                conn.execute(delete(writes_t).where(*key, writes_t.c.idx == idx))
+            value_type, value_blob = self.serde.dumps_typed(value)
+            rows.append({
+                "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id,
+                "task_id": task_id, "task_path": task_path, "idx": idx, "channel": channel,
+                "value_type": value_type, "value": value_blob,
+            })
+        if rows:
+            conn.execute(writes_t.insert(), rows)
+
+    def _delete_threads(self, conn, thread_ids) -> int:
+        if not thread_ids:
+            return 0
+        conn.execute(delete(writes_t).where(writes_t.c.thread_id.in_(thread_ids)))
+        conn.execute(delete(checkpoints_t).where(checkpoints_t.c.thread_id.in_(thread_ids)))
+        return len(thread_ids)
+
+    def _evict_idle(self, conn, ttl_seconds) -> int:
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=ttl_seconds)
+        idle = [r[0] for r in conn.execute(
+            select(checkpoints_t.c.thread_id).group_by(checkpoints_t.c.thread_id)
+            .having(func.max(checkpoints_t.c.created_at) < cutoff)
+        )]
+        return self._delete_threads(conn, idle)
+
+    def _compact_all(self, conn) -> int:
+        over = conn.execute(
+            select(checkpoints_t.c.thread_id, checkpoints_t.c.checkpoint_ns)
+            .group_by(checkpoints_t.c.thread_id, checkpoints_t.c.checkpoint_ns)
+            .having(func.count() > self.max_per_thread)
+        ).all()
+        return sum(self._trim(conn, thread_id, ns) for thread_id, ns in over)
+
+    # --- Sync API ---
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        with self.sync_engine.connect() as conn:
+            return self._get_tuple(conn, config)
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[dict] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        with self.sync_engine.connect() as conn:
+            items = self._list(conn, config, filter, before, limit)
+        yield from items
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        with self.sync_engine.begin() as conn:
+            return self._put(conn, config, checkpoint, metadata)
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple], task_id: str, task_path: str = "") -> None:
+        with self.sync_engine.begin() as conn:
+            self._put_writes(conn, config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self.sync_engine.begin() as conn:
+            self._delete_threads(conn, [thread_id])
+
+    # --- Async API (used by graph.ainvoke / aget_state / aupdate_state) ---
+
+    async def _arun(self, fn, *args, write: bool = False):
+        if write:
+            async with self.aio_engine.begin() as conn:
+                return await conn.run_sync(fn, *args)
+        async with self.aio_engine.connect() as conn:
+            return await conn.run_sync(fn, *args)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await self._arun(self._get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[dict] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        for item in await self._arun(self._list, config, filter, before, limit):
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await self._arun(self._put, config, checkpoint, metadata, write=True)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple], task_id: str, task_path: str = "") -> None:
+        await self._arun(self._put_writes, config, writes, task_id, task_path, write=True)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await self._arun(self._delete_threads, [thread_id], write=True)
+
+    # --- Maintenance ---
+
+    async def asweep(self) -> dict:
+        """Evicts idle threads and trims any thread over the per-thread cap."""
+        evicted = await self._arun(self._evict_idle, self.ttl_seconds, write=True)
+        trimmed = await self._arun(self._compact_all, write=True)
+        if evicted or trimmed:
+            print(f"[Checkpointer] Evicted {evicted} idle sessions, compacted {trimmed} old checkpoints.")
+        return {"evicted_threads": evicted, "trimmed_checkpoints": trimmed}
+
+def create_checkpointer():
+    if CHECKPOINT_BACKEND == "memory":
+        return MemorySaver()
+    return SQLCheckpointSaver()
+
+async def run_checkpoint_sweeper(checkpointer, interval: float = CHECKPOINT_SWEEP_SECONDS):
+    """Background task for lifespan: periodic TTL eviction + compaction."""
+    if not isinstance(checkpointer, SQLCheckpointSaver):
+        return
+    while True:
+        try:
+            await checkpointer.asweep()
+        except Exception as e:
+            print(f"[Checkpointer] Sweep failed: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,139 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from langchain_core.messages import BaseMessage, HumanMessage, RemoveMessage, SystemMessage
+
+from .llm import ainvoke_llm, get_llm
+from .prompts import SUMMARY_PROMPT
+
+# Token-budgeted context for the agent nodes.
+#
+# Each node gets the most recent messages that fit its budget, prefixed by the
+# rolling summary of older turns. When the whole history grows past
+# HISTORY_MAX_TOKENS the supervisor folds the oldest messages into the summary
+# (gpt-4o-mini) and removes them from the state, so prompts and checkpoints stay
+# bounded however long a session runs.
+#
+# Token counts use tiktoken when its encoding is available, else ~4 chars/token,
+# and are cached per message content.
+#
+# Env:
+#   CONTEXT_BUDGET_<NODE>   - per-node budget, e.g. CONTEXT_BUDGET_TEACHER=3000
+#   HISTORY_MAX_TOKENS      - history size that triggers summarization (default 6000)
+#   HISTORY_KEEP_TOKENS     - recent history kept verbatim when summarizing (default 2500)
+
+DEFAULT_BUDGETS = {
+    "teacher": 3000,
+    "problem_generator": 1000,
+    "adapter": 1500,
+    "general_chat": 3000,
+}
+
+HISTORY_MAX_TOKENS = int(os.getenv("HISTORY_MAX_TOKENS", "6000"))
+HISTORY_KEEP_TOKENS = int(os.getenv("HISTORY_KEEP_TOKENS", "2500"))
+# Never summarize away the last exchange or two
+MIN_KEEP_MESSAGES = 4
+SUMMARY_MAX_WORDS = 250
+
+# Per-message framing overhead in the chat format
+MESSAGE_OVERHEAD = 4
+TOKEN_CACHE_SIZE = 10000
+
+_encoding = None
+_encoding_loaded = False
+_token_cache: "OrderedDict[str, int]" = OrderedDict()
+_token_cache_lock = threading.Lock()
+
+def budget_for(node: str) -> int:
+    return int(os.getenv(f"CONTEXT_BUDGET_{node.upper()}", DEFAULT_BUDGETS.get(node, 2000)))
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            print(f"[Context] tiktoken unavailable, estimating tokens from length: {e}")
+    return _encoding
+
+def count_text_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+def count_tokens(message: BaseMessage) -> int:
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    key = hashlib.sha1(content.encode()).hexdigest()
+    with _token_cache_lock:
+        n = _token_cache.get(key)
+        if n is not None:
+            _token_cache.move_to_end(key)
+            return n
+    n = count_text_tokens(content) + MESSAGE_OVERHEAD
+    with _token_cache_lock:
+        _token_cache[key] = n
+        while len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+    return n
+
+def recent_messages(messages: List[BaseMessage], budget: int) -> List[BaseMessage]:
+    """Longest suffix of messages within budget (the last message is always kept)."""
+    kept, used = [], 0
+    for m in reversed(messages):
+        n = count_tokens(m)
+        if kept and used + n > budget:
+            break
+        kept.append(m)
+        used += n
+    return kept[::-1]
+
+def summary_message(summary: Optional[str]) -> Optional[SystemMessage]:
+    if not summary:
+        return None
+    return SystemMessage(content=f"Summary of the earlier conversation:\n{summary}")
+
+def build_context(messages: List[BaseMessage], node: str, summary: Optional[str] = None) -> List[BaseMessage]:
+    """Summary (if any) + recent messages, within the node's token budget."""
+    budget = budget_for(node)
+    head = summary_message(summary)
+    if head is not None:
+        budget -= count_tokens(head)
+    recent = recent_messages(messages, max(budget, 0))
+    return [head] + recent if head is not None else recent
+
+def transcript(messages: List[BaseMessage]) -> str:
+    lines = []
+    for m in messages:
+        role = "Student" if isinstance(m, HumanMessage) else "Agent"
+        lines.append(f"{role}: {m.content}")
+    return "\n".join(lines)
+
+async def compact_history(messages: List[BaseMessage], summary: Optional[str] = None) -> Dict:
+    """
+    State update folding old messages into the rolling summary, or {} while the
+    history is still under HISTORY_MAX_TOKENS. Needs message ids (add_messages).
+    """
+    if sum(count_tokens(m) for m in messages) <= HISTORY_MAX_TOKENS:
+        return {}
+
+    keep = recent_messages(messages, HISTORY_KEEP_TOKENS)
+    if len(keep) < MIN_KEEP_MESSAGES:
+        keep = messages[-MIN_KEEP_MESSAGES:]
+    old = [m for m in messages[:len(messages) - len(keep)] if m.id]
+    if not old:
+        return {}
+
+    prompt = SUMMARY_PROMPT.format(
+        summary=summary or "(none yet)",
+        transcript=transcript(old),
+        max_words=SUMMARY_MAX_WORDS,
+    )
+    response = await ainvoke_llm(get_llm("gpt-4o-mini", temperature=0), [SystemMessage(content=prompt)])
+    print(f"[Context] Summarized {len(old)} messages, keeping {len(keep)}")
+    return {"summary": response.content.strip(), "messages": [RemoveMessage(id=m.id) for m in old]}
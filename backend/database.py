@@ -1,9 +1,15 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, ForeignKey, JSON, DateTime
+from sqlalchemy import create_engine, Column, Integer, String, Text, ForeignKey, JSON, DateTime, LargeBinary, UniqueConstraint, insert, select, inspect, text
 from sqlalchemy.orm import sessionmaker, declarative_base, relationship
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 import datetime
 
 import os
 
+try:
+    from .metrics import instrument_engine
+except ImportError:
+    from metrics import instrument_engine
+
 # Default to SQLite for local development
 URL_DATABASE = os.getenv("DATABASE_URL", "sqlite:///./learning_data.db")
 
@@ -25,6 +31,26 @@ if "sqlite" in URL_DATABASE:
 engine = create_engine(URL_DATABASE, connect_args=connect_args)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def _async_url(url: str) -> str:
+    # Same database, async driver: aiosqlite for SQLite, asyncpg for Postgres
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql+psycopg2:"):
+        return url.replace("postgresql+psycopg2:", "postgresql+asyncpg:", 1)
+    if url.startswith("postgresql:"):
+        return url.replace("postgresql:", "postgresql+asyncpg:", 1)
+    return url
+
+# Used by the FastAPI endpoints so DB round-trips don't block the event loop.
+# expire_on_commit=False keeps loaded rows usable after commit without a lazy reload
+# (lazy loads are not allowed on async sessions).
+async_engine = create_async_engine(_async_url(URL_DATABASE))
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Statement counts per HTTP request for /metrics
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
 Base = declarative_base()
 
 class Player(Base):
@@ -57,10 +83,85 @@ class TopicProgress(Base):
     mistakes = Column(JSON, default=list) # List of strings (concepts/problems)
     last_state_snapshot = Column(JSON, nullable=True) # Full graph state dump
     
-    completed_nodes = Column(JSON, default=list) # List of node_id strings (KG)
+    # Pre-normalization storage, drained into completed_nodes rows by backfill_completed_nodes()
+    legacy_completed_nodes = Column("completed_nodes", JSON(none_as_null=True), nullable=True)
     current_node = Column(String, nullable=True) # The specific node_id being worked on
+    correct_streak = Column(Integer, default=0) # Consecutive [CORRECT] answers on current_node (see mastery_policy.py)
+    incorrect_streak = Column(Integer, default=0) # Consecutive [INCORRECT] answers
     
     player = relationship("Player", back_populates="progress")
+    completed = relationship("CompletedNode", order_by="CompletedNode.id", cascade="all, delete-orphan")
+
+    @property
+    def completed_nodes(self):
+        # List of node_id strings (KG) in completion order
+        return [c.node_id for c in self.completed]
+
+    @completed_nodes.setter
+    def completed_nodes(self, node_ids):
+        # Full replace (resets/tests). Use add_completed_nodes() for normal progress.
+        # Rows that survive are reused so the unique (progress_id, node_id) key isn't hit mid-flush.
+        existing = {c.node_id: c for c in self.completed}
+        self.completed = [existing.get(n) or CompletedNode(node_id=n) for n in dict.fromkeys(node_ids or [])]
+        if self.id is not None:
+            try:
+                from .nav_context import invalidate_nav_context # Import locally to avoid circular dep
+            except ImportError:
+                from nav_context import invalidate_nav_context
+            invalidate_nav_context(self.id)
+
+class CompletedNode(Base):
+    __tablename__ = "completed_nodes"
+    __table_args__ = (UniqueConstraint("progress_id", "node_id", name="uq_completed_node"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    progress_id = Column(Integer, ForeignKey("topic_progress.id"), index=True, nullable=False)
+    node_id = Column(String, index=True, nullable=False) # KG node id
+    completed_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class MasteryRollup(Base):
+    __tablename__ = "mastery_rollups"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    player_id = Column(Integer, ForeignKey("players.id"), unique=True, index=True)
+    stats = Column(JSON, default=dict) # {"subjects": {...}, "grade_bands": {...}, "overall": [done, total], "kg_version": ...}
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class ExplanationCache(Base):
+    # Lesson-opening teacher responses (see explanation_cache.py)
+    __tablename__ = "explanation_cache"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String, unique=True, index=True, nullable=False) # sha1 of the normalized prompt inputs
+    node_id = Column(String, index=True) # KG node id
+    params = Column(JSON) # {"grade": ..., "style": ..., "role": ..., "location": ..., "trigger": ...}
+    content = Column(Text)
+    hits = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class ProblemBankEntry(Base):
+    # Pre-generated practice problems per KG concept and grade (see problem_bank.py)
+    __tablename__ = "problem_bank"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    topic = Column(String, index=True) # Subject, e.g. "Math"
+    node_id = Column(String, index=True, nullable=False) # KG node id
+    grade = Column(Integer, index=True) # 0=K, 1-12; NULL when the grade is unknown
+    problem = Column(Text, nullable=False)
+    answer = Column(Text) # Expected answer
+    skills = Column(JSON, default=list) # Short tags, matched against mistakes
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class ServedProblem(Base):
+    # Which bank problems a player has already seen (no repeats)
+    __tablename__ = "served_problems"
+    __table_args__ = (UniqueConstraint("player_id", "problem_id", name="uq_served_problem"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    player_id = Column(Integer, ForeignKey("players.id"), index=True, nullable=False)
+    problem_id = Column(Integer, ForeignKey("problem_bank.id"), index=True, nullable=False)
+    served_at = Column(DateTime, default=datetime.datetime.utcnow)
 
 class Interaction(Base):
     __tablename__ = "interactions"
@@ -73,42 +174,162 @@ class Interaction(Base):
     agent_response = Column(Text)
     source_node = Column(String) # "teacher", "verifier", etc.
 
+class GraphCheckpoint(Base):
+    # LangGraph session state (see checkpointer.py). One row per retained checkpoint.
+    __tablename__ = "graph_checkpoints"
+    __table_args__ = (UniqueConstraint("thread_id", "checkpoint_ns", "checkpoint_id", name="uq_graph_checkpoint"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    thread_id = Column(String, index=True, nullable=False) # Session id
+    checkpoint_ns = Column(String, default="", nullable=False)
+    checkpoint_id = Column(String, nullable=False)
+    parent_checkpoint_id = Column(String, nullable=True)
+    checkpoint_type = Column(String)
+    checkpoint = Column(LargeBinary) # Serialized checkpoint incl. channel values
+    meta_type = Column(String)
+    meta = Column(LargeBinary)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+class GraphCheckpointWrite(Base):
+    # Pending writes attached to a checkpoint
+    __tablename__ = "graph_checkpoint_writes"
+    __table_args__ = (UniqueConstraint("thread_id", "checkpoint_ns", "checkpoint_id", "task_id", "idx", name="uq_graph_checkpoint_write"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    thread_id = Column(String, index=True, nullable=False)
+    checkpoint_ns = Column(String, default="", nullable=False)
+    checkpoint_id = Column(String, nullable=False)
+    task_id = Column(String, nullable=False)
+    task_path = Column(String, default="")
+    idx = Column(Integer, nullable=False)
+    channel = Column(String)
+    value_type = Column(String)
+    value = Column(LargeBinary)
+
+# Columns added to existing tables after their first release: (table, column, DDL type).
+# create_all() only creates missing tables, so init_db() adds these to older databases.
+ADDED_COLUMNS = [
+    ("topic_progress", "correct_streak", "INTEGER DEFAULT 0"),
+    ("topic_progress", "incorrect_streak", "INTEGER DEFAULT 0"),
+]
+
+def add_missing_columns(bind=None):
+    bind = bind or engine
+    inspector = inspect(bind)
+    for table, column, ddl in ADDED_COLUMNS:
+        if not inspector.has_table(table):
+            continue
+        if column not in {c["name"] for c in inspector.get_columns(table)}:
+            with bind.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+            print(f"[DB] Added column {table}.{column}")
+
 def init_db():
     Base.metadata.create_all(bind=engine)
-
-def add_mistake(username: str, topic: str, mistake_info: str):
-    db: Session = SessionLocal()
+    add_missing_columns()
+    db = SessionLocal()
     try:
-        player = db.query(Player).filter(Player.username == username).first()
-        if player:
-            progress = db.query(TopicProgress).filter(
-                TopicProgress.player_id == player.id, 
-                TopicProgress.topic_name == topic
-            ).first()
-            if progress:
-                current_mistakes = list(progress.mistakes) if progress.mistakes else []
-                current_mistakes.append(mistake_info)
-                progress.mistakes = current_mistakes # Reassign to trigger update
-                db.commit()
+        backfill_completed_nodes(db)
     except Exception as e:
-        print(f"DB Error (add_mistake): {e}")
+        print(f"DB Error (backfill_completed_nodes): {e}")
+        db.rollback()
     finally:
         db.close()
 
-def get_mistakes(username: str, topic: str):
-    db: Session = SessionLocal()
-    try:
-        player = db.query(Player).filter(Player.username == username).first()
-        if player:
-            progress = db.query(TopicProgress).filter(
-                TopicProgress.player_id == player.id, 
-                TopicProgress.topic_name == topic
-            ).first()
-            if progress and progress.mistakes:
-                return list(progress.mistakes)
-    except Exception as e:
-        print(f"DB Error (get_mistakes): {e}")
-    return []
+def backfill_completed_nodes(db, batch_size: int = 500) -> int:
+    """
+    Moves TopicProgress.completed_nodes JSON arrays (old schema) into CompletedNode rows.
+    Safe to re-run: drained rows get a NULL legacy column and duplicates are skipped.
+    """
+    moved = 0
+    while True:
+        batch = db.query(TopicProgress).filter(
+            TopicProgress.legacy_completed_nodes.isnot(None)
+        ).limit(batch_size).all()
+        if not batch:
+            break
+        for progress in batch:
+            moved += len(add_completed_nodes(db, progress, progress.legacy_completed_nodes or []))
+            progress.legacy_completed_nodes = None
+        db.commit()
+    if moved:
+        print(f"[DB] Backfilled {moved} completed nodes from JSON progress columns.")
+    return moved
+
+def add_completed_nodes(db, progress, node_ids) -> list:
+    """
+    Marks node_ids complete for a TopicProgress row inside the caller's transaction.
+    Only the new rows are written (one bulk insert); returns the ids actually added.
+    """
+    candidates = [n for n in dict.fromkeys(node_ids) if n]
+    if not candidates:
+        return []
+    db.flush()
+    existing = {
+        row[0] for row in db.query(CompletedNode.node_id).filter(
+            CompletedNode.progress_id == progress.id,
+            CompletedNode.node_id.in_(candidates)
+        )
+    }
+    new_ids = [n for n in candidates if n not in existing]
+    if new_ids:
+        now = datetime.datetime.utcnow()
+        db.execute(insert(CompletedNode), [
+            {"progress_id": progress.id, "node_id": n, "completed_at": now} for n in new_ids
+        ])
+        # Reload progress.completed_nodes on next access
+        db.expire(progress, ["completed"])
+        try:
+            from .nav_context import invalidate_nav_context # Import locally to avoid circular dep
+        except ImportError:
+            from nav_context import invalidate_nav_context
+        invalidate_nav_context(progress.id)
+    return new_ids
+
+def insert_on_conflict(db, model, rows, conflict_cols, update_cols=()) -> int:
+    """
+    INSERT ... ON CONFLICT inside the caller's transaction (SQLite and Postgres).
+    Rows whose conflict_cols already exist are skipped, or get update_cols
+    overwritten, so two requests inserting the same key at once both succeed.
+    Returns the number of rows written.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    stmt = dialect_insert(model).values(rows)
+    if update_cols:
+        stmt = stmt.on_conflict_do_update(index_elements=list(conflict_cols), set_={c: stmt.excluded[c] for c in update_cols})
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=list(conflict_cols))
+    return db.execute(stmt).rowcount
+
+def is_node_completed(db, progress_id: int, node_id: str) -> bool:
+    return db.query(CompletedNode.id).filter(
+        CompletedNode.progress_id == progress_id,
+        CompletedNode.node_id == node_id
+    ).first() is not None
+
+def get_completed_nodes(db, progress_ids) -> dict:
+    """progress_id -> [node_id, ...] in completion order, for several progress rows in one query."""
+    result = {pid: [] for pid in progress_ids}
+    if not result:
+        return result
+    rows = db.query(CompletedNode.progress_id, CompletedNode.node_id).filter(
+        CompletedNode.progress_id.in_(list(result))
+    ).order_by(CompletedNode.id)
+    for progress_id, node_id in rows:
+        result[progress_id].append(node_id)
+    return result
+
+def get_node_completions(db, node_id: str, topic: str = None):
+    """Who completed a KG node: [(player_id, completed_at), ...] via the node_id index."""
+    q = db.query(TopicProgress.player_id, CompletedNode.completed_at).join(
+        CompletedNode, CompletedNode.progress_id == TopicProgress.id
+    ).filter(CompletedNode.node_id == node_id)
+    if topic:
+        q = q.filter(TopicProgress.topic_name == topic)
+    return q.order_by(CompletedNode.completed_at).all()
 
 def get_db():
     db = SessionLocal()
@@ -117,57 +338,6 @@ def get_db():
     finally:
         db.close()
 
-def update_player_progress(username: str, topic: str, xp_delta: int, mastery_delta: int):
-    db: Session = SessionLocal()
-    try:
-        player = db.query(Player).filter(Player.username == username).first()
-        if player:
-            player.xp += xp_delta
-            player.level = 1 + player.xp // 100
-            
-            progress = db.query(TopicProgress).filter(
-                TopicProgress.player_id == player.id, 
-                TopicProgress.topic_name == topic
-            ).first()
-            
-            if not progress:
-                 progress = TopicProgress(player_id=player.id, topic_name=topic, mastery_score=0)
-                 db.add(progress)
-            
-            progress.mastery_score = min(100, max(0, progress.mastery_score + mastery_delta))
-            
-            if progress.mastery_score >= 100:
-                progress.status = "COMPLETED"
-            elif progress.status == "NOT_STARTED" and progress.mastery_score > 0:
-                progress.status = "IN_PROGRESS"
-                
-            db.commit()
-            return progress.mastery_score
-        return -1
-    except Exception as e:
-        print(f"DB Error: {e}")
-        db.rollback()
-        return -1
-    finally:
-        db.close()
-
-def log_interaction(username: str, subject: str, user_query: str, agent_response: str, source_node: str):
-    db: Session = SessionLocal()
-    try:
-        interaction = Interaction(
-            username=username,
-            subject=subject,
-            user_query=user_query,
-            agent_response=agent_response,
-            source_node=source_node
-        )
-        db.add(interaction)
-        db.commit()
-    except Exception as e:
-        print(f"DB Error (log_interaction): {e}")
-    finally:
-        db.close()
-
 def get_all_users():
     db: Session = SessionLocal()
     try:
@@ -178,3 +348,36 @@ def get_all_users():
         return []
     finally:
         db.close()
+
+# --- Async variants (FastAPI endpoints) ---
+
+async def get_db_async():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_player_async(db, username: str):
+    result = await db.execute(select(Player).where(Player.username == username))
+    return result.scalars().first()
+
+async def get_progress_async(db, player_id: int, topic: str):
+    result = await db.execute(select(TopicProgress).where(
+        TopicProgress.player_id == player_id,
+        TopicProgress.topic_name == topic
+    ))
+    return result.scalars().first()
+
+async def get_completed_nodes_async(db, progress_id: int) -> list:
+    # Async counterpart of TopicProgress.completed_nodes (relationship lazy loads aren't allowed here)
+    result = await db.execute(
+        select(CompletedNode.node_id).where(CompletedNode.progress_id == progress_id).order_by(CompletedNode.id)
+    )
+    return list(result.scalars())
+
+async def get_all_users_async():
+    async with AsyncSessionLocal() as db:
+        try:
+            result = await db.execute(select(Player.username))
+            return [u[0] for u in result.all()]
+        except Exception as e:
+            print(f"DB Error (get_all_users_async): {e}")
+            return []
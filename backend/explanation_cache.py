@@ -0,0 +1,188 @@
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, update
+
+from .database import ExplanationCache, insert_on_conflict
+from .prompts import TEACHER_PROMPT, TEACHER_OF_TEACHERS_PROMPT
+
+# Cache of lesson-opening teacher explanations.
+#
+# Thousands of students open the same KG concept at the same grade with the same
+# learning style, so the first explanation is stored and reused. Only turns with
+# no conversation to react to are cached (a fresh session, or a Godot [System]
+# trigger) - anything else goes to the LLM as before.
+#
+# Reads go: in-process LRU -> explanation_cache row -> LLM (then stored).
+# Keys include a hash of the teacher prompt templates, so editing the prompts
+# retires the old entries.
+#
+# Reads never write: hits are counted in memory and written back (hits,
+# last_used_at) when the table is pruned, so size eviction drops the least
+# recently used rows. Hits counted since the last prune are lost on restart.
+#
+# Env:
+#   EXPLANATION_CACHE_SIZE      - entries kept in memory (default 2048)
+#   EXPLANATION_CACHE_TTL       - seconds an explanation is reused (default 7 days)
+#   EXPLANATION_CACHE_MAX_ROWS  - rows kept in the table, least recently used go first (default 50000)
+
+EXPLANATION_CACHE_SIZE = int(os.getenv("EXPLANATION_CACHE_SIZE", "2048"))
+EXPLANATION_CACHE_TTL = float(os.getenv("EXPLANATION_CACHE_TTL", str(7 * 24 * 3600)))
+EXPLANATION_CACHE_MAX_ROWS = int(os.getenv("EXPLANATION_CACHE_MAX_ROWS", "50000"))
+
+# Prune the table every N stores rather than on every write
+PRUNE_EVERY = 100
+
+PROMPT_VERSION = hashlib.sha1((TEACHER_PROMPT + TEACHER_OF_TEACHERS_PROMPT).encode()).hexdigest()[:12]
+
+_cache: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, content)
+_cache_lock = threading.Lock()
+_pending_hits: Dict[str, list] = {}  # key -> [hits, last_used_at] not yet written back
+_stores = 0
+
+# What Godot sends when a classroom opens ("Please start the lesson.")
+START_PHRASES = {"start lesson", "please start the lesson", "start the lesson", "teach me"}
+
+def lesson_trigger(messages) -> Optional[str]:
+    """
+    "start" for a fresh session (nothing said yet, or only the start-lesson
+    opener), the trigger kind for a Godot [System] update, None for a turn that
+    responds to the student (not cacheable).
+    """
+    if not messages:
+        return "start"
+    last = messages[-1].content
+    if "[System] Update Grade Level Context" in last:
+        return "grade"
+    if "[System] Update Role Context" in last:
+        return "role"
+    if len(messages) == 1 and _norm(last).strip(" .!?") in START_PHRASES:
+        return "start"
+    return None
+
+def _norm(value) -> str:
+    return " ".join(str(value or "").split()).lower()
+
+def explanation_params(node_id: str, grade, style: str, role: str, view_as_student: bool, location: str, trigger: str) -> Dict:
+    # Teachers previewing as a student get the student prompt
+    audience = "teacher" if role == "Teacher" and not view_as_student else "student"
+    return {
+        "node": node_id,
+        "grade": _norm(grade),
+        "style": _norm(style),
+        "role": audience,
+        "location": _norm(location),
+        "trigger": trigger,
+    }
+
+def explanation_key(params: Dict) -> str:
+    raw = json.dumps(params, sort_keys=True) + "|" + PROMPT_VERSION
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def _cache_put(key: str, content: str, expires_at: float):
+    with _cache_lock:
+        _cache[key] = (expires_at, content)
+        _cache.move_to_end(key)
+        while len(_cache) > EXPLANATION_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+def _cache_get(key: str) -> Optional[str]:
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del _cache[key]
+            return None
+        _cache.move_to_end(key)
+        return entry[1]
+
+def _record_hit(key: str):
+    with _cache_lock:
+        entry = _pending_hits.setdefault(key, [0, None])
+        entry[0] += 1
+        entry[1] = datetime.datetime.utcnow()
+
+def clear_explanation_cache():
+    with _cache_lock:
+        _cache.clear()
+        _pending_hits.clear()
+
+def get_cached_explanation(db_session, key: str) -> Optional[str]:
+    # Read-only: runs in the caller's transaction and never writes on a hit
+    # (expired rows are left for prune_explanations)
+    content = _cache_get(key)
+    if content is not None:
+        _record_hit(key)
+        return content
+
+    row = db_session.query(ExplanationCache).filter(ExplanationCache.cache_key == key).first()
+    if not row:
+        return None
+
+    age = (datetime.datetime.utcnow() - row.created_at).total_seconds()
+    if age > EXPLANATION_CACHE_TTL:
+        return None
+
+    _cache_put(key, row.content, time.monotonic() + EXPLANATION_CACHE_TTL - age)
+    _record_hit(key)
+    return row.content
+
+def store_explanation(db_session, key: str, params: Dict, content: str):
+    """
+    Saves an explanation in the caller's transaction (the caller commits). Two
+    students opening the same lesson at once race on cache_key: the later insert
+    overwrites the row instead of failing (keeping its hit count).
+    """
+    global _stores
+    now = datetime.datetime.utcnow()
+    insert_on_conflict(db_session, ExplanationCache, [{
+        "cache_key": key, "node_id": params.get("node"), "params": params, "content": content,
+        "hits": 0, "created_at": now, "last_used_at": now,
+    }], ["cache_key"], update_cols=["params", "content", "created_at", "last_used_at"])
+    _cache_put(key, content, time.monotonic() + EXPLANATION_CACHE_TTL)
+
+    _stores += 1
+    if _stores % PRUNE_EVERY == 0:
+        prune_explanations(db_session)
+
+def flush_explanation_hits(db_session) -> int:
+    """Writes the hits counted in memory back to their rows (caller commits)."""
+    with _cache_lock:
+        pending = [{"key": k, "n": n, "used": used} for k, (n, used) in _pending_hits.items()]
+        _pending_hits.clear()
+    if not pending:
+        return 0
+
+    table = ExplanationCache.__table__
+    stmt = (
+        update(table)
+        .where(table.c.cache_key == bindparam("key"))
+        .values(hits=table.c.hits + bindparam("n"), last_used_at=bindparam("used"))
+    )
+    db_session.connection().execute(stmt, pending)  # One executemany for the batch
+    return len(pending)
+
+def prune_explanations(db_session) -> int:
+    """Drops expired rows and the least recently used past EXPLANATION_CACHE_MAX_ROWS (caller commits)."""
+    # Size eviction goes by last_used_at, so bring it up to date first
+    flush_explanation_hits(db_session)
+
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=EXPLANATION_CACHE_TTL)
+    removed = db_session.query(ExplanationCache).filter(ExplanationCache.created_at < cutoff).delete(synchronize_session=False)
+
+    overflow = db_session.query(ExplanationCache).count() - EXPLANATION_CACHE_MAX_ROWS
+    if overflow > 0:
+        oldest = db_session.query(ExplanationCache.id).order_by(ExplanationCache.last_used_at).limit(overflow)
+        removed += db_session.query(ExplanationCache).filter(
+            ExplanationCache.id.in_([r.id for r in oldest])
+        ).delete(synchronize_session=False)
+    if removed:
+        print(f"[ExplanationCache] Pruned {removed} rows")
+    return removed
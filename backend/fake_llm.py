@@ -0,0 +1,305 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from .context import count_text_tokens
+
+# Offline stand-ins for the OpenAI chat models (LLM_BACKEND, see llm.get_llm).
+#
+#   openai     - real ChatOpenAI (default)
+#   synthetic  - made-up but well-formed replies for every agent prompt: routes,
+#                [CORRECT]/[INCORRECT] verdicts, adapter/fused/problem-bank JSON,
+#                explanations of LLM_FAKE_OUTPUT_TOKENS tokens
+#   replay     - replies recorded in the cassette, looked up by prompt hash; a miss
+#                falls back to synthetic (or raises with LLM_REPLAY_MISS=error)
+#   record     - real ChatOpenAI, appending every reply to the cassette
+#
+# Fake replies (synthetic and replay) are paced like a real completion: a time
+# to first token drawn from LLM_FAKE_LATENCY, optional prompt prefill time, then
+# the reply streamed at LLM_FAKE_TOKENS_PER_SEC, so /chat_stream and load tests
+# see realistic timings without a key or network.
+#
+# Env:
+#   LLM_BACKEND                   - openai | synthetic | replay | record (default openai)
+#   LLM_CASSETTE                  - cassette path, JSONL (default backend/data/llm_cassette.jsonl)
+#   LLM_REPLAY_MISS               - synthetic | error (default synthetic)
+#   LLM_FAKE_LATENCY              - time to first token: "0.4", "const:0.4", "uniform:0.2,0.8",
+#                                   "normal:0.5,0.1" or "lognormal:-0.7,0.4" (default lognormal:-0.7,0.4, median ~0.5s)
+#   LLM_FAKE_TOKENS_PER_SEC       - output rate, 0 = instant (default 60)
+#   LLM_FAKE_PREFILL_TOKENS_PER_SEC - prompt processing rate, 0 = free (default 0)
+#   LLM_FAKE_OUTPUT_TOKENS        - length of synthetic explanations/chat replies (default 150)
+#   LLM_FAKE_CORRECT_RATE         - share of unparseable answers judged correct (default 0.7)
+#   LLM_FAKE_SEED                 - seed for latencies and verdicts (default 0)
+
+CASSETTE_PATH = os.getenv("LLM_CASSETTE", os.path.join(os.path.dirname(__file__), "data", "llm_cassette.jsonl"))
+REPLAY_MISS = os.getenv("LLM_REPLAY_MISS", "synthetic")
+FAKE_LATENCY = os.getenv("LLM_FAKE_LATENCY", "lognormal:-0.7,0.4")
+FAKE_TOKENS_PER_SEC = float(os.getenv("LLM_FAKE_TOKENS_PER_SEC", "60"))
+FAKE_PREFILL_TOKENS_PER_SEC = float(os.getenv("LLM_FAKE_PREFILL_TOKENS_PER_SEC", "0"))
+FAKE_OUTPUT_TOKENS = int(os.getenv("LLM_FAKE_OUTPUT_TOKENS", "150"))
+FAKE_CORRECT_RATE = float(os.getenv("LLM_FAKE_CORRECT_RATE", "0.7"))
+FAKE_SEED = int(os.getenv("LLM_FAKE_SEED", "0"))
+
+_rng = random.Random(FAKE_SEED)
+_rng_lock = threading.Lock()
+_stats = Counter()
+
+# --- Latency ---
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """ "0.4" / "const:0.4" / "uniform:a,b" / "normal:mu,sd" / "lognormal:mu,sigma" -> sampler (seconds) """
+    kind, _, args = spec.partition(":")
+    if not args:
+        kind, args = "const", kind
+    params = [float(a) for a in args.split(",") if a.strip()]
+    if kind == "const":
+        return lambda rng: params[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(params[0], params[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(params[0], params[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(params[0], params[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+def _sample(sampler) -> float:
+    with _rng_lock:
+        return sampler(_rng)
+
+# --- Cassette ---
+
+def prompt_key(model: str, json_mode: bool, messages: List[BaseMessage]) -> str:
+    payload = json.dumps({
+        "model": model,
+        "json": json_mode,
+        "messages": [[m.type, m.content] for m in messages],
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class Cassette:
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, str] = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry["response"]
+                    except (ValueError, KeyError):
+                        continue
+            print(f"[FakeLLM] Loaded {len(self.entries)} recorded replies from {path}")
+
+    def get(self, key: str) -> Optional[str]:
+        return self.entries.get(key)
+
+    def put(self, key: str, model: str, messages: List[BaseMessage], response: str, seconds: float):
+        with self.lock:
+            self.entries[key] = response
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps({
+                    "key": key,
+                    "model": model,
+                    "prompt": str(messages[0].content)[:200] if messages else "",
+                    "response": response,
+                    "seconds": round(seconds, 3),
+                }) + "\n")
+
+_cassettes: Dict[str, Cassette] = {}
+
+def get_cassette(path: str = None) -> Cassette:
+    path = path or CASSETTE_PATH
+    with _rng_lock:
+        if path not in _cassettes:
+            _cassettes[path] = Cassette(path)
+        return _cassettes[path]
+
+# --- Synthetic replies ---
+
+WORDS = ("let's", "look", "at", "how", "this", "idea", "works", "step", "by", "step", "first", "we",
+         "notice", "the", "pattern", "then", "we", "try", "an", "example", "together", "and", "check", "it")
+
+def _filler(tokens: int, rng: random.Random) -> str:
+    words, count = [], 0
+    while count < tokens:
+        word = rng.choice(WORDS)
+        words.append(word)
+        count += count_text_tokens(word + " ")
+    return " ".join(words).capitalize() + "."
+
+def _field(text: str, name: str) -> str:
+    m = re.search(rf"^{name}:\s*(.*)$", text, re.MULTILINE)
+    return m.group(1).strip() if m else ""
+
+def _judge(problem: str, answer: str, rng: random.Random) -> str:
+    if "?" in answer or re.search(r"\b(don't|dont|confused|help|hint)\b", answer.lower()):
+        return "UNCLEAR"
+    m = re.search(r"(\d+)\s*([-+x*])\s*(\d+)", problem)
+    given = re.search(r"-?\d+", answer)
+    if m and given:
+        a, op, b = int(m.group(1)), m.group(2), int(m.group(3))
+        expected = a + b if op == "+" else a - b if op == "-" else a * b
+        return "CORRECT" if int(given.group()) == expected else "INCORRECT"
+    return "CORRECT" if rng.random() < FAKE_CORRECT_RATE else "INCORRECT"
+
+def _problem(rng: random.Random) -> Dict:
+    a, b = rng.randint(2, 20), rng.randint(2, 20)
+    return {"problem": f"Sam has {a} marbles and finds {b} more. What is {a} + {b}?", "answer": str(a + b), "skills": ["addition"]}
+
+def synthesize(messages: List[BaseMessage], rng: random.Random, output_tokens: int = None) -> str:
+    """A well-formed reply for whichever agent prompt this is."""
+    output_tokens = FAKE_OUTPUT_TOKENS if output_tokens is None else output_tokens
+    prompt = str(messages[0].content) if messages else ""
+    last = str(messages[-1].content) if messages else ""
+
+    if prompt.startswith("You are the Learning Supervisor."):
+        text, state = _field(prompt, "User Input").lower(), _field(prompt, "Current State")
+        if state.startswith("PROBLEM_GIVEN") and "?" not in text:
+            return "VERIFIER"
+        if re.search(r"quiz|practice|problem|test me", text):
+            return "PROBLEM_GENERATOR"
+        if re.search(r"explain|teach|lesson|start|what is|how|why|help", text):
+            return "TEACHER"
+        return "GENERAL_CHAT"
+    if prompt.startswith("You are the Level Adapter Agent."):
+        # Same rule the prompt states: two right in a row -> MASTERED
+        verdicts = re.findall(r"\[(CORRECT|INCORRECT)\]", prompt)
+        decision = "MASTERED" if verdicts[-2:] == ["CORRECT", "CORRECT"] else "CONTINUE_PRACTICE"
+        return json.dumps({"decision": decision, "reason": "synthetic", "remediation_topic": None})
+    if prompt.startswith("You are a Solution Verifier Agent and a Motivator."):
+        verdict = _judge(_field(prompt, "Problem"), _field(prompt, "Student Answer"), rng)
+        feedback = "Outstanding!" if verdict == "CORRECT" else "Not quite, but you're close! " + _filler(20, rng)
+        return json.dumps({"verdict": verdict, "struggling": verdict == "UNCLEAR", "feedback": feedback})
+    if prompt.startswith("You are a Solution Verifier Agent."):
+        verdict = _judge(_field(prompt, "Problem"), _field(prompt, "Student Answer"), rng)
+        if verdict == "CORRECT":
+            return "[CORRECT] Outstanding! You're crushing it!"
+        return "[INCORRECT] Not quite, but you're close! " + _filler(30, rng)
+    if "building a practice bank" in prompt:
+        m = re.search(r"Write (\d+) different", prompt)
+        return json.dumps({"problems": [_problem(rng) for _ in range(int(m.group(1)) if m else 5)]})
+    if prompt.startswith("You are a Problem Generator Agent."):
+        return _problem(rng)["problem"]
+    if prompt.startswith("You are summarizing a tutoring session"):
+        return "The student worked through practice problems. " + _filler(40, rng)
+    return _filler(output_tokens, rng) if last else "Hi! What would you like to learn today?"
+
+# --- Chat model ---
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model for LLM_BACKEND=synthetic/replay/record. Drop-in for ChatOpenAI in
+    the agent nodes: same invoke/ainvoke/astream interface, so streaming and callbacks work.
+    """
+    model_name: str = "gpt-4o"
+    json_mode: bool = False
+    mode: str = "synthetic"
+    inner: Any = None  # real client for record mode
+    cassette_path: Optional[str] = None
+    latency: str = FAKE_LATENCY
+    tokens_per_sec: float = FAKE_TOKENS_PER_SEC
+    prefill_tokens_per_sec: float = FAKE_PREFILL_TOKENS_PER_SEC
+
+    @property
+    def _llm_type(self) -> str:
+        return f"fake-{self.mode}"
+
+    async def _reply(self, messages: List[BaseMessage]) -> tuple:
+        """(content, already_waited): recorded, replayed or synthesized reply."""
+        key = prompt_key(self.model_name, self.json_mode, messages)
+        if self.mode == "record":
+            start = time.perf_counter()
+            response = await self.inner.ainvoke(messages)
+            return self._record(key, messages, response.content, time.perf_counter() - start), True
+        return self._fake_reply(key, messages), False
+
+    def _reply_sync(self, messages: List[BaseMessage]) -> tuple:
+        key = prompt_key(self.model_name, self.json_mode, messages)
+        if self.mode == "record":
+            start = time.perf_counter()
+            response = self.inner.invoke(messages)
+            return self._record(key, messages, response.content, time.perf_counter() - start), True
+        return self._fake_reply(key, messages), False
+
+    def _record(self, key: str, messages: List[BaseMessage], content: str, seconds: float) -> str:
+        get_cassette(self.cassette_path).put(key, self.model_name, messages, content, seconds)
+        _stats["recorded"] += 1
+        return content
+
+    def _fake_reply(self, key: str, messages: List[BaseMessage]) -> str:
+        if self.mode == "replay":
+            content = get_cassette(self.cassette_path).get(key)
+            if content is not None:
+                _stats["replayed"] += 1
+                return content
+            _stats["replay_misses"] += 1
+            if REPLAY_MISS == "error":
+                raise KeyError(f"No recorded reply for prompt {key[:12]} ({self.model_name})")
+        _stats["synthesized"] += 1
+        rng = random.Random(f"{FAKE_SEED}:{key}")  # same prompt, same reply
+        return synthesize(messages, rng)
+
+    def _first_token_delay(self, messages: List[BaseMessage]) -> float:
+        delay = _sample(parse_latency(self.latency))
+        if self.prefill_tokens_per_sec > 0:
+            prompt_tokens = sum(count_text_tokens(str(m.content)) for m in messages)
+            delay += prompt_tokens / self.prefill_tokens_per_sec
+        return delay
+
+    def _token_delay(self, text: str) -> float:
+        if self.tokens_per_sec <= 0:
+            return 0.0
+        return count_text_tokens(text) / self.tokens_per_sec
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        # Sync invoke() (scripts, notebooks); same replies and pacing, blocking
+        content, waited = self._reply_sync(messages)
+        if not waited:
+            time.sleep(self._first_token_delay(messages) + self._token_delay(content))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        content, waited = await self._reply(messages)
+        if not waited:
+            await asyncio.sleep(self._first_token_delay(messages) + self._token_delay(content))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        content, waited = await self._reply(messages)
+        if not waited:
+            await asyncio.sleep(self._first_token_delay(messages))
+        pieces = re.split(r"(\s+)", content)
+        for piece in pieces:
+            if not piece:
+                continue
+            if not waited:
+                delay = self._token_delay(piece)
+                if delay:
+                    await asyncio.sleep(delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            if run_manager:
+                await run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+
+def make_fake_llm(mode: str, model: str, temperature: float = None, response_format: dict = None, inner=None) -> FakeChatModel:
+    if mode not in ("synthetic", "replay", "record"):
+        raise ValueError(f"Unknown LLM_BACKEND: {mode}")
+    json_mode = bool(response_format and response_format.get("type") == "json_object")
+    return FakeChatModel(model_name=model, json_mode=json_mode, mode=mode, inner=inner)
+
+def fake_llm_stats() -> Dict:
+    keys = ("synthesized", "replayed", "replay_misses", "recorded")
+    return {k: _stats[k] for k in keys}
@@ -1,45 +1,96 @@
 
-import operator
+import asyncio
+import os
 from typing import TypedDict, List, Annotated, Union
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, BaseMessage
 from langgraph.graph import StateGraph, END
-from .prompts import TEACHER_PROMPT, TEACHER_OF_TEACHERS_PROMPT, PROBLEM_GENERATOR_PROMPT, VERIFIER_PROMPT, SUPERVISOR_PROMPT, ADAPTER_PROMPT
-from .database import log_interaction, get_db, Player, TopicProgress, SessionLocal
+from langgraph.graph.message import add_messages
+from langchain_core.runnables import RunnableConfig
+from .prompts import TEACHER_PROMPT, TEACHER_OF_TEACHERS_PROMPT, PROBLEM_GENERATOR_PROMPT, VERIFIER_PROMPT, SUPERVISOR_PROMPT, ADAPTER_PROMPT, VERIFY_AND_ADAPT_PROMPT
+from .database import add_completed_nodes
 from .knowledge_graph import get_graph, get_all_subjects_stats
-import json 
+from .mastery_rollup import refresh_mastery_rollup
+from .llm import ainvoke_llm, get_llm
+from .router import fast_route, record_route, ROUTE_LOG_NODE
+from .problem_bank import pick_problem, has_unseen_problem, grade_number
+from .prefetch import thread_key, schedule_prefetch, take_prefetch, discard_prefetch
+from .answer_checker import check_answer
+from .mastery_policy import verdict_of, is_confused, update_streaks, decide
+from .context import build_context, budget_for, compact_history, recent_messages, transcript
+from .explanation_cache import lesson_trigger, explanation_params, explanation_key, get_cached_explanation, store_explanation
+from .turn_context import begin_turn, turn_scope
+from .interaction_log import queue_interaction
+from .metrics import traced_node
+import json
+import random
 
 # State Definition
 class AgentState(TypedDict):
-    messages: Annotated[List[BaseMessage], operator.add]
+    messages: Annotated[List[BaseMessage], add_messages] # add_messages so old turns can be removed once summarized
+    summary: str # Rolling summary of removed turns (see context.py)
     topic: str
     grade_level: str
     location: str
     learning_style: str
     username: str
+    player_id: int # Row ids for the turn's DB context (see turn_context.py)
+    progress_id: int
     mastery: int
     current_action: str
     last_problem: str
+    expected_answer: str # Answer key for last_problem when it came from the problem bank
+    correct_streak: int # Mirrors TopicProgress streaks (see mastery_policy.py)
+    judged: bool # Verifier's verdict is final (local check / fused mode); adapter skips the LLM
+    incorrect_streak: int
     next_dest: str
     role: str # "Student" or "Teacher"
     view_as_student: bool
 
-# LLM
-llm = ChatOpenAI(model="gpt-4o")
+# Answer path: "split" = verifier LLM call, then the adapter (which may ask the LLM again);
+# "fused" = one structured call returns feedback + verdict + struggling, adapter stays local
+VERIFY_MODE = os.getenv("VERIFY_MODE", "split")
+
+async def compacted(task) -> dict:
+    # Summarization is an optimization; a failed summary just leaves history as is this turn
+    try:
+        return await task
+    except Exception as e:
+        print(f"[Context] Summarization failed: {e}")
+        return {}
+
+def log_route(state: AgentState, source: str, decision: str):
+    # Router training data: the student's own message and where it went.
+    # Classifier routes are left out so the model isn't retrained on its own guesses.
+    message = state['messages'][-1] if state['messages'] else None
+    if source == "classifier" or not isinstance(message, HumanMessage):
+        return
+    queue_interaction(state.get("username", "Unknown"), state.get("topic", "General"), message.content, decision, ROUTE_LOG_NODE)
 
 # Nodes
-def supervisor_node(state: AgentState):
+async def supervisor_node(state: AgentState):
     messages = state['messages']
     last_user_msg = messages[-1].content
+    last_action = state.get('current_action', 'IDLE')
+    
+    # Long sessions: fold old turns into the summary while routing runs
+    compaction = asyncio.create_task(compact_history(messages, state.get('summary')))
+    
+    # Buttons, system triggers and bare answers are routed without an LLM round-trip
+    decision, source = fast_route(last_user_msg, last_action)
+    if decision:
+        print(f"[SUPERVISOR] {source} route: {decision}")
+        record_route(source, decision)
+        log_route(state, source, decision)
+        return {"next_dest": decision, **(await compacted(compaction))}
     
     # Simple logic mapping for robust routing
     prompt = SUPERVISOR_PROMPT.format(
         last_message=last_user_msg,
-        last_action=state.get('current_action', 'IDLE')
+        last_action=last_action
     )
     
-    decision_llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-    response = decision_llm.invoke(prompt)
+    decision_llm = get_llm("gpt-4o-mini", temperature=0)
+    response = await ainvoke_llm(decision_llm, prompt)
     decision = response.content.strip().upper()
     
     # Fallback
@@ -53,9 +104,11 @@ def supervisor_node(state: AgentState):
     if not found:
         decision = "GENERAL_CHAT"
         
-    return {"next_dest": decision}
+    record_route("llm", decision)
+    log_route(state, "llm", decision)
+    return {"next_dest": decision, **(await compacted(compaction))}
 
-def teacher_node(state: AgentState):
+async def teacher_node(state: AgentState, config: RunnableConfig = None):
     loc = state.get("location", "New Hampshire")
     style = state.get("learning_style", "Universal")
     
@@ -82,56 +135,50 @@ def teacher_node(state: AgentState):
         
     print(f"[TEACHER DEBUG] Parsed Target Grade: {target_grade}")
     
-    db = SessionLocal()
-    try:
-        player = db.query(Player).filter(Player.username == state["username"]).first()
-        if player:
-            prog = db.query(TopicProgress).filter(
-                TopicProgress.player_id == player.id, 
-                TopicProgress.topic_name == state['topic']
-            ).first()
-            if prog:
-                if prog.current_node:
-                    n = kg.get_node(prog.current_node)
-                    if n: 
-                        # Check for Stale Node (Grade Mismatch)
-                        is_stale = False
-                        
-                        # [NEW] Detect Explicit Override Trigger from User/System
-                        last_msg = state['messages'][-1].content if state['messages'] else ""
-                        is_override_trigger = "[System] Update Grade Level Context" in last_msg
-                        
-                        if target_grade is not None:
-                             # Logic:
-                             # 1. If Explicit Trigger: ANY mismatch requires update.
-                             # 2. If Passive (Mastery=0): Only huge mismatch (>1) requires update.
+    # Within a chat turn every turn_scope() is the same session and cached rows (see turn_context.py)
+    async with turn_scope() as turn:
+        prog = await turn.progress_for(state)
+        if prog:
+            if prog.current_node:
+                n = kg.get_node(prog.current_node)
+                if n: 
+                    # Check for Stale Node (Grade Mismatch)
+                    is_stale = False
+                    
+                    # [NEW] Detect Explicit Override Trigger from User/System
+                    last_msg = state['messages'][-1].content if state['messages'] else ""
+                    is_override_trigger = "[System] Update Grade Level Context" in last_msg
+                    
+                    if target_grade is not None:
+                         # Logic:
+                         # 1. If Explicit Trigger: ANY mismatch requires update.
+                         # 2. If Passive (Mastery=0): Only huge mismatch (>1) requires update.
+                         
+                         if is_override_trigger and n.grade_level != target_grade:
+                             is_stale = True
+                             print(f"[KG] Explicit Override Trigger: Switching to Grade {target_grade}")
                              
-                             if is_override_trigger and n.grade_level != target_grade:
-                                 is_stale = True
-                                 print(f"[KG] Explicit Override Trigger: Switching to Grade {target_grade}")
-                                 
-                             elif prog.mastery_score == 0 and abs(n.grade_level - target_grade) > 1:
-                                 is_stale = True
-                                 print(f"[KG] Passive Stale Check: Node {n.label} (G{n.grade_level}) too far from Grade {target_grade}")
-                        
-                        if not is_stale:
-                            current_node = n
+                         elif prog.mastery_score == 0 and abs(n.grade_level - target_grade) > 1:
+                             is_stale = True
+                             print(f"[KG] Passive Stale Check: Node {n.label} (G{n.grade_level}) too far from Grade {target_grade}")
+                    
+                    if not is_stale:
+                        current_node = n
+            
+            if not current_node:
+                completed = await turn.completed(prog.id)
                 
-                if not current_node:
-                    completed = prog.completed_nodes or []
+                # Target grade already extracted above
                     
-                    # Target grade already extracted above
-                        
-                    candidates = kg.get_next_learnable_nodes(completed, target_grade=target_grade)
-                    if candidates:
-                        current_node = candidates[0]
-                        prog.current_node = current_node.id
-                        db.commit()
-                        print(f"[KG] Teaching Next Node: {current_node.label}")
-                    else:
-                        print("[KG] No more nodes or all complete!")
-    finally:
-        db.close()
+                candidates = kg.get_next_learnable_nodes(completed, target_grade=target_grade, limit=1, learner_key=prog.id)
+                if candidates:
+                    current_node = candidates[0]
+                    prog.current_node = current_node.id
+                    prog.correct_streak, prog.incorrect_streak = 0, 0 # New node, fresh streaks
+                    await turn.save()
+                    print(f"[KG] Teaching Next Node: {current_node.label}")
+                else:
+                    print("[KG] No more nodes or all complete!")
     
     if current_node:
         topic_label = f"{state['topic']}: {current_node.label} ({current_node.description})"
@@ -141,15 +188,14 @@ def teacher_node(state: AgentState):
     view_as_student = state.get("view_as_student", False)
     
     prompt = ""
+    prompt_grade = state['grade_level']
     if role == "Teacher" and not view_as_student:
          print("[AGENTS] Using TEACHER_OF_TEACHERS prompt")
          
          # Fetch actual teacher grade from DB (since state['grade_level'] might be the content level)
          teacher_grade = state['grade_level']
-         db_local = SessionLocal()
-         try:
-             p = db_local.query(Player).filter(Player.username == state["username"]).first()
-             p = db_local.query(Player).filter(Player.username == state["username"]).first()
+         async with turn_scope() as turn:
+             p = await turn.player_for(state) # Already loaded above, no second query
              if p:
                 profile_grade = p.grade_level
                 content_grade = state['grade_level']
@@ -159,9 +205,8 @@ def teacher_node(state: AgentState):
                 else:
                      # Mismatch (Override active)
                      teacher_grade = f"Grade {profile_grade} (Teaching {content_grade} Content)"
-         finally:
-             db_local.close()
 
+         prompt_grade = teacher_grade
          prompt = TEACHER_OF_TEACHERS_PROMPT.format(
             topic=topic_label,
             grade_level=teacher_grade,
@@ -180,7 +225,7 @@ def teacher_node(state: AgentState):
     
     # [NEW] Intercept System Trigger to force response
     # [NEW] Intercept System Trigger to force response
-    context_msgs = list(state['messages'])
+    context_msgs = build_context(state['messages'], "teacher", state.get('summary'))
     if context_msgs:
         last_content = context_msgs[-1].content
         if "[System] Update Grade Level Context" in last_content:
@@ -199,11 +244,36 @@ def teacher_node(state: AgentState):
             context_msgs[-1] = HumanMessage(content=directive)
             print(f"[AGENTS] Replaced Role Trigger with Directive: {directive}")
         
-    messages = [SystemMessage(content=prompt)] + context_msgs
-    response = llm.invoke(messages)
+    # Lesson openers for a known concept are shared across students (see explanation_cache.py)
+    cache_key, cache_params = None, None
+    trigger = lesson_trigger(state['messages'])
+    if current_node and trigger:
+        cache_params = explanation_params(current_node.id, prompt_grade, style, role, view_as_student, loc, trigger)
+        cache_key = explanation_key(cache_params)
+    
+    response = None
+    if cache_key:
+        try:
+            async with turn_scope() as turn:
+                cached = await turn.db.run_sync(lambda s: get_cached_explanation(s, cache_key))
+            if cached:
+                print(f"[AGENTS] Explanation cache hit for {current_node.id}")
+                response = AIMessage(content=cached)
+        except Exception as e:
+            print(f"DB Error (explanation cache): {e}")
+    
+    if response is None:
+        messages = [SystemMessage(content=prompt)] + context_msgs
+        response = await ainvoke_llm(get_llm("gpt-4o"), messages)
+        if cache_key and response.content:
+            try:
+                async with turn_scope() as turn:
+                    await turn.db.run_sync(lambda s: store_explanation(s, cache_key, cache_params, response.content))
+            except Exception as e:
+                print(f"DB Error (explanation cache): {e}")
     print(f"RESPONSE:\n{response.content}\n")
     
-    log_interaction(
+    queue_interaction(
         username=state.get("username", "Unknown"),
         subject=state.get("topic", "General"),
         user_query=state['messages'][-1].content if state['messages'] else "",
@@ -211,67 +281,64 @@ def teacher_node(state: AgentState):
         source_node="teacher"
     )
     
-    done_unit, total_unit = 0, 0
-    done_subj, total_subj = 0, 0
-    done_grade, total_grade = 0, 0
-    subtree_root = None
+    # "Quiz me" usually comes next: start on that problem now (see prefetch.py)
+    if current_node and not (role == "Teacher" and not view_as_student):
+        prefetch_state = {**state, "messages": list(state['messages']) + [response]}
+        node_id = current_node.id
+        schedule_prefetch(thread_key(config, state), node_id, lambda: prefetch_problem(prefetch_state, node_id))
     
     done_unit, total_unit = 0, 0
     done_subj, total_subj = 0, 0
     done_grade, total_grade = 0, 0
     subtree_root = None
     
-    # RE-OPEN DB for Mastery Stats (Player object from before is stale/closed)
-    db = SessionLocal()
+    # Mastery Stats from the rows the turn already has
     try:
-        player = db.query(Player).filter(Player.username == state["username"]).first()
-        if player:
-            prog = db.query(TopicProgress).filter(
-                TopicProgress.player_id == player.id, 
-                TopicProgress.topic_name == state['topic']
-            ).first()
+        async with turn_scope() as turn:
+            player = await turn.player_for(state)
+            if player:
+                prog = await turn.progress_for(state)
+                completed = await turn.completed(prog.id) if prog else []
             
-            # print(f"[TEACHER DEBUG] Topic: {state['topic']}, Player: {player.username}") # Already have username in state
-            if prog and prog.completed_nodes:
-                # Determine Scope: Use the first part of the current node or last completed node
-                # Node ID format: "Arithmetic->Number_Sense->..."
-                # We want "Arithmetic" as the scope.
-                reference_node = None
-                if current_node:
-                    reference_node = current_node.id
-                elif prog.completed_nodes:
-                    reference_node = prog.completed_nodes[-1]
+                # print(f"[TEACHER DEBUG] Topic: {state['topic']}, Player: {player.username}") # Already have username in state
+                if prog and completed:
+                    # Determine Scope: Use the first part of the current node or last completed node
+                    # Node ID format: "Arithmetic->Number_Sense->..."
+                    # We want "Arithmetic" as the scope.
+                    reference_node = None
+                    if current_node:
+                        reference_node = current_node.id
+                    elif completed:
+                        reference_node = completed[-1]
                     
-                # Unit Mastery (Scope to immediate parent for granular feedback)
-                # e.g. "Arithmetic->Number_Sense->Comparisons->Equality" -> Scope: "Arithmetic->Number_Sense->Comparisons"
-                subtree_root = None
-                if reference_node and "->" in reference_node:
-                    parts = reference_node.split("->")
-                    if len(parts) > 1:
-                        # Use parent path
-                        subtree_root = "->".join(parts[:-1])
-                    else:
-                        subtree_root = parts[0]
+                    # Unit Mastery (Scope to immediate parent for granular feedback)
+                    # e.g. "Arithmetic->Number_Sense->Comparisons->Equality" -> Scope: "Arithmetic->Number_Sense->Comparisons"
+                    subtree_root = None
+                    if reference_node and "->" in reference_node:
+                        parts = reference_node.split("->")
+                        if len(parts) > 1:
+                            # Use parent path
+                            subtree_root = "->".join(parts[:-1])
+                        else:
+                            subtree_root = parts[0]
                         
-                    # print(f"[TEACHER DEBUG] Scoping Mastery to Subtree: {subtree_root}")
+                        # print(f"[TEACHER DEBUG] Scoping Mastery to Subtree: {subtree_root}")
                 
-                # Unit Mastery
-                done_unit, total_unit = kg.get_completion_stats(prog.completed_nodes, subtree_root)
-                # print(f"[TEACHER DEBUG] Unit Stats ({subtree_root or 'ALL'}): Done={done_unit}, Total={total_unit}")
+                    # Unit Mastery
+                    done_unit, total_unit = kg.get_completion_stats(completed, subtree_root, learner_key=prog.id)
+                    # print(f"[TEACHER DEBUG] Unit Stats ({subtree_root or 'ALL'}): Done={done_unit}, Total={total_unit}")
                 
-                # Subject Mastery (Math)
-                done_subj, total_subj = kg.get_completion_stats(prog.completed_nodes)
-                # print(f"[TEACHER DEBUG] Subject Stats: Done={done_subj}, Total={total_subj}")
+                    # Subject Mastery (Math)
+                    done_subj, total_subj = kg.get_completion_stats(completed, learner_key=prog.id)
+                    # print(f"[TEACHER DEBUG] Subject Stats: Done={done_subj}, Total={total_subj}")
                 
-            # Grade Mastery (All Subjects) - Heavy, but robust
-            done_grade, total_grade = get_all_subjects_stats(player.id, db)
-            # print(f"[TEACHER DEBUG] Grade Stats: Done={done_grade}, Total={total_grade}")
+                # Grade Mastery (All Subjects) - one mastery rollup row
+                done_grade, total_grade = await turn.db.run_sync(lambda s: get_all_subjects_stats(player.id, s))
+                # print(f"[TEACHER DEBUG] Grade Stats: Done={done_grade}, Total={total_grade}")
                 
     except Exception as e:
         print(f"[TEACHER DEBUG] Error calculating mastery: {e}")
         pass
-    finally:
-        db.close()
              
     mastery_data = {
         "unit": 0.0,
@@ -287,31 +354,70 @@ def teacher_node(state: AgentState):
     
     return {"messages": [response], "current_action": "EXPLAINING", "next_dest": "END", "mastery": mastery_data}
 
-def problem_node(state: AgentState):
-    from .database import get_mistakes
-    mistakes = get_mistakes(state.get("username"), state.get("topic"))
-    
+async def generate_problem(state: AgentState, mistakes) -> AIMessage:
+    # Live LLM problem for the concept the conversation is on
     reinforcement_instruction = ""
     if mistakes:
         recent_mistakes = list(set(mistakes[-3:]))
         reinforcement_instruction = f"\n\n**Reinforcement**: The student previously struggled with: {recent_mistakes}. Create a problem that specifically targets these weaknesses to reinforce understanding."
-
-    topic_broad = state['topic']
     
     prompt = PROBLEM_GENERATOR_PROMPT.format(
-        topic=topic_broad,
+        topic=state['topic'],
         grade_level=state['grade_level']
     ) + reinforcement_instruction
     
     print(f"\n[AGENTS] PROBLEM NODE\nPROMPT:\n{prompt}\n")
     
-    context_messages = state['messages'][-5:] 
+    context_messages = build_context(state['messages'], "problem_generator", state.get('summary'))
     full_input = [SystemMessage(content=prompt)] + context_messages
     
-    response = llm.invoke(full_input)
+    return await ainvoke_llm(get_llm("gpt-4o"), full_input)
+
+async def prefetch_problem(state: AgentState, node_id: str):
+    """Background half of teacher_node: the problem a "Quiz me" would get, unless the bank has one."""
+    # Runs alongside the chat turn, so it can't share the turn's session
+    async with begin_turn() as turn:
+        prog = await turn.progress_for(state)
+        mistakes = list(prog.mistakes) if prog and prog.mistakes else []
+        grade = grade_number(state.get('grade_level'))
+        if prog and await turn.db.run_sync(lambda s: has_unseen_problem(s, prog.player_id, node_id, grade)):
+            return None
+    return await generate_problem(state, mistakes)
+
+async def problem_node(state: AgentState, config: RunnableConfig = None):
+    topic_broad = state['topic']
+    prefetch_key = thread_key(config, state)
+    node_id = None
+    
+    # Serve from the pre-generated bank when the student is on a known concept (see problem_bank.py)
+    banked = None
+    mistakes = []
+    try:
+        async with turn_scope() as turn:
+            prog = await turn.progress_for(state)
+            mistakes = list(prog.mistakes) if prog and prog.mistakes else []
+            if prog and prog.current_node:
+                node_id, grade = prog.current_node, grade_number(state.get('grade_level'))
+                banked = await turn.db.run_sync(lambda s: pick_problem(s, prog.player_id, topic_broad, node_id, grade, mistakes))
+    except Exception as e:
+        print(f"DB Error (problem bank): {e}")
+    
+    if banked:
+        print(f"[AGENTS] PROBLEM NODE served bank problem #{banked['id']}")
+        discard_prefetch(prefetch_key)
+        response = AIMessage(content=banked["problem"])
+        expected_answer = banked["answer"]
+    else:
+        # Started by teacher_node right after the explanation (see prefetch.py)
+        response = await take_prefetch(prefetch_key, node_id) if node_id else None
+        if response is not None:
+            print("[AGENTS] PROBLEM NODE served prefetched problem")
+        else:
+            response = await generate_problem(state, mistakes)
+        expected_answer = ""
     print(f"RESPONSE:\n{response.content}\n")
     
-    log_interaction(
+    queue_interaction(
         username=state.get("username", "Unknown"),
         subject=topic_broad,
         user_query="[System Triggered Problem Generation]",
@@ -319,9 +425,23 @@ def problem_node(state: AgentState):
         source_node="problem_generator"
     )
     
-    return {"messages": [response], "current_action": "PROBLEM_GIVEN", "last_problem": response.content, "next_dest": "END"}
+    return {"messages": [response], "current_action": "PROBLEM_GIVEN", "last_problem": response.content, "expected_answer": expected_answer, "next_dest": "END"}
+
+CORRECT_PRAISE = ["Outstanding!", "You're crushing it!", "Nailed it!", "Fantastic work!"]
+INCORRECT_ENCOURAGEMENT = [
+    "Not quite, but you're close!",
+    "Mistakes are proof you are trying!",
+    "Good effort - let's take another look.",
+]
 
-def verifier_node(state: AgentState):
+def local_verdict_message(correct: bool, answer: str) -> str:
+    # Same [CORRECT]/[INCORRECT] contract as VERIFIER_PROMPT, so the adapter and UI see no difference
+    if correct:
+        return f"[CORRECT] {random.choice(CORRECT_PRAISE)} {answer.strip()} is exactly right."
+    return (f"[INCORRECT] {random.choice(INCORRECT_ENCOURAGEMENT)} {answer.strip()} isn't the answer. "
+            "Re-read the problem, check each step, and give it another try.")
+
+async def verifier_node(state: AgentState):
     messages = state['messages']
     last_answer = messages[-1].content
     problem_context = state.get('last_problem', 'Unknown')
@@ -332,38 +452,80 @@ def verifier_node(state: AgentState):
         else:
              problem_context = "Unknown context. Please ask the student to restate the problem."
 
-    prompt = VERIFIER_PROMPT.format(last_problem=problem_context, last_answer=last_answer)
-    print(f"\n[AGENTS] VERIFIER NODE\nPROMPT:\n{prompt}\n")
-    
-    response = llm.invoke([SystemMessage(content=prompt)])
+    # Answer-keyed problems (problem bank) are checked locally when the answer is mechanical
+    expected = state.get('expected_answer')
+    # Off the event loop: a big expression can still take a moment to evaluate
+    verdict = await asyncio.to_thread(check_answer, expected, last_answer) if expected else None
+    
+    judged = True
+    if verdict is not None:
+        print(f"[AGENTS] VERIFIER NODE checked locally: {'correct' if verdict else 'incorrect'}")
+        response = AIMessage(content=local_verdict_message(verdict, last_answer))
+    elif VERIFY_MODE == "fused":
+        response = await fused_verify(state, problem_context, last_answer, expected)
+    else:
+        prompt = VERIFIER_PROMPT.format(last_problem=problem_context, last_answer=last_answer)
+        if expected:
+            prompt += f"\nAnswer Key: {expected}\n"
+        print(f"\n[AGENTS] VERIFIER NODE\nPROMPT:\n{prompt}\n")
+        
+        response = await ainvoke_llm(get_llm("gpt-4o"), [SystemMessage(content=prompt)])
+        judged = False
     content = response.content
     print(f"RESPONSE:\n{content}\n")
     
-    log_interaction(state.get("username"), state.get("topic"), last_answer, content, "verifier")
+    queue_interaction(state.get("username"), state.get("topic"), last_answer, content, "verifier")
     
     # Pass to Adapter
-    return {"messages": [response], "next_dest": "ADAPTER"}
+    return {"messages": [response], "next_dest": "ADAPTER", "judged": judged}
 
-def adapter_node(state: AgentState):
+async def fused_verify(state: AgentState, problem_context: str, last_answer: str, expected: str = None) -> AIMessage:
     """
-    Decides on Mastery vs Remediation based on history.
+    One JSON-mode call for feedback + verdict + struggling (VERIFY_MODE=fused).
+    The reply carries the usual [CORRECT]/[INCORRECT] token so the adapter can decide locally.
     """
-    topic = state.get("topic", "General")
-    messages = state['messages']
+    history = transcript(recent_messages(state['messages'][:-1], budget_for("adapter")))
+    prompt = VERIFY_AND_ADAPT_PROMPT.format(
+        last_problem=problem_context,
+        last_answer=last_answer,
+        answer_key=f"Answer Key: {expected}" if expected else "",
+        history=history or "(none)",
+    )
+    print(f"\n[AGENTS] VERIFIER NODE (fused)\nPROMPT:\n{prompt}\n")
     
-    # Extract recent interaction history (last 10 messages) for context
-    history_str = ""
-    for m in messages[-10:]:
-        role = "Student: " if isinstance(m, HumanMessage) else "Agent: "
-        history_str += f"{role}{m.content}\n"
+    fused_llm = get_llm("gpt-4o", response_format={"type": "json_object"})
+    response = await ainvoke_llm(fused_llm, [SystemMessage(content=prompt)])
+    try:
+        data = json.loads(response.content)
+    except:
+        print("Fused Verifier JSON Parse Error")
+        data = {"verdict": "UNCLEAR", "feedback": response.content}
+    
+    verdict = str(data.get("verdict", "UNCLEAR")).upper()
+    feedback = str(data.get("feedback") or "").strip()
+    # Struggling on a wrong answer counts toward remediation like any miss; an unclear
+    # non-answer from a struggling student counts too (what the LLM adapter would do)
+    if data.get("struggling") and verdict == "UNCLEAR":
+        verdict = "INCORRECT"
+    
+    if verdict in ("CORRECT", "INCORRECT"):
+        feedback = f"[{verdict}] " + feedback.replace("[CORRECT]", "").replace("[INCORRECT]", "").strip()
+    return AIMessage(content=feedback)
+
+async def llm_adapter_decision(topic: str, messages, summary: str = None) -> tuple:
+    """(decision, remediation_topic) from the JSON-mode adapter LLM."""
+    # Recent interaction history within the adapter's token budget
+    history_str = transcript(recent_messages(messages, budget_for("adapter"))) + "\n"
+    if summary:
+        history_str = f"(Earlier: {summary})\n" + history_str
         
     prompt = ADAPTER_PROMPT.format(topic=topic, history=history_str)
     
     print(f"\n[AGENTS] ADAPTER NODE\nPROMPT:\n{prompt}\n")
     
     # Force JSON output
-    adapter_llm = ChatOpenAI(model="gpt-4o", model_kwargs={"response_format": {"type": "json_object"}})
-    response = adapter_llm.invoke([SystemMessage(content=prompt)])
+    adapter_llm = get_llm("gpt-4o", response_format={"type": "json_object"})
+    response = await ainvoke_llm(adapter_llm, [SystemMessage(content=prompt)])
     content = response.content
     print(f"RESPONSE:\n{content}\n")
     
@@ -374,34 +536,67 @@ def adapter_node(state: AgentState):
         print("Adapter JSON Parse Error")
         decision_data = {"decision": "CONTINUE_PRACTICE"}
         
-    decision = decision_data.get("decision", "CONTINUE_PRACTICE")
-    remediation_topic = decision_data.get("remediation_topic")
+    return decision_data.get("decision", "CONTINUE_PRACTICE"), decision_data.get("remediation_topic")
+
+async def adapter_node(state: AgentState):
+    """
+    Decides on Mastery vs Remediation from the verifier's streaks (mastery_policy.py),
+    asking the LLM only when the turn is ambiguous.
+    """
+    topic = state.get("topic", "General")
+    messages = state['messages']
+    
+    verdict = verdict_of(messages[-1].content) if messages else None
+    student_msg = messages[-2].content if len(messages) >= 2 else ""
+    
+    # Streaks live on TopicProgress so they survive session resets; state mirrors them
+    correct_streak, incorrect_streak = state.get("correct_streak") or 0, state.get("incorrect_streak") or 0
+    async with turn_scope() as turn:
+        prog = await turn.progress_for(state)
+        if prog:
+            correct_streak, incorrect_streak = prog.correct_streak or 0, prog.incorrect_streak or 0
+    correct_streak, incorrect_streak = update_streaks(correct_streak, incorrect_streak, verdict)
+    
+    if state.get("judged") or (verdict and not is_confused(student_msg)):
+        decision = decide(correct_streak, incorrect_streak)
+        print(f"[AGENTS] ADAPTER NODE policy: {verdict} (streaks {correct_streak}/{incorrect_streak}) -> {decision}")
+    else:
+        decision, _ = await llm_adapter_decision(topic, messages, state.get('summary'))
+    
+    # A decision moves the student on, so the next node starts from zero
+    if decision in ("MASTERED", "REMEDIATE"):
+        correct_streak, incorrect_streak = 0, 0
+    streaks = {"correct_streak": correct_streak, "incorrect_streak": incorrect_streak}
+    if prog:
+        async with turn_scope() as turn:
+            prog = await turn.progress_for(state)
+            prog.correct_streak, prog.incorrect_streak = correct_streak, incorrect_streak
+            await turn.save()
     
     # DB Logic
-    user = state.get("username", "Player1")
     new_mastery = -1
     
     if decision == "MASTERED":
         # Mark Complete in DB
         kg = get_graph(topic)
         completed = []
-        db = SessionLocal()
-        try:
-             player = db.query(Player).filter(Player.username == user).first()
+        progress_id = None
+        done_unit, total_unit = 0, 0
+        done_subj, total_subj = 0, 0
+        done_grade, total_grade = 0, 0
+        async with turn_scope() as turn:
+             player = await turn.player_for(state)
              if player:
-                prog = db.query(TopicProgress).filter(
-                    TopicProgress.player_id == player.id, 
-                    TopicProgress.topic_name == topic
-                ).first()
+                prog = await turn.progress_for(state)
                 if prog and prog.current_node:
-                    completed = list(prog.completed_nodes) if prog.completed_nodes else []
-                    if prog.current_node not in completed:
-                        completed.append(prog.current_node)
-                        prog.completed_nodes = completed
+                    progress_id = prog.id
+                    if await turn.db.run_sync(add_completed_nodes, prog, [prog.current_node]):
                         prog.current_node = None
-                        db.commit()
+                        turn.forget_completed(prog.id)
+                        await turn.db.run_sync(lambda s: refresh_mastery_rollup(player.id, s))
                         print(f"[KG] Node Mastered by Adapter!")
-                        
+                    completed = await turn.completed(prog.id)
+
                     # Calculate Multi-Level Mastery
                     subtree_root = None
                     if completed and "->" in completed[-1]:
@@ -411,17 +606,14 @@ def adapter_node(state: AgentState):
                          else:
                              subtree_root = parts[0]
                          
-                    done_unit, total_unit = kg.get_completion_stats(completed, subtree_root)
-                    done_subj, total_subj = kg.get_completion_stats(completed)
+                    done_unit, total_unit = kg.get_completion_stats(completed, subtree_root, learner_key=progress_id)
+                    done_subj, total_subj = kg.get_completion_stats(completed, learner_key=progress_id)
                     
                     if total_subj > 0:
                         prog.mastery_score = int((done_subj / total_subj) * 100) # Persist Subject Mastery
-                        db.commit()
+                    await turn.save() # Completion + rollup + score in one commit
                         
-                    done_grade, total_grade = get_all_subjects_stats(player.id, db)
-                    
-        finally:
-            db.close()
+                    done_grade, total_grade = await turn.db.run_sync(lambda s: get_all_subjects_stats(player.id, s))
             
         mastery_data = {
             "unit": 0.0, "subject": 0.0, "grade": 0.0
@@ -430,53 +622,49 @@ def adapter_node(state: AgentState):
         if total_subj > 0: mastery_data["subject"] = round((done_subj / total_subj) * 100, 1)
         if total_grade > 0: mastery_data["grade"] = round((done_grade / total_grade) * 100, 1)
             
-        # Auto-Advance Logic
-        candidates = kg.get_next_learnable_nodes(completed)
+        # Auto-Advance Logic (only need to know: none, exactly one, or the top 3 choices)
+        candidates = kg.get_next_learnable_nodes(completed, limit=3, learner_key=progress_id)
         
         if len(candidates) == 1:
              # Auto-advance
              next_label = candidates[0].label
              msg = AIMessage(content=f"Excellent work! You've mastered {topic}. Auto-advancing to: {next_label}...")
-             return {"messages": [msg], "current_action": "EXPLAINING", "next_dest": "TEACHER", "mastery": new_mastery}
+             return {"messages": [msg], "current_action": "EXPLAINING", "next_dest": "TEACHER", "mastery": new_mastery, **streaks}
         elif len(candidates) > 1:
              # Choice needed
              options_str = ", ".join([c.label for c in candidates[:3]])
              msg = AIMessage(content=f"Excellent! {topic} mastered. Next options: {options_str}. What would you like to learn?")
-             return {"messages": [msg], "current_action": "IDLE", "next_dest": "END", "mastery": new_mastery}
+             return {"messages": [msg], "current_action": "IDLE", "next_dest": "END", "mastery": new_mastery, **streaks}
 
         # Finished
         msg = AIMessage(content=f"Excellent work! You've mastered {topic}. Let's move on!")
-        return {"messages": [msg], "current_action": "IDLE", "next_dest": "END", "mastery": new_mastery}
+        return {"messages": [msg], "current_action": "IDLE", "next_dest": "END", "mastery": new_mastery, **streaks}
 
-    elif decision == "REMEDIATE" and remediation_topic:
+    elif decision == "REMEDIATE":
         # Find Prereq
         kg = get_graph(topic)
-        db = SessionLocal()
         target_remediation = None
-        try:
-            player = db.query(Player).filter(Player.username == user).first()
-            prog = db.query(TopicProgress).filter(TopicProgress.player_id == player.id, TopicProgress.topic_name == topic).first()
+        async with turn_scope() as turn:
+            prog = await turn.progress_for(state)
             if prog and prog.current_node:
                 current_node_id = prog.current_node
                 prereqs = kg.get_prerequisites(current_node_id)
                 if prereqs:
                     target_remediation = prereqs[0] # Pick first one
-        finally:
-            db.close()
             
         if target_remediation:
              msg = AIMessage(content=f"It seems we should review a prerequisite: {target_remediation}. Let's switch focus.")
-             return {"messages": [msg], "current_action": "IDLE", "next_dest": "TEACHER"} 
+             return {"messages": [msg], "current_action": "IDLE", "next_dest": "TEACHER", **streaks}
         
     # Default: Continue
-    return {"messages": [], "next_dest": "PROBLEM_GENERATOR"}
+    return {"messages": [], "next_dest": "PROBLEM_GENERATOR", **streaks}
 
-def chat_node(state: AgentState):
+async def chat_node(state: AgentState):
     print(f"\n[AGENTS] GENERAL CHAT NODE\nMessages: {state['messages']}\n")
-    response = llm.invoke(state['messages'])
+    response = await ainvoke_llm(get_llm("gpt-4o"), build_context(state['messages'], "general_chat", state.get('summary')))
     print(f"RESPONSE:\n{response.content}\n")
     
-    log_interaction(
+    queue_interaction(
         username=state.get("username", "Unknown"),
         subject="General",
         user_query=state['messages'][-1].content if state['messages'] else "",
@@ -507,12 +695,12 @@ def route_step(state: AgentState):
 def create_graph():
     builder = StateGraph(AgentState)
     
-    builder.add_node("supervisor", supervisor_node)
-    builder.add_node("teacher", teacher_node)
-    builder.add_node("problem_generator", problem_node)
-    builder.add_node("verifier", verifier_node)
-    builder.add_node("adapter", adapter_node)
-    builder.add_node("general_chat", chat_node)
+    builder.add_node("supervisor", traced_node("supervisor", supervisor_node))
+    builder.add_node("teacher", traced_node("teacher", teacher_node))
+    builder.add_node("problem_generator", traced_node("problem_generator", problem_node))
+    builder.add_node("verifier", traced_node("verifier", verifier_node))
+    builder.add_node("adapter", traced_node("adapter", adapter_node))
+    builder.add_node("general_chat", traced_node("general_chat", chat_node))
     
     builder.set_entry_point("supervisor")
     
@@ -1,6 +1,11 @@
 import json
 import os
 
+try:
+    from .metrics import timed_kg
+except ImportError:
+    from metrics import timed_kg
+
 class GraphNavigator:
     def __init__(self, data_dir=None):
         if data_dir is None:
@@ -83,6 +88,7 @@ class GraphNavigator:
     def get_node(self, path):
         return self.node_map.get(path)
 
+    @timed_kg("get_next_options")
     def get_next_options(self, completed_nodes, current_grade_level, subject_filter=None):
         """
         Returns a list of available next nodes (paths).
@@ -0,0 +1,168 @@
+import asyncio
+import datetime
+import json
+import os
+import threading
+from collections import Counter, deque
+from typing import Dict, List
+
+from sqlalchemy import insert
+
+try:
+    from .database import AsyncSessionLocal, Interaction
+except ImportError:
+    from database import AsyncSessionLocal, Interaction
+
+# Batched interaction logging.
+#
+# Nodes call queue_interaction(), which only appends to an in-memory buffer, so
+# logging is off the chat turn's latency path. The logger task started in main's
+# lifespan writes the buffer with one bulk insert + one commit when it reaches
+# INTERACTION_LOG_BATCH rows or every INTERACTION_LOG_FLUSH_SECONDS, and once
+# more on shutdown.
+#
+# Memory is bounded: past INTERACTION_LOG_MAX_PENDING rows (DB down or slow),
+# new rows are appended to the spill file instead, and dropped once that file
+# is over its size cap (or when spilling is off). Rows that fail to insert are
+# spilled too. Spilled rows are loaded back on the next successful flush.
+#
+# Env:
+#   INTERACTION_LOG_BATCH          - rows that trigger an early flush (default 50)
+#   INTERACTION_LOG_FLUSH_SECONDS  - max seconds a row waits in memory (default 2)
+#   INTERACTION_LOG_MAX_PENDING    - rows kept in memory before spilling (default 5000)
+#   INTERACTION_LOG_SPILL          - spill file path, "" to drop instead (default interaction_log_spill.jsonl)
+#   INTERACTION_LOG_SPILL_MAX_MB   - spill file cap; rows past it are dropped (default 50)
+
+BATCH_SIZE = int(os.getenv("INTERACTION_LOG_BATCH", "50"))
+FLUSH_INTERVAL = float(os.getenv("INTERACTION_LOG_FLUSH_SECONDS", "2"))
+MAX_PENDING = int(os.getenv("INTERACTION_LOG_MAX_PENDING", "5000"))
+SPILL_PATH = os.getenv("INTERACTION_LOG_SPILL", "interaction_log_spill.jsonl")
+SPILL_MAX_BYTES = int(float(os.getenv("INTERACTION_LOG_SPILL_MAX_MB", "50")) * 1024 * 1024)
+
+_pending = deque()  # row dicts waiting for the next flush
+_lock = threading.Lock()  # nodes may log from worker threads
+_spill_lock = threading.Lock()
+_flush_lock = None  # asyncio.Lock for the loop in _flush_loop
+_flush_loop = None
+_logger_loop = None  # loop running run_interaction_logger, if any
+_stats = Counter()
+
+def queue_interaction(username: str, subject: str, user_query: str, agent_response: str, source_node: str):
+    row = {
+        "timestamp": datetime.datetime.utcnow(),
+        "username": username,
+        "subject": subject,
+        "user_query": user_query,
+        "agent_response": agent_response,
+        "source_node": source_node,
+    }
+    with _lock:
+        queued = len(_pending) < MAX_PENDING
+        if queued:
+            _pending.append(row)
+            _stats["queued"] += 1
+        full = len(_pending) >= BATCH_SIZE
+    if not queued:
+        _spill([row])
+    elif full:
+        _flush_soon()
+
+def _flush_soon():
+    # Size trigger: flush now instead of waiting for the logger's timer
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    if loop is _logger_loop and not (_flush_loop is loop and _flush_lock.locked()):
+        loop.create_task(flush_interactions())
+
+def _spill(rows: List[Dict]):
+    if not SPILL_PATH:
+        _stats["dropped"] += len(rows)
+        return
+    with _spill_lock:
+        try:
+            size = os.path.getsize(SPILL_PATH) if os.path.exists(SPILL_PATH) else 0
+            written = 0
+            with open(SPILL_PATH, "a") as f:
+                for row in rows:
+                    line = json.dumps({**row, "timestamp": row["timestamp"].isoformat()}) + "\n"
+                    if size + len(line) > SPILL_MAX_BYTES:
+                        break
+                    f.write(line)
+                    size += len(line)
+                    written += 1
+            _stats["spilled"] += written
+            _stats["dropped"] += len(rows) - written
+        except OSError as e:
+            print(f"[InteractionLog] Spill failed, dropping {len(rows)} rows: {e}")
+            _stats["dropped"] += len(rows)
+
+def _take_spilled() -> List[Dict]:
+    if not SPILL_PATH:
+        return []
+    with _spill_lock:
+        if not os.path.exists(SPILL_PATH):
+            return []
+        rows = []
+        try:
+            with open(SPILL_PATH) as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                        row["timestamp"] = datetime.datetime.fromisoformat(row["timestamp"])
+                        rows.append(row)
+                    except (ValueError, KeyError):
+                        continue  # torn last line from a crash
+            os.remove(SPILL_PATH)
+        except OSError as e:
+            print(f"[InteractionLog] Could not read spill file: {e}")
+            return []
+    return rows
+
+async def flush_interactions() -> int:
+    """Writes everything buffered (plus any spilled rows) in one insert. Returns rows written."""
+    global _flush_lock, _flush_loop
+    loop = asyncio.get_running_loop()
+    if _flush_loop is not loop:
+        _flush_lock, _flush_loop = asyncio.Lock(), loop
+    async with _flush_lock:
+        with _lock:
+            rows = list(_pending)
+            _pending.clear()
+        if not rows and not (SPILL_PATH and os.path.exists(SPILL_PATH)):
+            return 0
+        rows = _take_spilled() + rows
+        if not rows:
+            return 0
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(Interaction), rows)
+                await db.commit()
+        except asyncio.CancelledError:
+            # Shutdown cancelled the logger mid-insert; the final flush picks these up
+            with _lock:
+                _pending.extendleft(reversed(rows))
+            raise
+        except Exception as e:
+            print(f"DB Error (interaction log flush, {len(rows)} rows): {e}")
+            _stats["failed_flushes"] += 1
+            _spill(rows)
+            return 0
+        _stats["flushes"] += 1
+        _stats["written"] += len(rows)
+        return len(rows)
+
+async def run_interaction_logger(interval: float = FLUSH_INTERVAL):
+    """Background task for lifespan; cancel it, then await flush_interactions() on shutdown."""
+    global _logger_loop
+    _logger_loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        await flush_interactions()
+
+def interaction_log_stats() -> Dict:
+    with _lock:
+        pending = len(_pending)
+    keys = ("queued", "written", "flushes", "failed_flushes", "spilled", "dropped")
+    return {**{k: _stats[k] for k in keys}, "pending": pending}
@@ -0,0 +1,310 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from typing import Dict, List, Optional
+
+# Binary snapshot of one {State}/{Subject} knowledge graph directory.
+#
+# Layout (little-endian, every section 4-byte aligned):
+#   header        magic, version, node/edge/string counts, blob size,
+#                 sha256 of the source JSON files, crc32 of the payload
+#   str_offsets   int32[string_count + 1]  offsets into the string blob
+#   node table    int32[N] x 6  id, label, description, type, node_type (string
+#                               index, -1 = missing) and grade_level
+#   succ_ptr/idx  int32[N + 1] / int32[E]  CSR successors
+#   pred_ptr/idx  int32[N + 1] / int32[E]  CSR predecessors
+#   subtree_end   int32[N]      exclusive end index of each node's subtree
+#   core_prefix   int32[N + 1]  running count of core concepts
+#   blob          utf-8 bytes of the interned strings
+#
+# Nodes are stored in DFS order of their "A->B->C" id paths, so every subtree is
+# the contiguous index range [i, subtree_end[i]) and its core-concept count is
+# core_prefix[end] - core_prefix[i].
+#
+# The JSON loader compiles into the same format in memory, so KnowledgeGraph has
+# a single read path. On-disk snapshots are build artifacts (see
+# scripts/build_kg_snapshots.py). The loader rejects anything whose version,
+# checksum or source digest doesn't match, and the caller falls back to parsing
+# the JSON files.
+
+SNAPSHOT_MAGIC = b"KGSNAP\x00\x00"
+SNAPSHOT_VERSION = 2
+SNAPSHOT_EXT = ".kgsnap"
+
+MISSING = -1
+GRADE_MISSING = -(2 ** 31)
+
+_HEADER = struct.Struct("<8sIIIII32sI")
+_NODE_COLUMNS = ("ids", "labels", "descriptions", "types", "node_types", "grades")
+
+
+def snapshot_path(subject_dir: str) -> str:
+    # data/knowledge_graphs/NH/Math -> data/knowledge_graphs/NH/Math.kgsnap
+    return os.path.normpath(subject_dir) + SNAPSHOT_EXT
+
+
+def source_files(subject_dir: str) -> List[str]:
+    return sorted([f for f in os.listdir(subject_dir) if f.endswith(".json")])
+
+
+def source_digest(subject_dir: str) -> bytes:
+    """sha256 over the names and contents of every JSON file in the directory."""
+    h = hashlib.sha256()
+    for fname in source_files(subject_dir):
+        h.update(fname.encode("utf-8") + b"\x00")
+        with open(os.path.join(subject_dir, fname), "rb") as f:
+            h.update(f.read())
+        h.update(b"\x00")
+    return h.digest()
+
+
+def id_path(node_id: str) -> List[str]:
+    return node_id.split("->")
+
+
+def _pad4(n: int) -> int:
+    return (4 - n % 4) % 4
+
+
+def _to_le_bytes(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+class GraphBuilder:
+    """
+    Mutable staging graph used while parsing the JSON sources.
+    Follows networkx.DiGraph semantics for the operations the parsers use:
+    re-adding a node merges its attributes, edges implicitly create bare nodes,
+    duplicate edges are ignored and insertion order is preserved.
+    """
+
+    def __init__(self):
+        self.nodes: Dict[str, Dict] = {}
+        self.succ: Dict[str, Dict[str, None]] = {}
+        self.pred: Dict[str, Dict[str, None]] = {}
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def add_node(self, node_id: str, **attrs):
+        if node_id not in self.nodes:
+            self.nodes[node_id] = {}
+            self.succ[node_id] = {}
+            self.pred[node_id] = {}
+        self.nodes[node_id].update(attrs)
+
+    def add_edge(self, u: str, v: str):
+        self.add_node(u)
+        self.add_node(v)
+        self.succ[u][v] = None
+        self.pred[v][u] = None
+
+
+def compile_graph(builder: GraphBuilder, digest: bytes) -> bytes:
+    """Serializes a parsed graph into snapshot bytes."""
+    # DFS (pre-order) layout: sorting by path segments puts each node right
+    # before its descendants and keeps every subtree contiguous.
+    nodes = sorted(builder.nodes, key=id_path)
+    index = {n: i for i, n in enumerate(nodes)}
+
+    strings: List[bytes] = []
+    interned: Dict[str, int] = {}
+
+    def intern(value) -> int:
+        if value is None:
+            return MISSING
+        value = str(value)
+        if value not in interned:
+            interned[value] = len(strings)
+            strings.append(value.encode("utf-8"))
+        return interned[value]
+
+    columns = {name: array("i") for name in _NODE_COLUMNS}
+    for n in nodes:
+        data = builder.nodes[n]
+        columns["ids"].append(intern(n))
+        columns["labels"].append(intern(data.get("label")))
+        columns["descriptions"].append(intern(data.get("description")))
+        columns["types"].append(intern(data.get("type")))
+        columns["node_types"].append(intern(data.get("node_type")))
+        grade = data.get("grade_level")
+        columns["grades"].append(GRADE_MISSING if grade is None else int(grade))
+
+    def csr(adjacency):
+        ptr, idx = array("i", [0]), array("i")
+        for n in nodes:
+            idx.extend(index[m] for m in adjacency[n])
+            ptr.append(len(idx))
+        return ptr, idx
+
+    succ_ptr, succ_idx = csr(builder.succ)
+    pred_ptr, pred_idx = csr(builder.pred)
+
+    subtree_end = array("i", [len(nodes)] * len(nodes))
+    open_subtrees = []  # (index, path) of ancestors of the current node
+    for i, n in enumerate(nodes):
+        path = id_path(n)
+        while open_subtrees:
+            top, top_path = open_subtrees[-1]
+            if len(path) > len(top_path) and path[:len(top_path)] == top_path:
+                break
+            subtree_end[top] = i
+            open_subtrees.pop()
+        open_subtrees.append((i, path))
+
+    core_prefix = array("i", [0])
+    for n in nodes:
+        data = builder.nodes[n]
+        is_core = data.get("type") == "concept" and data.get("node_type") == "core"
+        core_prefix.append(core_prefix[-1] + (1 if is_core else 0))
+
+    str_offsets = array("i", [0])
+    for s in strings:
+        str_offsets.append(str_offsets[-1] + len(s))
+    blob = b"".join(strings)
+    blob += b"\x00" * _pad4(len(blob))
+
+    payload = b"".join([
+        _to_le_bytes(str_offsets),
+        *(_to_le_bytes(columns[name]) for name in _NODE_COLUMNS),
+        _to_le_bytes(succ_ptr), _to_le_bytes(succ_idx),
+        _to_le_bytes(pred_ptr), _to_le_bytes(pred_idx),
+        _to_le_bytes(subtree_end), _to_le_bytes(core_prefix),
+        blob,
+    ])
+
+    header = _HEADER.pack(
+        SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(nodes), len(succ_idx),
+        len(strings), len(blob), digest, zlib.crc32(payload)
+    )
+    return header + payload
+
+
+def save_snapshot(data: bytes, path: str) -> str:
+    """Atomically replaces the snapshot file at path."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return path
+
+
+def write_snapshot(builder: GraphBuilder, subject_dir: str, path: str = None) -> str:
+    """Compiles the graph and atomically replaces the snapshot on disk."""
+    data = compile_graph(builder, source_digest(subject_dir))
+    return save_snapshot(data, path or snapshot_path(subject_dir))
+
+
+class GraphSnapshot:
+    """Read-only view over snapshot bytes (a memory-mapped file or an in-memory compile)."""
+
+    def __init__(self, buf, header):
+        (_, self.version, self.node_count, self.edge_count,
+         string_count, blob_size, self.digest, _) = header
+        self._buf = buf
+        view = memoryview(buf)
+
+        n, e = self.node_count, self.edge_count
+        offset = _HEADER.size
+
+        def take_ints(count):
+            nonlocal offset
+            section = view[offset:offset + count * 4].cast("i")
+            offset += count * 4
+            return section
+
+        self._str_offsets = take_ints(string_count + 1)
+        for name in _NODE_COLUMNS:
+            setattr(self, name, take_ints(n))
+        self.succ_ptr = take_ints(n + 1)
+        self.succ_idx = take_ints(e)
+        self.pred_ptr = take_ints(n + 1)
+        self.pred_idx = take_ints(e)
+        self.subtree_end = take_ints(n)
+        self.core_prefix = take_ints(n + 1)
+        self._blob = view[offset:offset + blob_size]
+        self._strings: Dict[int, str] = {}
+
+    def string(self, i: int) -> Optional[str]:
+        if i == MISSING:
+            return None
+        s = self._strings.get(i)
+        if s is None:
+            start, end = self._str_offsets[i], self._str_offsets[i + 1]
+            s = str(self._blob[start:end], "utf-8")
+            self._strings[i] = s
+        return s
+
+    def to_bytes(self) -> bytes:
+        return bytes(self._buf)
+
+    def successors(self, i: int):
+        return self.succ_idx[self.succ_ptr[i]:self.succ_ptr[i + 1]]
+
+    def predecessors(self, i: int):
+        return self.pred_idx[self.pred_ptr[i]:self.pred_ptr[i + 1]]
+
+    def node_attrs(self, i: int) -> Dict:
+        # Mirrors the attribute dicts KnowledgeGraph._parse_* produce: missing keys stay missing
+        attrs = {}
+        for key, column in (("label", self.labels), ("description", self.descriptions),
+                            ("type", self.types), ("node_type", self.node_types)):
+            value = self.string(column[i])
+            if value is not None:
+                attrs[key] = value
+        if self.grades[i] != GRADE_MISSING:
+            attrs["grade_level"] = self.grades[i]
+        return attrs
+
+
+def parse_snapshot(buf, source: str = "<memory>") -> Optional[GraphSnapshot]:
+    """Validates magic, format version and payload checksum. Returns None on mismatch."""
+    if sys.byteorder != "little" or len(buf) < _HEADER.size:
+        return None
+
+    header = _HEADER.unpack_from(buf, 0)
+    magic, version, crc = header[0], header[1], header[-1]
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        print(f"KG snapshot {source} has unsupported format (version {version}), ignoring.")
+        return None
+
+    if zlib.crc32(memoryview(buf)[_HEADER.size:]) != crc:
+        print(f"KG snapshot {source} failed checksum, ignoring.")
+        return None
+
+    return GraphSnapshot(buf, header)
+
+
+def load_snapshot(subject_dir: str, path: str = None) -> Optional[GraphSnapshot]:
+    """
+    Memory-maps the snapshot for subject_dir.
+    Returns None if it is missing, corrupt, from another format version or stale
+    with respect to the JSON sources.
+    """
+    path = path or snapshot_path(subject_dir)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with open(path, "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as e:
+        print(f"Warning: could not map KG snapshot {path}: {e}")
+        return None
+
+    snapshot = parse_snapshot(buf, path)
+    if snapshot is None:
+        return None
+
+    if snapshot.digest != source_digest(subject_dir):
+        print(f"KG snapshot {path} is stale, ignoring.")
+        return None
+
+    return snapshot
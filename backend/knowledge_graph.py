@@ -1,17 +1,185 @@
+import bisect
+import heapq
 import json
 import os
-import networkx as nx
-from typing import List, Dict, Optional, Tuple
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Dict, Optional, Tuple
+
+try:
+    from .kg_snapshot import GraphBuilder, GRADE_MISSING, compile_graph, id_path, parse_snapshot, load_snapshot, save_snapshot, snapshot_path, source_digest
+except ImportError:
+    from kg_snapshot import GraphBuilder, GRADE_MISSING, compile_graph, id_path, parse_snapshot, load_snapshot, save_snapshot, snapshot_path, source_digest
+try:
+    from .metrics import timed_kg
+except ImportError:
+    from metrics import timed_kg
 
 GRAPH_DIR = os.path.join(os.path.dirname(__file__), "data", "knowledge_graphs")
 
+class KGNode:
+    """Read-only node record returned by KnowledgeGraph lookups."""
+    __slots__ = ("id", "label", "description", "grade_level", "type", "node_type")
+
+    def __init__(self, id, label, description, grade_level, type, node_type):
+        self.id = id
+        self.label = label
+        self.description = description
+        self.grade_level = grade_level
+        self.type = type
+        self.node_type = node_type
+
+    def __repr__(self):
+        return f"KGNode({self.id!r}, grade={self.grade_level})"
+
+class LearnerFrontier:
+    """
+    Incrementally maintained set of learnable concepts for one learner.
+
+    Each concept starts with its count of concept prerequisites; completing a
+    node decrements the counts of its concept successors (O(out-degree)) and a
+    concept joins `ready` when its count hits zero. Recommendation order is kept
+    in one lazily-pruned heap per target grade, so the top k are O(k log R).
+    """
+
+    MAX_HEAPS = 4
+
+    def __init__(self, kg: "KnowledgeGraph"):
+        self._kg = kg
+        self._reset()
+
+    def _reset(self):
+        kg = self._kg
+        self.completed = bytearray((len(kg) + 7) // 8)  # bitset over node indices (DFS order)
+        self._completed_int = 0
+        self.ready = set(kg._frontier_roots)
+        self._remaining: Dict[int, int] = {}  # only concepts touched so far
+        self._heaps: Dict[Optional[int], list] = {}
+        # Sync bookkeeping for append-only completed_nodes lists
+        self._synced: List[str] = []
+
+    def is_completed_index(self, i: int) -> bool:
+        return bool(self.completed[i >> 3] & (1 << (i & 7)))
+
+    def is_completed(self, node_id: str) -> bool:
+        i = self._kg._index.get(node_id)
+        return i is not None and self.is_completed_index(i)
+
+    def is_ready(self, node_id: str) -> bool:
+        i = self._kg._index.get(node_id)
+        return i is not None and i in self.ready
+
+    def mark_complete(self, node_id: str) -> bool:
+        """Returns False if the node is unknown or was already completed."""
+        kg = self._kg
+        i = kg._index.get(node_id)
+        if i is None or self.is_completed_index(i):
+            return False
+
+        self.completed[i >> 3] |= 1 << (i & 7)
+        self._completed_int = None
+        self.ready.discard(i)  # heap entries are pruned lazily
+
+        if kg._is_concept[i]:
+            is_concept = kg._is_concept
+            indegree = kg._concept_indegree
+            for succ in kg._snapshot.successors(i):
+                if not is_concept[succ]:
+                    continue
+                remaining = self._remaining.get(succ, indegree[succ]) - 1
+                self._remaining[succ] = remaining
+                if remaining == 0 and not self.is_completed_index(succ):
+                    self.ready.add(succ)
+                    for target_grade, heap in self._heaps.items():
+                        heapq.heappush(heap, (kg._frontier_key(succ, target_grade), succ))
+        return True
+
+    def completed_bits(self) -> int:
+        """The completed bitset as an int (bit i = node index i), cached until the next mark."""
+        if self._completed_int is None:
+            self._completed_int = int.from_bytes(self.completed, "little")
+        return self._completed_int
+
+    def sync(self, completed_nodes: List[str]):
+        """
+        Applies entries appended to completed_nodes since the last sync.
+        completed_nodes is append-only in practice; if the already-applied prefix
+        no longer matches (progress reset, list rewritten) the frontier is rebuilt.
+        The prefix check is a plain list comparison, not per-node graph work.
+        """
+        synced = len(self._synced)
+        if len(completed_nodes) < synced or completed_nodes[:synced] != self._synced:
+            self._reset()
+            synced = 0
+        new_nodes = completed_nodes[synced:]
+        for node_id in new_nodes:
+            self.mark_complete(node_id)
+        self._synced.extend(new_nodes)
+
+    def _heap(self, target_grade: Optional[int]) -> list:
+        heap = self._heaps.get(target_grade)
+        if heap is None:
+            if len(self._heaps) >= self.MAX_HEAPS:
+                self._heaps.clear()
+            key = self._kg._frontier_key
+            heap = [(key(i, target_grade), i) for i in self.ready]
+            heapq.heapify(heap)
+            self._heaps[target_grade] = heap
+        return heap
+
+    def next_indices(self, target_grade: int = None, limit: int = None) -> List[int]:
+        if limit is None:
+            key = self._kg._frontier_key
+            return sorted(self.ready, key=lambda i: key(i, target_grade))
+
+        heap = self._heap(target_grade)
+        picked = []
+        while heap and len(picked) < limit:
+            entry = heapq.heappop(heap)
+            if entry[1] in self.ready:
+                picked.append(entry)
+        for entry in picked:
+            heapq.heappush(heap, entry)
+        return [i for _, i in picked]
+
 class KnowledgeGraph:
-    def __init__(self, subject: str, state: str = "NH"):
+    """
+    Immutable, array-backed curriculum graph.
+
+    Nodes are addressed internally by integer index into the columns of a
+    GraphSnapshot (memory-mapped from disk, or compiled in memory from the JSON
+    sources). Adjacency is CSR. A networkx view is only built if `.graph` is used.
+    """
+
+    def __init__(self, subject: str, state: str = "NH", use_snapshot: bool = True):
         self.subject = subject
         self.state = state
-        self.graph = nx.DiGraph()
+        self.use_snapshot = use_snapshot
+        self.subject_dir = None
+
+        self._snapshot = None
+        self._ids: List[str] = []          # index -> node id
+        self._index: Dict[str, int] = {}   # node id -> index
+        self._nodes: List[Optional[KGNode]] = []
+        self._is_concept = bytearray()
+        self._is_core_concept = bytearray()
+        self._concepts: List[int] = []
+        self._core_concepts: List[int] = []
+        self._core_mask = 0
+        self._band_masks: Dict[Tuple[int, int], int] = {}
+        self._paths: Optional[List[List[str]]] = None
+        self._window_order: Optional[List[int]] = None
+        self._window_pos: Dict[int, int] = {}
+        self._concept_indegree: List[int] = []
+        self._frontier_roots: List[int] = []
+        self._frontiers: "OrderedDict[object, LearnerFrontier]" = OrderedDict()
+        self.frontier_lock = threading.Lock()
+        self._nx_graph = None
+        self._builder = None
+
         self.load_graph()
         
+    @timed_kg("load_graph")
     def load_graph(self):
         # Map legacy names to new directories
         subject_map = {
@@ -26,19 +194,124 @@ class KnowledgeGraph:
         dir_name = subject_map.get(self.subject.lower(), self.subject.capitalize())
         # Updated path: knowledge_graphs/{State}/{Subject}
         subject_dir = os.path.join(GRAPH_DIR, self.state, dir_name)
+        self.subject_dir = subject_dir
         
         if not os.path.exists(subject_dir):
             print(f"Warning: KG directory not found: {subject_dir}")
+            self._attach(parse_snapshot(compile_graph(GraphBuilder(), bytes(32))))
+            return
+
+        # Fast path: memory-mapped binary snapshot (built by scripts/build_kg_snapshots.py)
+        snapshot = load_snapshot(subject_dir) if self.use_snapshot else None
+        if snapshot is not None:
+            self._attach(snapshot)
+            print(f"Loaded {self.subject} graph ({self.state}) from snapshot ({snapshot.node_count} nodes).")
             return
 
         # Load all JSONs in directory
         files = sorted([f for f in os.listdir(subject_dir) if f.endswith(".json")])
         print(f"Loading {self.subject} graph ({self.state}) from {len(files)} files in {subject_dir}...")
         
+        self._builder = GraphBuilder()
         for fname in files:
             path = os.path.join(subject_dir, fname)
             self._load_single_file(path)
 
+        data = compile_graph(self._builder, source_digest(subject_dir))
+        node_count = len(self._builder)
+        self._builder = None
+        self._attach(parse_snapshot(data))
+
+        # Refresh the snapshot so the next cold start can skip the JSON parse.
+        # Best effort: read-only deployments just keep using the JSON path.
+        if self.use_snapshot and node_count > 0:
+            try:
+                self.save_snapshot()
+            except OSError as e:
+                print(f"Warning: could not write KG snapshot for {subject_dir}: {e}")
+
+    def save_snapshot(self, path: str = None) -> str:
+        return save_snapshot(self._snapshot.to_bytes(), path or snapshot_path(self.subject_dir))
+
+    def _attach(self, snapshot):
+        # Decode ids and precompute the per-node flags every read path needs
+        self._snapshot = snapshot
+        n = snapshot.node_count
+        self._ids = [snapshot.string(i) for i in snapshot.ids]
+        self._index = {node_id: i for i, node_id in enumerate(self._ids)}
+        self._nodes = [None] * n
+        self._is_concept = bytearray(n)
+        self._is_core_concept = bytearray(n)
+        for i in range(n):
+            if snapshot.string(snapshot.types[i]) == "concept":
+                self._is_concept[i] = 1
+                if snapshot.string(snapshot.node_types[i]) == "core":
+                    self._is_core_concept[i] = 1
+        self._concepts = [i for i in range(n) if self._is_concept[i]]
+        self._core_concepts = [i for i in range(n) if self._is_core_concept[i]]
+        self._core_mask = 0
+        for i in self._core_concepts:
+            self._core_mask |= 1 << i
+        self._band_masks = {}
+        self._paths = None
+
+        # Frontier index: unmet concept-prerequisite counts per concept
+        self._concept_indegree = [0] * n
+        for i in self._concepts:
+            self._concept_indegree[i] = sum(1 for p in snapshot.predecessors(i) if self._is_concept[p])
+        self._frontier_roots = [i for i in self._concepts if self._concept_indegree[i] == 0]
+        self._frontiers.clear()
+
+    def __len__(self):
+        return len(self._ids)
+
+    @property
+    def digest(self) -> str:
+        """Fingerprint of the source data, changes whenever the curriculum JSON does."""
+        return self._snapshot.digest.hex()
+
+    def __contains__(self, node_id):
+        return node_id in self._index
+
+    def node_ids(self) -> List[str]:
+        return list(self._ids)
+
+    @property
+    def graph(self):
+        """networkx view of the graph, built on first access (analysis and debug scripts)."""
+        if self._nx_graph is None:
+            import networkx as nx
+            s = self._snapshot
+            g = nx.DiGraph()
+            g.add_nodes_from((self._ids[i], s.node_attrs(i)) for i in range(s.node_count))
+            # Predecessor lists are replayed in order so nx.predecessors() matches the arrays
+            g.add_edges_from(
+                (self._ids[p], self._ids[v]) for v in range(s.node_count) for p in s.predecessors(v)
+            )
+            self._nx_graph = g
+        return self._nx_graph
+
+    def _grade(self, i: int) -> int:
+        grade = self._snapshot.grades[i]
+        return 0 if grade == GRADE_MISSING else grade
+
+    def _node(self, i: int) -> KGNode:
+        node = self._nodes[i]
+        if node is None:
+            s = self._snapshot
+            node_id = self._ids[i]
+            label = s.string(s.labels[i])
+            node = KGNode(
+                node_id,
+                label if label is not None else node_id,
+                s.string(s.descriptions[i]) or "",
+                self._grade(i),
+                s.string(s.types[i]),
+                s.string(s.node_types[i]),
+            )
+            self._nodes[i] = node
+        return node
+
     def _load_single_file(self, path):
         try:
             with open(path, "r") as f:
@@ -60,7 +333,7 @@ class KnowledgeGraph:
     def _parse_flat_list(self, nodes: List[Dict]):
         # Backward compatibility for Science/History until refactored
         for n_data in nodes:
-            self.graph.add_node(
+            self._builder.add_node(
                 n_data["id"], 
                 label=n_data["label"], 
                 grade_level=n_data.get("grade_level", 0),
@@ -68,7 +341,7 @@ class KnowledgeGraph:
                 type="concept"
             )
             for p in n_data.get("prerequisites", []):
-                self.graph.add_edge(p, n_data["id"])
+                self._builder.add_edge(p, n_data["id"])
 
     def _parse_taxonomy(self, taxonomy: Dict, parent_id: str = ""):
                 self._parse_taxonomy(value["subtopics"], current_id)
@@ -89,9 +362,9 @@ class KnowledgeGraph:
             # Check if this is a leaf node (Concept) or a Branch (Category)
             if "concepts" in value:
                 # It's a Subtopic with concepts
-                self.graph.add_node(current_id, label=key, type="subtopic", grade_level=grade, node_type=node_type)
+                self._builder.add_node(current_id, label=key, type="subtopic", grade_level=grade, node_type=node_type)
                 if parent_id:
-                    self.graph.add_edge(parent_id, current_id)
+                    self._builder.add_edge(parent_id, current_id)
                 
                 # Add Concepts
                 prev_concept_id = None
@@ -103,7 +376,7 @@ class KnowledgeGraph:
                     
                     concept_id = f"{current_id}->{label}".replace(" ", "_")
                     
-                    self.graph.add_node(
+                    self._builder.add_node(
                         concept_id, 
                         label=label, 
                         grade_level=concept_grade, 
@@ -113,168 +386,202 @@ class KnowledgeGraph:
                     )
                     
                     # Edges: Parent -> Concept
-                    self.graph.add_edge(current_id, concept_id)
+                    self._builder.add_edge(current_id, concept_id)
                     
                     # Edges: Sequential Prerequisite (within list)
                     # ONLY enforce strict sequence for CORE types
                     if prev_concept_id and concept_type == "core":
-                        self.graph.add_edge(prev_concept_id, concept_id)
+                        self._builder.add_edge(prev_concept_id, concept_id)
                     
                     prev_concept_id = concept_id
                     
             elif "subtopics" in value:
                 # It's a Subject/Topic with subtopics
-                self.graph.add_node(current_id, label=key, type="topic", grade_level=grade, node_type=node_type)
+                self._builder.add_node(current_id, label=key, type="topic", grade_level=grade, node_type=node_type)
                 if parent_id:
-                    self.graph.add_edge(parent_id, current_id)
+                    self._builder.add_edge(parent_id, current_id)
                 
                 self._parse_taxonomy(value["subtopics"], current_id)
             else:
                  # Fallback?
                  pass
 
-    def get_next_learnable_nodes(self, completed_nodes: List[str], target_grade: int = None) -> List[Dict]:
-        """Returns concept nodes where all prerequisites are met."""
-        candidates = []
-        
-        # We process ALL nodes, but filter for 'concept' type generally? 
-        # Or maybe we teach topics too? For now, focus on 'concept' type (leafs)
-        
-        for node in self.graph.nodes():
-            if node in completed_nodes:
-                continue
-            
-            # Filter: Only suggest 'concept' nodes for specific problems
-            # Use 'type' attribute
-            if self.graph.nodes[node].get("type") != "concept":
-                continue
-
-            # Check Prerequisites (incoming edges)
-            # We treat ALL incoming edges as prerequisites
-            # EXCEPTION: The edge from the Parent (Topic) is structural, not a prereq for *learning* per se?
-            # Actually, usually you must unlock the Topic (Parent) to learn the Concept.
-            # But the Parent is "completed" when... any child is? or all?
-            # Let's simplify: Prerequisites are ONLY other 'concept' nodes.
-            
-            prereqs_met = True
-            for predecessor in self.graph.predecessors(node):
-                start_node = self.graph.nodes[predecessor]
-                if start_node.get("type") == "concept":
-                    if predecessor not in completed_nodes:
-                        prereqs_met = False
-                        break
-            
-            if prereqs_met:
-                candidates.append(self.get_node(node))
-                
-        # Sort by grade level, then ID
-        if target_grade is not None:
-             # Prioritize nodes closest to the target grade
-             # Sort Key: (Distance from Target, Grade Level (lower is easier), ID)
-             candidates.sort(key=lambda x: (abs(x.grade_level - target_grade), x.grade_level, x.id))
+    # Max learners whose frontier is kept warm per subject graph
+    FRONTIER_CACHE_SIZE = 2048
+
+    def _frontier_key(self, i: int, target_grade: Optional[int]):
+        # Sort by grade level, then ID; with a target, prioritize nodes closest to it:
+        # (Distance from Target, Grade Level (lower is easier), ID)
+        grade = self._grade(i)
+        if target_grade is None:
+            return (grade, self._ids[i])
+        return (abs(grade - target_grade), grade, self._ids[i])
+
+    def new_frontier(self, completed_nodes: Iterable[str] = ()) -> LearnerFrontier:
+        frontier = LearnerFrontier(self)
+        for node_id in completed_nodes:
+            frontier.mark_complete(node_id)
+        return frontier
+
+    def frontier_for(self, learner_key, completed_nodes: List[str]) -> LearnerFrontier:
+        """
+        Returns the cached frontier for learner_key (e.g. a TopicProgress id),
+        brought up to date with completed_nodes. Callers that share a frontier
+        across threads must hold `frontier_lock`.
+        """
+        frontier = self._frontiers.get(learner_key)
+        if frontier is None:
+            frontier = LearnerFrontier(self)
+            self._frontiers[learner_key] = frontier
+            if len(self._frontiers) > self.FRONTIER_CACHE_SIZE:
+                self._frontiers.popitem(last=False)
+        else:
+            self._frontiers.move_to_end(learner_key)
+        frontier.sync(completed_nodes)
+        return frontier
+
+    @timed_kg("get_next_learnable_nodes")
+    def get_next_learnable_nodes(self, completed_nodes: List[str], target_grade: int = None,
+                                 limit: int = None, learner_key=None) -> List[KGNode]:
+        """
+        Returns concept nodes where all prerequisites are met.
+        Prerequisites are ONLY other 'concept' nodes: structural Topic/Subtopic
+        parents don't block learning a concept.
+
+        Pass learner_key to reuse that learner's incrementally-maintained
+        frontier, and limit when only the top few recommendations are needed.
+        """
+        if learner_key is None:
+            indices = self.new_frontier(completed_nodes).next_indices(target_grade, limit)
         else:
-             candidates.sort(key=lambda x: (x.grade_level, x.id))
-             
-        return candidates
+            with self.frontier_lock:
+                indices = self.frontier_for(learner_key, completed_nodes).next_indices(target_grade, limit)
+        return [self._node(i) for i in indices]
 
     def get_prerequisites(self, node_id: str) -> List[str]:
         """Returns a list of IDs of immediate prerequisites (concept predecessors)."""
-        if node_id not in self.graph:
+        i = self._index.get(node_id)
+        if i is None:
             return []
-            
-        prereqs = []
-        for predecessor in self.graph.predecessors(node_id):
-            node = self.graph.nodes[predecessor]
-            # Only count distinct concepts as learning prereqs, not structural parents?
-            # Actually, `_parse_flat_list` adds explicit prereqs. 
-            # `_parse_taxonomy` adds Parent->Child edges and Sequence edges.
-            # If we struggle with "Equality", we should review previous concept "Comparisons" (if sequential) 
-            # OR parent "Number_Sense"?
-            # Let's return ALL concept predecessors.
-            if node.get("type") == "concept":
-                prereqs.append(predecessor)
-        return prereqs
-
-    def get_node(self, node_id: str) -> Optional[object]:
-        if node_id not in self.graph:
+        # Structural parents are skipped: remediation targets the sequential/explicit concept prereqs
+        return [self._ids[p] for p in self._snapshot.predecessors(i) if self._is_concept[p]]
+
+    def get_parent(self, node_id: str) -> Optional[str]:
+        """Returns the structural parent (topic/subtopic) of a node, if any."""
+        i = self._index.get(node_id)
+        if i is None:
             return None
-        # Return a simple object-like struct for compatibility
-        data = self.graph.nodes[node_id]
-        
-        class NodeObj:
-            def __init__(self, id, data):
-                self.id = id
-                self.label = data.get("label", id)
-                self.description = data.get("description", "")
-                self.grade_level = data.get("grade_level", 0)
-                
-        return NodeObj(node_id, data)
+        s = self._snapshot
+        for p in s.predecessors(i):
+            if s.string(s.types[p]) in ("topic", "subtopic"):
+                return self._ids[p]
+        return None
 
-    def get_window(self, focus_node_id: str = None, window_size: int = 20) -> List[object]:
+    def get_node(self, node_id: str) -> Optional[KGNode]:
+        i = self._index.get(node_id)
+        if i is None:
+            return None
+        return self._node(i)
+
+    @timed_kg("get_window")
+    def get_window(self, focus_node_id: str = None, window_size: int = 20) -> List[KGNode]:
         """Returns a list of nodes centered around focus_node_id (sorted by sequence)."""
-        # 1. Get All Concept Nodes sorted by "Curriculum Order"
-        # Sort Key: (Grade, ID) - simplest heuristic for now.
-        # Ideally we traverse the edges, but DAG linearization is complex.
-        # Grade-level grouping is safer for display.
-        
-        all_concepts = []
-        for n in self.graph.nodes():
-            data = self.graph.nodes[n]
-            # Include Topics and Subtopics or just Concepts?
-            # User said "10 previous/10 following nodes". Usually implies linear list of items.
-            # Let's include everything but sorted.
-            all_concepts.append(self.get_node(n))
-            
-        # Sort
-        all_concepts.sort(key=lambda x: (x.grade_level, x.id))
-        
+        # 1. All nodes (topics and subtopics included) in "Curriculum Order": (Grade, ID).
+        # DAG linearization is complex; grade-level grouping is safer for display.
+        # The order never changes, so it is computed once per graph.
+        if self._window_order is None:
+            self._window_order = sorted(range(len(self._ids)), key=lambda i: (self._grade(i), self._ids[i]))
+            self._window_pos = {i: pos for pos, i in enumerate(self._window_order)}
+        order = self._window_order
+
         # 2. Find Index
         idx = 0
-        if focus_node_id:
-            for i, n in enumerate(all_concepts):
-                if n.id == focus_node_id:
-                    idx = i
-                    break
+        if focus_node_id and focus_node_id in self._index:
+            idx = self._window_pos[self._index[focus_node_id]]
         
         # 3. Slice
         half = window_size // 2
         start = max(0, idx - half)
-        end = min(len(all_concepts), idx + half + 1)
+        end = min(len(order), idx + half + 1)
         
-        # Adjust if at bounds to try to fill window?
-        # e.g. if start is 0, extend end.
+        # Adjust if at bounds to try to fill window
         if start == 0:
-            end = min(len(all_concepts), window_size)
-        if end == len(all_concepts):
-            start = max(0, len(all_concepts) - window_size)
+            end = min(len(order), window_size)
+        if end == len(order):
+            start = max(0, len(order) - window_size)
             
-        return all_concepts[start:end]
+        return [self._node(i) for i in order[start:end]]
 
-    def get_completion_stats(self, completed_nodes: List[str], subtree_root: str = None):
-        # Count only 'concept' nodes regarding standard curriculum (CORE)
-        # Recommended/Elective nodes do not count towards Mastery %
-        
-        candidates = self.graph.nodes()
-        if subtree_root:
-             candidates = [n for n in candidates if n.startswith(subtree_root)]
-             
-        concepts = [
-            n for n in candidates 
-            if self.graph.nodes[n].get("type") == "concept" and self.graph.nodes[n].get("node_type") == "core"
-        ]
-        total = len(concepts)
+    def subtree_range(self, subtree_root: str = None) -> Tuple[int, int]:
+        """
+        Index range [start, end) covering subtree_root and its descendants.
+        Nodes are laid out in DFS order, so this is precomputed for real nodes;
+        other path prefixes (e.g. "Arithmetic" when only deeper ids exist) are
+        resolved by bisecting the sorted id paths.
+        """
+        if not subtree_root:
+            return 0, len(self._ids)
+        i = self._index.get(subtree_root)
+        if i is not None:
+            return i, self._snapshot.subtree_end[i]
+        if self._paths is None:
+            self._paths = [id_path(n) for n in self._ids]
+        path = id_path(subtree_root)
+        start = bisect.bisect_left(self._paths, path)
+        end = bisect.bisect_left(self._paths, path + [chr(0x10FFFF)], lo=start)
+        return start, end
+
+    @timed_kg("get_completion_stats")
+    def get_completion_stats(self, completed_nodes: List[str], subtree_root: str = None, learner_key=None):
+        """
+        Returns (done, total) core concepts, optionally scoped to the subtree under
+        subtree_root (a node id path such as "Arithmetic->Number_Sense").
+        Recommended/Elective nodes do not count towards Mastery %.
+
+        Totals come from the precomputed core_prefix counts; "done" is a popcount
+        over the learner's completed bitset restricted to the subtree's range.
+        """
+        start, end = self.subtree_range(subtree_root)
+        core_prefix = self._snapshot.core_prefix
+        total = core_prefix[end] - core_prefix[start]
         if total == 0:
             return 0, 0
-            
-        done = len([
-            n for n in completed_nodes 
-            if n in self.graph 
-            and (not subtree_root or n.startswith(subtree_root))
-            and self.graph.nodes[n].get("type") == "concept" 
-            and self.graph.nodes[n].get("node_type") == "core"
-        ])
+
+        bits = self._completed_bits(completed_nodes, learner_key)
+        window = (1 << (end - start)) - 1
+        done = ((bits & self._core_mask) >> start & window).bit_count()
         return done, total
 
+    @timed_kg("get_grade_band_stats")
+    def get_grade_band_stats(self, completed_nodes: List[str], bands: List[Tuple[str, int, int]], learner_key=None) -> Dict[str, Tuple[int, int]]:
+        """
+        (done, total) core concepts per grade band, e.g. bands=[("K-2", 0, 2), ...]
+        with inclusive grade bounds. Band masks are built once per graph.
+        """
+        bits = self._completed_bits(completed_nodes, learner_key)
+        stats = {}
+        for name, lo, hi in bands:
+            mask = self._band_masks.get((lo, hi))
+            if mask is None:
+                mask = 0
+                for i in self._core_concepts:
+                    if lo <= self._grade(i) <= hi:
+                        mask |= 1 << i
+                self._band_masks[(lo, hi)] = mask
+            stats[name] = ((bits & mask).bit_count(), mask.bit_count())
+        return stats
+
+    def _completed_bits(self, completed_nodes: List[str], learner_key=None) -> int:
+        if learner_key is not None:
+            with self.frontier_lock:
+                return self.frontier_for(learner_key, completed_nodes).completed_bits()
+        completed = bytearray((len(self._ids) + 7) // 8)
+        for n in completed_nodes:
+            i = self._index.get(n)
+            if i is not None:
+                completed[i >> 3] |= 1 << (i & 7)
+        return int.from_bytes(completed, "little")
+
 # Singleton/Factory mapping
 _graphs = {}
 
@@ -294,35 +601,9 @@ def get_all_subjects_stats(player_id: int, db_session) -> Tuple[int, int]:
     """
     Calculates the total completed core concepts vs total available core concepts
     across ALL subjects (Math, Science, History, English) for a given player.
+    Served from the player's materialized mastery rollup (see mastery_rollup.py).
     """
-    subjects = ["Math", "Science", "Social_Studies", "ELA"]
-    total_done = 0
-    total_concepts = 0
-    
-    from .database import TopicProgress # Import locally to avoid circular dep if needed
-    
-    for subj in subjects:
-        # Load Graph
-        kg = get_graph(subj)
-        if not kg or len(kg.graph.nodes) == 0:
-            continue
-            
-        # Get Player Progress for this subject
-        # Note: TopicProgress usually stores "Math", "Science" etc.
-        db_topic_name = subj
+    from .mastery_rollup import get_mastery_rollup # Import locally to avoid circular dep
 
-        
-        prog = db_session.query(TopicProgress).filter(
-            TopicProgress.player_id == player_id,
-            TopicProgress.topic_name == db_topic_name
-        ).first()
-        
-        completed = []
-        if prog and prog.completed_nodes:
-            completed = prog.completed_nodes
-            
-        done, total = kg.get_completion_stats(completed)
-        total_done += done
-        total_concepts += total
-        
-    return total_done, total_concepts
+    done, total = get_mastery_rollup(player_id, db_session)["overall"]
+    return done, total
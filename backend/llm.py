@@ -0,0 +1,149 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+from .metrics import LLM_ERRORS, LLM_QUEUE_SECONDS, record_llm_call, span
+
+# LLM clients and async invocation shared by the agent nodes.
+#
+# Clients come from a process-wide registry keyed by (model, temperature,
+# response_format). They all share one pooled httpx client per sync/async mode,
+# so connections and TLS sessions to the API are reused across turns instead of
+# being rebuilt by every new ChatOpenAI.
+#
+# Every call goes through a per-model semaphore so a classroom burst can't open
+# an unbounded number of concurrent completions against one model, and through
+# a per-call timeout so one stuck completion doesn't hold its request forever.
+#
+# LLM_BACKEND swaps every client for an offline fake (see fake_llm.py): synthetic
+# replies, replay from a recorded cassette, or record real replies into one.
+#
+# Env:
+#   LLM_BACKEND                - openai | synthetic | replay | record (default openai)
+#   LLM_MAX_CONCURRENCY        - in-flight calls allowed per model (default 16)
+#   LLM_MODEL_CONCURRENCY      - per-model overrides, e.g. "gpt-4o=16,gpt-4o-mini=48"
+#   LLM_TIMEOUT                - seconds per call, not counting time queued on the semaphore (default 60)
+#   LLM_HTTP_MAX_CONNECTIONS   - pool size across all models (default 100)
+#   LLM_HTTP_MAX_KEEPALIVE     - idle connections kept open (default 20)
+#   LLM_HTTP_KEEPALIVE_EXPIRY  - seconds an idle connection is kept (default 30)
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai").lower()
+DEFAULT_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+DEFAULT_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+
+HTTP_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20")),
+    keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "30")),
+)
+HTTP_TIMEOUT = httpx.Timeout(DEFAULT_TIMEOUT, connect=10.0)
+
+def _parse_model_limits(spec: str) -> dict:
+    limits = {}
+    for part in spec.split(","):
+        if "=" in part:
+            model, limit = part.split("=", 1)
+            limits[model.strip()] = int(limit)
+    return limits
+
+_model_limits = _parse_model_limits(os.getenv("LLM_MODEL_CONCURRENCY", ""))
+_semaphores = {}  # model -> (event loop, asyncio.Semaphore)
+
+_clients = {}  # (model, temperature, response_format json) -> ChatOpenAI
+_clients_lock = threading.Lock()
+_http_client = None
+_http_async_client = None
+
+def _http_clients():
+    global _http_client, _http_async_client
+    if _http_client is None:
+        _http_client = httpx.Client(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+        _http_async_client = httpx.AsyncClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+    return _http_client, _http_async_client
+
+def _openai_client(model: str, temperature: float = None, response_format: dict = None) -> ChatOpenAI:
+    http_client, http_async_client = _http_clients()
+    kwargs = {"model": model, "http_client": http_client, "http_async_client": http_async_client}
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    if response_format:
+        kwargs["model_kwargs"] = {"response_format": response_format}
+    return ChatOpenAI(**kwargs)
+
+def get_llm(model: str = "gpt-4o", temperature: float = None, response_format: dict = None) -> ChatOpenAI:
+    """Shared chat model for this configuration (created once per process)."""
+    key = (model, temperature, json.dumps(response_format, sort_keys=True) if response_format else None)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            if LLM_BACKEND == "openai":
+                client = _openai_client(model, temperature, response_format)
+            else:
+                # Import locally: fake_llm imports context, which imports this module
+                from .fake_llm import make_fake_llm
+                inner = _openai_client(model, temperature, response_format) if LLM_BACKEND == "record" else None
+                client = make_fake_llm(LLM_BACKEND, model, temperature, response_format, inner=inner)
+            _clients[key] = client
+    return client
+
+async def aclose_llm_clients():
+    """Closes the shared connection pools (lifespan shutdown)."""
+    global _http_client, _http_async_client
+    with _clients_lock:
+        _clients.clear()
+        http_client, http_async_client = _http_client, _http_async_client
+        _http_client = _http_async_client = None
+    if http_async_client is not None:
+        await http_async_client.aclose()
+        http_client.close()
+
+def set_model_concurrency(model: str, limit: int):
+    """Overrides the in-flight cap for one model (takes effect for new semaphores)."""
+    _model_limits[model] = limit
+    _semaphores.pop(model, None)
+
+def model_name(client) -> str:
+    return getattr(client, "model_name", None) or getattr(client, "model", None) or "default"
+
+def _semaphore(model: str) -> asyncio.Semaphore:
+    # asyncio primitives belong to one loop; tests and reloads can start new ones
+    loop = asyncio.get_running_loop()
+    entry = _semaphores.get(model)
+    if entry is None or entry[0] is not loop:
+        entry = (loop, asyncio.Semaphore(_model_limits.get(model, DEFAULT_CONCURRENCY)))
+        _semaphores[model] = entry
+    return entry[1]
+
+async def ainvoke_llm(client, messages, timeout: float = None):
+    """
+    Awaits client.ainvoke(messages) under the model's concurrency cap.
+    Raises asyncio.TimeoutError if the call itself exceeds the timeout.
+    """
+    model = model_name(client)
+    timeout = DEFAULT_TIMEOUT if timeout is None else timeout
+
+    queued = time.perf_counter()
+    async with _semaphore(model):
+        start = time.perf_counter()
+        LLM_QUEUE_SECONDS.observe(start - queued, model)
+        with span("llm", model=model):
+            try:
+                response = await asyncio.wait_for(client.ainvoke(messages), timeout)
+            except asyncio.TimeoutError:
+                print(f"[LLM] {model} call timed out after {time.perf_counter() - start:.1f}s")
+                LLM_ERRORS.inc(model, "timeout")
+                raise
+            except Exception as e:
+                LLM_ERRORS.inc(model, type(e).__name__)
+                raise
+            record_llm_call(model, time.perf_counter() - start, messages, response)
+            return response
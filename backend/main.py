@@ -1,16 +1,28 @@
-from fastapi import FastAPI, HTTPException, Depends, Form
+from fastapi import FastAPI, HTTPException, Depends, Form, WebSocket, WebSocketDisconnect
 from typing import List
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from contextlib import asynccontextmanager
-from langgraph.checkpoint.memory import MemorySaver
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import HumanMessage, AIMessageChunk
 from .models import InitRequest, ChatRequest, ChatResponse, BookSelectRequest, BookSelectResponse, InitSessionRequest, InitSessionResponse, ResumeShelfRequest, ResumeShelfResponse, PlayerStatsRequest, GraphDataRequest, GraphDataResponse, GraphNode, SetCurrentNodeRequest, RegisterRequest, LoginRequest, PasswordResetRequest
 from .graph import create_graph
-from .database import init_db, get_db, Player, TopicProgress
+from .checkpointer import create_checkpointer, run_checkpoint_sweeper
+from .llm import aclose_llm_clients
+from .problem_bank import run_problem_refiller
+from .prefetch import cancel_all_prefetches
+from .turn_context import begin_turn
+from .interaction_log import run_interaction_logger, flush_interactions
+from .nav_context import navigator, get_nav_context
+from .metrics import MetricsMiddleware, render_metrics, recent_traces, get_trace
+from .database import (
+    init_db, get_db_async, AsyncSessionLocal, get_player_async, get_progress_async, get_completed_nodes_async,
+    get_all_users_async, Player, TopicProgress, add_completed_nodes
+)
 import uuid
 import json
+import asyncio
 from passlib.context import CryptContext
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
 from fastapi.security import OAuth2PasswordBearer
@@ -134,34 +146,47 @@ graph = None
 async def lifespan(app: FastAPI):
     global graph
     init_db()
-    checkpointer = MemorySaver()
+    checkpointer = create_checkpointer()
     builder = create_graph()
     graph = builder.compile(checkpointer=checkpointer)
-    print("Graph compiled with MemorySaver.")
+    print(f"Graph compiled with {type(checkpointer).__name__}.")
+    sweeper = asyncio.create_task(run_checkpoint_sweeper(checkpointer))
+    refiller = asyncio.create_task(run_problem_refiller())
+    interaction_logger = asyncio.create_task(run_interaction_logger())
     yield
+    sweeper.cancel()
+    refiller.cancel()
+    interaction_logger.cancel()
+    cancel_all_prefetches()
+    await flush_interactions() # Don't lose the last few seconds of logs
+    await aclose_llm_clients()
     print("Shutting down.")
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware) # Latency, DB statement count and a trace per request (see metrics.py)
 
 # Auth Configuration
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 # Extended to 60 as requested
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=401,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+async def user_from_token(token: str, db: AsyncSession):
+    # Player for a valid access token, else None
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
-            raise credentials_exception
+            return None
     except JWTError:
-        raise credentials_exception
-        
-    user = db.query(Player).filter(Player.username == username).first()
+        return None
+    return await get_player_async(db, username)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db_async)):
+    credentials_exception = HTTPException(
+        status_code=401,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    user = await user_from_token(token, db)
     if user is None:
         raise credentials_exception
     return user
@@ -171,63 +196,66 @@ async def root():
     return {"status": "ok", "message": "Adaptive Learning Backend is running"}
 
 @app.get("/get_users", response_model=List[str])
-async def get_users_list(db: Session = Depends(get_db)):
-    from .database import get_all_users
-    return get_all_users()
+async def get_users_list(db: AsyncSession = Depends(get_db_async)):
+    return await get_all_users_async()
+
+@app.get("/router_stats")
+async def get_router_stats():
+    # How many supervisor decisions skipped the LLM (rules / classifier) vs. used it
+    from .router import router_stats
+    return router_stats()
+
+@app.get("/prefetch_stats")
+async def get_prefetch_stats():
+    # How often "Quiz me" was answered from a problem prefetched after the explanation
+    from .prefetch import prefetch_stats
+    return prefetch_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    # Prometheus scrape target: endpoint, graph node, LLM, DB and KG timings
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/traces")
+async def get_traces(limit: int = 20, trace_id: str = None):
+    # Recent request traces (spans for each node / LLM call); X-Trace-Id on a response names its trace
+    if trace_id:
+        spans = get_trace(trace_id)
+        if spans is None:
+            raise HTTPException(status_code=404, detail="Trace not found (evicted or unknown).")
+        return {"trace_id": trace_id, "spans": spans}
+    return {"traces": recent_traces(limit)}
 
 @app.post("/get_player_stats")
-async def get_player_stats(request: PlayerStatsRequest, db: Session = Depends(get_db)):
+async def get_player_stats(request: PlayerStatsRequest, db: AsyncSession = Depends(get_db_async)):
     # Calculate stats for all subjects for the Library UI
-    from .knowledge_graph import get_graph, get_all_subjects_stats
+    # (served from the player's materialized mastery rollup)
+    from .mastery_rollup import get_mastery_rollup, rollup_percent, SUBJECTS
     
-    player = db.query(Player).filter(Player.username == request.username).first()
+    player = await get_player_async(db, request.username)
     if not player:
         return {"stats": {}}
         
-    stats = {}
-    subjects = ["Math", "Science", "Social_Studies", "ELA"]
+    rollup = await db.run_sync(lambda s: get_mastery_rollup(player.id, s))
+    await db.commit() # Keeps the rollup row if it had to be rebuilt
     
-    for subj in subjects:
-        # DB Topic Name (Capitalized)
-        db_topic = subj
-
-        
-        # Get Progress
-        prog = db.query(TopicProgress).filter(
-            TopicProgress.player_id == player.id,
-            TopicProgress.topic_name == db_topic
-        ).first()
-        
-        # Get KG
-        kg = get_graph(subj)
-        
-        done, total = 0, 0
-        if prog and prog.completed_nodes:
-            done, total = kg.get_completion_stats(prog.completed_nodes)
-            
-        percent = 0.0
-        if total > 0:
-            percent = round((done / total) * 100, 1)
-            
-        stats[subj] = percent
-        
-    # Calculate Overall Grade Completion
-    done_grade, total_grade = get_all_subjects_stats(player.id, db)
-    grade_percent = 0.0
-    if total_grade > 0:
-        grade_percent = round((done_grade / total_grade) * 100, 1)
+    stats = {}
+    for subj in SUBJECTS:
+        stats[subj] = rollup_percent(rollup["subjects"].get(subj, (0, 0)))
         
-    stats["grade_completion"] = grade_percent
+    # Overall Grade Completion
+    stats["grade_completion"] = rollup_percent(rollup["overall"])
+    stats["grade_bands"] = {band: rollup_percent(v) for band, v in rollup["grade_bands"].items()}
     stats["current_grade_level"] = player.grade_level
     stats["role"] = player.role # [NEW]
         
     return {"stats": stats}
 
 @app.post("/register")
-async def register(request: RegisterRequest, db: Session = Depends(get_db)):
+async def register(request: RegisterRequest, db: AsyncSession = Depends(get_db_async)):
     print(f"[API] /register request received for: {request.username}")
     # Check if user exists
-    existing = db.query(Player).filter(Player.username == request.username).first()
+    existing = await get_player_async(db, request.username)
     if existing:
         raise HTTPException(status_code=400, detail="Username already registered")
         
@@ -246,12 +274,12 @@ async def register(request: RegisterRequest, db: Session = Depends(get_db)):
         interests=request.interests
     )
     db.add(player)
-    db.commit()
+    await db.commit()
     return {"message": "User created successfully"}
 
 @app.post("/request-password-reset")
-async def request_password_reset(request: PasswordResetRequest, db: Session = Depends(get_db)):
-    player = db.query(Player).filter(Player.username == request.username).first()
+async def request_password_reset(request: PasswordResetRequest, db: AsyncSession = Depends(get_db_async)):
+    player = await get_player_async(db, request.username)
     if not player or not player.email:
         # Don't reveal if user exists? For internal app usually mostly fine, but best practice is generic message.
         # "If user exists, email sent".
@@ -293,7 +321,7 @@ async def reset_password_form(token: str):
     """
 
 @app.post("/reset-password-confirm")
-async def reset_password_confirm(token: str = Form(...), new_password: str = Form(...), db: Session = Depends(get_db)):
+async def reset_password_confirm(token: str = Form(...), new_password: str = Form(...), db: AsyncSession = Depends(get_db_async)):
     from fastapi import Form
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -303,18 +331,18 @@ async def reset_password_confirm(token: str = Form(...), new_password: str = For
     except JWTError:
         raise HTTPException(status_code=400, detail="Invalid token")
         
-    player = db.query(Player).filter(Player.username == username).first()
+    player = await get_player_async(db, username)
     if not player:
         raise HTTPException(status_code=404, detail="User not found")
         
     player.password_hash = get_password_hash(new_password)
-    db.commit()
+    await db.commit()
     
     return HTMLResponse(content="<h2>Password Reset Successful</h2><p>You can now return to the app and login.</p>")
 
 @app.post("/login")
-async def login(request: LoginRequest, db: Session = Depends(get_db)):
-    player = db.query(Player).filter(Player.username == request.username).first()
+async def login(request: LoginRequest, db: AsyncSession = Depends(get_db_async)):
+    player = await get_player_async(db, request.username)
     if not player:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
     
@@ -338,21 +366,18 @@ async def login(request: LoginRequest, db: Session = Depends(get_db)):
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/select_book", response_model=BookSelectResponse)
-async def select_book(request: BookSelectRequest, current_user: Player = Depends(get_current_user), db: Session = Depends(get_db)):
+async def select_book(request: BookSelectRequest, current_user: Player = Depends(get_current_user), db: AsyncSession = Depends(get_db_async)):
     # 1. Get or Create Player
-    player = db.query(Player).filter(Player.username == request.username).first()
+    player = await get_player_async(db, request.username)
     if not player:
         # Defaults: Grade 10, New Hampshire
         player = Player(username=request.username, location="New Hampshire", grade_level=10)
         db.add(player)
-        db.commit()
-        db.refresh(player)
+        await db.commit()
+        await db.refresh(player)
     
     # 2. Get or Create Topic Progress
-    progress = db.query(TopicProgress).filter(
-        TopicProgress.player_id == player.id,
-        TopicProgress.topic_name == request.topic
-    ).first()
+    progress = await get_progress_async(db, player.id, request.topic)
     
     resume_summary = None
     adaptive_suggestion = ""
@@ -393,8 +418,8 @@ async def select_book(request: BookSelectRequest, current_user: Player = Depends
     if not progress:
         progress = TopicProgress(player_id=player.id, topic_name=request.topic)
         db.add(progress)
-        db.commit()
-        db.refresh(progress)
+        await db.commit()
+        await db.refresh(progress)
     else:
         resume_summary = f"Continuing {request.topic}. Mastery: {progress.mastery_score}%"
 
@@ -410,6 +435,8 @@ async def select_book(request: BookSelectRequest, current_user: Player = Depends
         "location": player.location,
         "learning_style": player.learning_style,
         "username": player.username,
+        "player_id": player.id,
+        "progress_id": progress.id,
         "mastery": progress.mastery_score,
         "messages": [], 
         "currrent_action": "IDLE",
@@ -423,37 +450,10 @@ async def select_book(request: BookSelectRequest, current_user: Player = Depends
     # But for now we just spin up a session.
     await graph.aupdate_state(config, initial_state)
     
-    # [NEW] Inject Navigation Context for Initial Load
+    # [NEW] Inject Navigation Context for Initial Load (see nav_context.py)
     state_snapshot = {"current_action": "IDLE", "mastery": progress.mastery_score}
     try:
-        from .knowledge_graph import get_graph
-        kg_subj = get_graph(request.topic)
-        
-        # Current
-        if progress.current_node:
-            n = kg_subj.get_node(progress.current_node)
-            if n: state_snapshot["current_node_label"] = n.label
-            
-        # Previous
-        if progress.completed_nodes:
-             prev_id = progress.completed_nodes[-1]
-             prev_n = kg_subj.get_node(prev_id)
-             if prev_n: state_snapshot["prev_node_label"] = prev_n.label
-             
-        # Next (Suggestion)
-        completed_list = list(progress.completed_nodes) if progress.completed_nodes else []
-        temp_completed = list(completed_list)
-        if progress.current_node and progress.current_node not in temp_completed:
-            temp_completed.append(progress.current_node)
-        
-        nav_options = navigator.get_next_options(temp_completed, player.grade_level)
-        if nav_options:
-            next_path = nav_options[0]
-            if "->" in next_path:
-                state_snapshot["next_node_label"] = next_path.split("->")[-1]
-            else:
-                state_snapshot["next_node_label"] = next_path
-                
+        state_snapshot.update(await get_nav_context(progress, player.grade_level, lambda: get_completed_nodes_async(db, progress.id)))
     except Exception as e:
         print(f"Error injecting nav context in select_book: {e}")
     
@@ -468,14 +468,7 @@ async def select_book(request: BookSelectRequest, current_user: Player = Depends
         role=player.role # [NEW]
     )
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest, current_user: Player = Depends(get_current_user), db: Session = Depends(get_db)):
-    config = {"configurable": {"thread_id": request.session_id}}
-    
-    current_state = await graph.aget_state(config)
-    if not current_state.values:
-        raise HTTPException(status_code=404, detail="Session not found.")
-    
+def chat_inputs(request: ChatRequest) -> dict:
     inputs = {
         "messages": [HumanMessage(content=request.message)],
         "view_as_student": request.view_as_student # [NEW]
@@ -484,15 +477,10 @@ async def chat(request: ChatRequest, current_user: Player = Depends(get_current_
     if request.grade_override is not None:
         inputs["grade_level"] = f"Grade {request.grade_override}"
         print(f"[API] Grade Override Applied: {inputs['grade_level']}")
+    return inputs
 
-    print(f"\n[API] /chat Request: {request.message}")
-    result = await graph.ainvoke(inputs, config)
-    
-    messages = result.get("messages", [])
-    last_msg = messages[-1].content if messages else ""
+async def chat_snapshot(turn, session_values: dict, result: dict) -> dict:
     current_action = result.get("current_action", "IDLE")
-
-    print(f"[API] /chat Response: {last_msg}\n")
     
     # Extract mastery if updated
     mastery_update = result.get("mastery")
@@ -502,74 +490,141 @@ async def chat(request: ChatRequest, current_user: Player = Depends(get_current_
         snapshot["mastery"] = mastery_update
     
     # [NEW] Inject Navigation Context (Current/Prev/Next)
-    # This adds slight overhead but is required for UI
+    # Rows come from the turn and labels from the per-progress cache (see nav_context.py)
     try:
-        player = db.query(Player).filter(Player.username == current_state.values.get("username")).first()
-        topic_name = current_state.values.get("topic")
-        if player and topic_name:
-            prog = db.query(TopicProgress).filter(TopicProgress.player_id == player.id, TopicProgress.topic_name == topic_name).first()
+        player = await turn.player_for(session_values)
+        if player and session_values.get("topic"):
+            prog = await turn.progress_for(session_values)
             if prog:
-                # Current
-                if prog.current_node:
-                    from .knowledge_graph import get_graph
-                    kg_subj = get_graph(topic_name)
-                    n = kg_subj.get_node(prog.current_node)
-                    if n: snapshot["current_node_label"] = n.label
-                
-                # Previous (Last master topic)
-                if prog.completed_nodes:
-                     prev_id = prog.completed_nodes[-1]
-                     kg_subj = get_graph(topic_name)
-                     prev_n = kg_subj.get_node(prev_id)
-                     if prev_n: snapshot["prev_node_label"] = prev_n.label
-                     
-                # Next (Suggestion)
-                completed_list = list(prog.completed_nodes) if prog.completed_nodes else []
-                # Use current node as marking "active", so next is usually AFTER current completes.
-                # But UI asks for "Next Topic" which implies "What is coming up?".
-                # If we are working on Current, Next is the one after Current.
-                # Temporarily add current to completed to see what comes next?
-                temp_completed = list(completed_list)
-                if prog.current_node and prog.current_node not in temp_completed:
-                    temp_completed.append(prog.current_node)
-                
-                nav_options = navigator.get_next_options(temp_completed, player.grade_level)
-                if nav_options:
-                    # Parse label from ID? ID is Path. Label is last part usually?
-                    # Or get node.
-                    # navigator return paths.
-                    next_path = nav_options[0]
-                    # Format: ...->Label
-                    if "->" in next_path:
-                        snapshot["next_node_label"] = next_path.split("->")[-1]
-                    else:
-                        snapshot["next_node_label"] = next_path
-                        
+                snapshot.update(await get_nav_context(prog, player.grade_level, lambda: turn.completed(prog.id)))
     except Exception as e:
         print(f"Error injecting nav context: {e}")
+    return snapshot
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest, current_user: Player = Depends(get_current_user), db: AsyncSession = Depends(get_db_async)):
+    config = {"configurable": {"thread_id": request.session_id}}
+    
+    current_state = await graph.aget_state(config)
+    if not current_state.values:
+        raise HTTPException(status_code=404, detail="Session not found.")
+    
+    print(f"\n[API] /chat Request: {request.message}")
+    # One session and one set of player/progress rows for the nodes and the snapshot
+    async with begin_turn(db, current_user) as turn:
+        await turn.progress_for(current_state.values)
+        inputs = {**chat_inputs(request), **turn.ids(current_state.values)}
+        await turn.release() # Don't hold a pooled connection through the LLM calls
+        try:
+            result = await graph.ainvoke(inputs, config)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="The tutor took too long to respond. Please try again.")
+        
+        messages = result.get("messages", [])
+        last_msg = messages[-1].content if messages else ""
+
+        print(f"[API] /chat Response: {last_msg}\n")
+        
+        snapshot = await chat_snapshot(turn, current_state.values, result)
 
     return ChatResponse(
         response=str(last_msg),
         state_snapshot=snapshot
     )
 
-# Initialize GraphNavigator
-from .graph_logic import GraphNavigator
-navigator = GraphNavigator()
+# Nodes whose LLM output is shown to the student as it is generated
+STREAM_NODES = {"teacher", "problem_generator", "general_chat"}
+
+async def stream_chat_turn(request: ChatRequest):
+    """
+    Runs one chat turn and yields frames as it goes:
+      {"type": "token", "node": ..., "delta": ...} for each generated chunk
+      {"type": "final", "response": ..., "state_snapshot": {...}} once the graph finishes
+      {"type": "error", "status": ..., "detail": ...} on failure
+    Shared by /chat_stream (SSE) and /chat_ws (WebSocket). Every turn ends with a
+    final or error frame; it never raises.
+    """
+    try:
+        async for frame in _chat_turn_frames(request):
+            yield frame
+    except asyncio.TimeoutError:
+        yield {"type": "error", "status": 504, "detail": "The tutor took too long to respond. Please try again."}
+    except Exception as e:
+        print(f"[API] Chat turn failed: {type(e).__name__}: {e}")
+        yield {"type": "error", "status": 500, "detail": "Something went wrong on our side. Please try again."}
+
+async def _chat_turn_frames(request: ChatRequest):
+    config = {"configurable": {"thread_id": request.session_id}}
+    
+    current_state = await graph.aget_state(config)
+    if not current_state.values:
+        yield {"type": "error", "status": 404, "detail": "Session not found."}
+        return
+    
+    print(f"\n[API] /chat_stream Request: {request.message}")
+    result = {}
+    async with begin_turn() as turn:
+        await turn.progress_for(current_state.values)
+        inputs = {**chat_inputs(request), **turn.ids(current_state.values)}
+        await turn.release() # Don't hold a pooled connection through the LLM calls
+        async for mode, chunk in graph.astream(inputs, config, stream_mode=["messages", "values"]):
+            if mode == "values":
+                result = chunk
+                continue
+            msg, meta = chunk
+            if meta.get("langgraph_node") in STREAM_NODES and isinstance(msg, AIMessageChunk) and msg.content:
+                yield {"type": "token", "node": meta["langgraph_node"], "delta": msg.content}
+        
+        messages = result.get("messages", [])
+        last_msg = messages[-1].content if messages else ""
+        print(f"[API] /chat_stream Response: {last_msg}\n")
+        
+        snapshot = await chat_snapshot(turn, current_state.values, result)
+    yield {"type": "final", "response": str(last_msg), "state_snapshot": snapshot}
+
+@app.post("/chat_stream")
+async def chat_stream(request: ChatRequest, current_user: Player = Depends(get_current_user), db: AsyncSession = Depends(get_db_async)):
+    # Server-Sent Events: "event: token|final|error" + JSON data per frame
+    await db.commit() # Auth lookup done; the turn opens its own session, so free this connection
+    async def events():
+        async for frame in stream_chat_turn(request):
+            yield f"event: {frame['type']}\ndata: {json.dumps(frame)}\n\n"
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.websocket("/chat_ws")
+async def chat_ws(websocket: WebSocket, token: str = ""):
+    # Browsers/Godot can't set headers on the handshake, so the bearer token comes as ?token=
+    async with AsyncSessionLocal() as db:
+        user = await user_from_token(token, db)
+    if user is None:
+        await websocket.close(code=1008)
+        return
+    
+    await websocket.accept()
+    try:
+        # One connection serves many turns: each client message is a ChatRequest JSON
+        while True:
+            data = await websocket.receive_json()
+            try:
+                request = ChatRequest(**data)
+            except Exception as e:
+                await websocket.send_json({"type": "error", "status": 422, "detail": str(e)})
+                continue
+            async for frame in stream_chat_turn(request):
+                await websocket.send_json(frame)
+    except WebSocketDisconnect:
+        pass
 
 @app.post("/update_progress")
-async def update_progress(username: str, topic: str, xp_delta: int, mastery_delta: int, current_user: Player = Depends(get_current_user), db: Session = Depends(get_db)):
-    player = db.query(Player).filter(Player.username == username).first()
+async def update_progress(username: str, topic: str, xp_delta: int, mastery_delta: int, current_user: Player = Depends(get_current_user), db: AsyncSession = Depends(get_db_async)):
+    player = await get_player_async(db, username)
     next_suggestions = []
     
     if player:
         player.xp += xp_delta
         player.level = 1 + player.xp // 100
         
-        progress = db.query(TopicProgress).filter(
-            TopicProgress.player_id == player.id, 
-            TopicProgress.topic_name == topic
-        ).first()
+        progress = await get_progress_async(db, player.id, topic)
 
         completed_just_now = False
 
@@ -593,22 +648,21 @@ async def update_progress(username: str, topic: str, xp_delta: int, mastery_delt
                 progress.status = "COMPLETED"
                 completed_just_now = True
             
-            # Add to completed_nodes list if not present
+            # Add to completed nodes if not present
             # We assume 'topic' is the node identifier being tracked
-            current_completed = list(progress.completed_nodes) if progress.completed_nodes else []
-            if topic not in current_completed:
-                current_completed.append(topic)
-                progress.completed_nodes = current_completed
+            if await db.run_sync(add_completed_nodes, progress, [topic]):
+                from .mastery_rollup import refresh_mastery_rollup
+                await db.run_sync(lambda s: refresh_mastery_rollup(player.id, s))
                 
         elif progress.status == "NOT_STARTED":
             progress.status = "IN_PROGRESS"
             
         progress.current_node = topic
-        db.commit() # Commit updates
+        await db.commit() # Commit updates
         
         # Calculate Next Node if Completed
         if completed_just_now:
-            completed_list = list(progress.completed_nodes) if progress.completed_nodes else [topic]
+            completed_list = await get_completed_nodes_async(db, progress.id) or [topic]
             # Use Grade Level from Player
             suggestions = navigator.get_next_options(completed_list, player.grade_level)
             
@@ -622,8 +676,8 @@ async def update_progress(username: str, topic: str, xp_delta: int, mastery_delt
     return {"status": "ok", "next_nodes": next_suggestions}
 
 @app.post("/init_session", response_model=InitSessionResponse)
-async def init_session(request: InitSessionRequest, current_user: Player = Depends(get_current_user), db: Session = Depends(get_db)):
-    player = db.query(Player).filter(Player.username == request.username).first()
+async def init_session(request: InitSessionRequest, current_user: Player = Depends(get_current_user), db: AsyncSession = Depends(get_db_async)):
+    player = await get_player_async(db, request.username)
     if not player:
         # New player always saves
         player = Player(
@@ -637,7 +691,7 @@ async def init_session(request: InitSessionRequest, current_user: Player = Depen
             role=request.role
         )
         db.add(player)
-        db.commit()
+        await db.commit()
     else:
         # Update existing ONLY if requested
         if request.save_profile:
@@ -648,9 +702,9 @@ async def init_session(request: InitSessionRequest, current_user: Player = Depen
             if request.birthday: player.birthday = request.birthday
             if request.interests: player.interests = request.interests
             if request.role: player.role = request.role
-            db.commit()
+            await db.commit()
     
-    db.refresh(player)
+    await db.refresh(player)
     
     # CRITICAL: Return the REQUESTED grade level for this session, 
     # even if we didn't save it to the DB.
@@ -661,9 +715,9 @@ async def init_session(request: InitSessionRequest, current_user: Player = Depen
     return InitSessionResponse(status="ok", username=player.username, grade_level=effective_grade)
 
 @app.post("/resume_shelf", response_model=ResumeShelfResponse)
-async def resume_shelf(request: ResumeShelfRequest, db: Session = Depends(get_db)):
+async def resume_shelf(request: ResumeShelfRequest, db: AsyncSession = Depends(get_db_async)):
     print(f"[API] resume_shelf request for user: '{request.username}' category: '{request.shelf_category}'")
-    player = db.query(Player).filter(Player.username == request.username).first()
+    player = await get_player_async(db, request.username)
     if not player:
          print(f"[API] Player '{request.username}' NOT FOUND in DB.")
          raise HTTPException(status_code=404, detail="Player not found")
@@ -672,12 +726,14 @@ async def resume_shelf(request: ResumeShelfRequest, db: Session = Depends(get_db
     # 1. Check for Active Node (IN_PROGRESS)
     # 2. If none, check for Next Node recommendations based on completed history.
     
-    query = db.query(TopicProgress).filter(TopicProgress.player_id == player.id)
+    query = select(TopicProgress).where(TopicProgress.player_id == player.id)
     if request.shelf_category:
-        query = query.filter(TopicProgress.topic_name.like(f"{request.shelf_category}%"))
+        query = query.where(TopicProgress.topic_name.like(f"{request.shelf_category}%"))
     
     # Check for IN_PROGRESS
-    active_progress = query.filter(TopicProgress.status == "IN_PROGRESS").order_by(TopicProgress.mastery_score.desc()).first()
+    active_progress = (await db.execute(
+        query.where(TopicProgress.status == "IN_PROGRESS").order_by(TopicProgress.mastery_score.desc()).limit(1)
+    )).scalars().first()
     
     if active_progress:
          return ResumeShelfResponse(topic=active_progress.topic_name, reason=f"Resuming {active_progress.topic_name}...")
@@ -686,14 +742,16 @@ async def resume_shelf(request: ResumeShelfRequest, db: Session = Depends(get_db
     # We need ALL completed nodes for this player/category to traverse efficiently?
     # Or just use the 'last modified' progress entry to find where they left off.
     
-    last_completed = query.filter(TopicProgress.status == "COMPLETED").order_by(TopicProgress.id.desc()).first()
+    last_completed = (await db.execute(
+        query.where(TopicProgress.status == "COMPLETED").order_by(TopicProgress.id.desc()).limit(1)
+    )).scalars().first()
     
     target_topic = ""
     reason = ""
 
     if last_completed:
         # Use Navigator
-        completed_nodes = list(last_completed.completed_nodes) if last_completed.completed_nodes else []
+        completed_nodes = await get_completed_nodes_async(db, last_completed.id)
         options = navigator.get_next_options(completed_nodes, player.grade_level)
         
         if not options:
@@ -734,42 +792,38 @@ async def resume_shelf(request: ResumeShelfRequest, db: Session = Depends(get_db
 
     return ResumeShelfResponse(topic=target_topic, reason=reason)
 @app.post("/get_topic_graph", response_model=GraphDataResponse)
-async def get_topic_graph(request: GraphDataRequest, db: Session = Depends(get_db)):
+async def get_topic_graph(request: GraphDataRequest, db: AsyncSession = Depends(get_db_async)):
     from .knowledge_graph import get_graph
     
     kg = get_graph(request.topic)
-    if not kg or not kg.graph.nodes:
+    if not kg or len(kg) == 0:
          return GraphDataResponse(nodes=[])
          
     # Get Player Progress
-    player = db.query(Player).filter(Player.username == request.username).first()
-    completed_set = set()
+    player = await get_player_async(db, request.username)
+    completed_list = []
+    progress_id = None
     current_node_id = ""
     
     if player:
         # Determine strict subject name (e.g. "math" -> "Math") via TopicProgress usually requiring capitalization
         # But our DB search handles that if we use request.topic directly (assuming UI sends correct case)
         # Or search robustly.
-        prog = db.query(TopicProgress).filter(
-            TopicProgress.player_id == player.id,
-            TopicProgress.topic_name == request.topic
-        ).first()
+        prog = await get_progress_async(db, player.id, request.topic)
         
         if prog:
-            if prog.completed_nodes:
-                completed_set = set(prog.completed_nodes)
+            progress_id = prog.id
+            completed_list = await get_completed_nodes_async(db, prog.id)
             if prog.current_node:
                 current_node_id = prog.current_node
+    completed_set = set(completed_list)
     
     # Build Node List
     result_nodes = []
     
-    # We want to traverse in a logical order if possible, or just dump all and let UI tree sort?
-    # UI in Godot will receive a list. It needs to know hierarchy.
-    # We have Parent info in node_map in Navigator, but here we use KG graph.
-    # KG graph has edges Parent->Child.
+    # UI in Godot will receive a list. It needs to know hierarchy,
+    # so every node carries its structural (topic/subtopic) parent.
     
-    # Access internal graph data to get type/parent
     # Windowing Logic
     focus = request.focus_node_id
     if not focus and current_node_id:
@@ -780,7 +834,6 @@ async def get_topic_graph(request: GraphDataRequest, db: Session = Depends(get_d
     
     for node_obj in target_nodes:
         node_id = node_obj.id
-        node_data = kg.graph.nodes[node_id]
         
         # Determine Status
         status = "locked"
@@ -790,44 +843,34 @@ async def get_topic_graph(request: GraphDataRequest, db: Session = Depends(get_d
             status = "current"
         else:
              pass
-             
-        # Parents
-        parent_id = None
-        for pred in kg.graph.predecessors(node_id):
-            if kg.graph.nodes[pred].get("type") in ["topic", "subtopic"]:
-                parent_id = pred
-                break
         
         result_nodes.append(GraphNode(
             id=node_id,
-            label=node_data.get("label", node_id),
-            grade_level=node_data.get("grade_level", 0),
-            type=node_data.get("type", "concept"),
+            label=node_obj.label,
+            grade_level=node_obj.grade_level,
+            type=node_obj.type or "concept",
             status=status,
-            parent=parent_id
+            parent=kg.get_parent(node_id)
         ))
-        # Late pass for "Available"? 
-    # Calling get_next_learnable_nodes is expensive if we do it for all?
-    # Just do it once.
-    candidates = kg.get_next_learnable_nodes(list(completed_set))
-    candidate_ids = set([c.id for c in candidates])
-    
-    for n in result_nodes:
-        if n.status == "locked" and n.id in candidate_ids:
-            n.status = "available"
+    # Late pass for "Available": membership checks against the learner's frontier index
+    with kg.frontier_lock:
+        if progress_id is not None:
+            frontier = kg.frontier_for(progress_id, completed_list)
+        else:
+            frontier = kg.new_frontier(completed_list)
+        for n in result_nodes:
+            if n.status == "locked" and frontier.is_ready(n.id):
+                n.status = "available"
             
     return GraphDataResponse(nodes=result_nodes)
 
 @app.post("/set_current_node")
-async def set_current_node(request: SetCurrentNodeRequest, db: Session = Depends(get_db)):
-    player = db.query(Player).filter(Player.username == request.username).first()
+async def set_current_node(request: SetCurrentNodeRequest, db: AsyncSession = Depends(get_db_async)):
+    player = await get_player_async(db, request.username)
     if not player:
         raise HTTPException(status_code=404, detail="Player not found")
         
-    prog = db.query(TopicProgress).filter(
-        TopicProgress.player_id == player.id,
-        TopicProgress.topic_name == request.topic
-    ).first()
+    prog = await get_progress_async(db, player.id, request.topic)
     
     
     if not prog:
@@ -842,7 +885,7 @@ async def set_current_node(request: SetCurrentNodeRequest, db: Session = Depends
     if prog.status == "NOT_STARTED":
         prog.status = "IN_PROGRESS"
         
-    db.commit()
+    await db.commit()
     return {"status": "ok", "current_node": request.node_id}
 
 if __name__ == "__main__":
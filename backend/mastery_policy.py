@@ -0,0 +1,59 @@
+import os
+import re
+from typing import Optional, Tuple
+
+# Deterministic version of the ADAPTER_PROMPT rules.
+#
+# The verifier's [CORRECT]/[INCORRECT] token moves two streak counters kept on
+# TopicProgress (and mirrored in AgentState); the decision is then just
+#   correct streak   >= MASTERY_STREAK    -> MASTERED
+#   incorrect streak >= REMEDIATE_STREAK  -> REMEDIATE
+#   otherwise                             -> CONTINUE_PRACTICE
+# adapter_node only asks the LLM when the turn is ambiguous: no verdict token
+# (or both), or the student is expressing confusion rather than answering.
+#
+# Env:
+#   MASTERY_STREAK    - correct answers in a row to master a node (default 2)
+#   REMEDIATE_STREAK  - incorrect answers in a row before remediation (default 2)
+
+MASTERY_STREAK = int(os.getenv("MASTERY_STREAK", "2"))
+REMEDIATE_STREAK = int(os.getenv("REMEDIATE_STREAK", "2"))
+
+CONFUSION_PATTERNS = [
+    re.compile(p) for p in (
+        r"\bi don'?t (know|get|understand)\b",
+        r"\bi'?m (confused|lost|stuck)\b",
+        r"\bconfus(ed|ing)\b",
+        r"\bi can'?t\b",
+        r"\bno idea\b",
+        r"\bhelp\b",
+        r"\bwhat does .+ mean\b",
+        r"\bwhy\b.*\?",
+    )
+]
+
+def verdict_of(content: str) -> Optional[str]:
+    """ "CORRECT" / "INCORRECT" from a verifier reply, None if missing or contradictory. """
+    correct = "[CORRECT]" in content
+    incorrect = "[INCORRECT]" in content
+    if correct == incorrect:
+        return None
+    return "CORRECT" if correct else "INCORRECT"
+
+def is_confused(message: str) -> bool:
+    text = message.lower()
+    return any(p.search(text) for p in CONFUSION_PATTERNS)
+
+def update_streaks(correct_streak: int, incorrect_streak: int, verdict: Optional[str]) -> Tuple[int, int]:
+    if verdict == "CORRECT":
+        return (correct_streak or 0) + 1, 0
+    if verdict == "INCORRECT":
+        return 0, (incorrect_streak or 0) + 1
+    return correct_streak or 0, incorrect_streak or 0
+
+def decide(correct_streak: int, incorrect_streak: int) -> str:
+    if correct_streak >= MASTERY_STREAK:
+        return "MASTERED"
+    if incorrect_streak >= REMEDIATE_STREAK:
+        return "REMEDIATE"
+    return "CONTINUE_PRACTICE"
@@ -0,0 +1,135 @@
+import datetime
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from .database import MasteryRollup, TopicProgress, get_completed_nodes, insert_on_conflict
+from .knowledge_graph import get_graph
+
+# Materialized per-player mastery numbers (done/total core concepts per subject,
+# per grade band and overall).
+#
+# Reads go: in-process LRU -> mastery_rollups row -> recompute from TopicProgress.
+# Writers that change completed_nodes call refresh_mastery_rollup() in the same
+# session before committing, which rewrites the row and drops the LRU entry.
+# Rows are also recomputed when the curriculum data changes (kg_version).
+# Nothing here commits or rolls back: the row is upserted in the caller's
+# transaction (a chat turn, an endpoint) and the caller decides.
+
+SUBJECTS = ["Math", "Science", "Social_Studies", "ELA"]
+
+# Inclusive grade ranges (0 = K)
+GRADE_BANDS = [("K-2", 0, 2), ("3-5", 3, 5), ("6-8", 6, 8), ("9-12", 9, 12)]
+
+ROLLUP_CACHE_SIZE = 4096
+# Bounds how long another worker's write can go unnoticed by this process
+ROLLUP_CACHE_TTL = 60.0
+
+_cache: "OrderedDict[int, tuple]" = OrderedDict()  # player_id -> (expires_at, stats)
+_cache_lock = threading.Lock()
+
+def _kg_version() -> str:
+    h = hashlib.sha1()
+    for subj in SUBJECTS:
+        h.update(get_graph(subj).digest.encode())
+    return h.hexdigest()
+
+def compute_mastery_rollup(player_id: int, db_session) -> Dict:
+    """Recomputes the rollup from TopicProgress (two queries for all subjects)."""
+    rows = db_session.query(TopicProgress).filter(
+        TopicProgress.player_id == player_id,
+        TopicProgress.topic_name.in_(SUBJECTS)
+    ).all()
+    progress_by_subject = {p.topic_name: p for p in rows}
+    completed_by_progress = get_completed_nodes(db_session, [p.id for p in rows])
+
+    subjects = {}
+    bands = {name: [0, 0] for name, _, _ in GRADE_BANDS}
+    overall = [0, 0]
+
+    for subj in SUBJECTS:
+        kg = get_graph(subj)
+        if not kg or len(kg) == 0:
+            continue
+
+        prog = progress_by_subject.get(subj)
+        completed = completed_by_progress[prog.id] if prog else []
+        learner_key = prog.id if prog else None
+
+        done, total = kg.get_completion_stats(completed, learner_key=learner_key)
+        subjects[subj] = [done, total]
+        overall[0] += done
+        overall[1] += total
+
+        for name, (band_done, band_total) in kg.get_grade_band_stats(completed, GRADE_BANDS, learner_key=learner_key).items():
+            bands[name][0] += band_done
+            bands[name][1] += band_total
+
+    return {
+        "subjects": subjects,
+        "grade_bands": bands,
+        "overall": overall,
+        "kg_version": _kg_version(),
+    }
+
+def _cache_put(player_id: int, stats: Dict):
+    with _cache_lock:
+        _cache[player_id] = (time.monotonic() + ROLLUP_CACHE_TTL, stats)
+        _cache.move_to_end(player_id)
+        while len(_cache) > ROLLUP_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+def _cache_get(player_id: int) -> Optional[Dict]:
+    with _cache_lock:
+        entry = _cache.get(player_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del _cache[player_id]
+            return None
+        _cache.move_to_end(player_id)
+        return entry[1]
+
+def invalidate_mastery_rollup(player_id: int):
+    with _cache_lock:
+        _cache.pop(player_id, None)
+
+def refresh_mastery_rollup(player_id: int, db_session) -> Dict:
+    """
+    Recomputes and stores the rollup inside the caller's transaction.
+    Call after changing completed_nodes and before db_session.commit().
+    """
+    db_session.flush()
+    stats = compute_mastery_rollup(player_id, db_session)
+
+    # Upsert: two first reads for the same player can both get here
+    insert_on_conflict(db_session, MasteryRollup, [
+        {"player_id": player_id, "stats": stats, "updated_at": datetime.datetime.utcnow()}
+    ], ["player_id"], update_cols=["stats", "updated_at"])
+
+    # Repopulated from the committed row on the next read
+    invalidate_mastery_rollup(player_id)
+    return stats
+
+def get_mastery_rollup(player_id: int, db_session) -> Dict:
+    stats = _cache_get(player_id)
+    if stats is not None:
+        return stats
+
+    row = db_session.query(MasteryRollup).filter(MasteryRollup.player_id == player_id).first()
+    if row and row.stats and row.stats.get("kg_version") == _kg_version():
+        stats = row.stats
+    else:
+        # Missing or built against an older curriculum: rebuild, persisted with the caller's commit
+        stats = refresh_mastery_rollup(player_id, db_session)
+
+    _cache_put(player_id, stats)
+    return stats
+
+def rollup_percent(done_total) -> float:
+    done, total = done_total
+    if total > 0:
+        return round((done / total) * 100, 1)
+    return 0.0
@@ -0,0 +1,280 @@
+import functools
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+# Metrics and trace spans for /metrics (Prometheus text format) and /traces.
+#
+# Kept dependency-free (a few histograms and counters rendered by hand) so the
+# graph, LLM, DB and KG modules can import it without pulling anything in.
+#
+# MetricsMiddleware opens a root span per HTTP request and counts the SQL
+# statements run while it's in flight (engine hooks from instrument_engine).
+# Graph nodes (traced_node), LLM calls and KG operations open child spans, so a
+# /chat trace shows which nodes ran and where the time went. ContextVars carry
+# the current span into LangGraph's node tasks the same way turn_context does.
+#
+# Env:
+#   TRACE_BUFFER   - finished traces kept for /traces (default 200)
+
+TRACE_BUFFER = int(os.getenv("TRACE_BUFFER", "200"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+FAST_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 20, 30, 50, 100)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _num(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.values: Dict[tuple, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount: float = 1):
+        with self.lock:
+            self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {_num(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values: Dict[tuple, list] = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues):
+        with self.lock:
+            entry = self.values.get(labelvalues)
+            if entry is None:
+                entry = self.values[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            else:
+                entry[len(self.buckets)] += 1
+            entry[-1] += value
+
+    def count(self, *labelvalues) -> int:
+        with self.lock:
+            entry = self.values.get(labelvalues)
+            return sum(entry[:-1]) if entry else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, entry in sorted(self.values.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets + ("+Inf",), entry[:-1]):
+                    cumulative += n
+                    le = 'le="%s"' % ("+Inf" if bound == "+Inf" else _num(bound))
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_num(entry[-1])}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+HTTP_SECONDS = Histogram("http_request_duration_seconds", "End-to-end HTTP request latency, until the last body byte.", ("method", "path", "status"))
+NODE_SECONDS = Histogram("graph_node_duration_seconds", "Agent graph node latency.", ("node",))
+LLM_SECONDS = Histogram("llm_call_duration_seconds", "LLM call latency, not counting time queued for the model's concurrency slot.", ("model",))
+LLM_QUEUE_SECONDS = Histogram("llm_queue_wait_seconds", "Time an LLM call waited for a concurrency slot.", ("model",), FAST_BUCKETS + (10.0, 30.0))
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens by model and kind (prompt/completion).", ("model", "kind"))
+LLM_ERRORS = Counter("llm_call_errors_total", "LLM calls that raised (timeouts included).", ("model", "error"))
+DB_QUERIES = Histogram("db_queries_per_request", "SQL statements executed while handling one HTTP request.", ("path",), COUNT_BUCKETS)
+KG_SECONDS = Histogram("kg_operation_duration_seconds", "Knowledge graph operation latency.", ("op",), FAST_BUCKETS)
+
+METRICS = [HTTP_SECONDS, NODE_SECONDS, LLM_SECONDS, LLM_QUEUE_SECONDS, LLM_TOKENS, LLM_ERRORS, DB_QUERIES, KG_SECONDS]
+
+def render_metrics() -> str:
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# --- Spans ---
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start", "duration", "attrs")
+
+    def __init__(self, name: str, parent: Optional["Span"], attrs: Dict):
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.start = time.time()
+        self.duration = None
+        self.attrs = attrs
+
+    def as_dict(self) -> Dict:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": round(self.duration * 1000, 2) if self.duration is not None else None,
+            **({"attrs": self.attrs} if self.attrs else {}),
+        }
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_traces: "OrderedDict[str, list]" = OrderedDict()  # trace_id -> finished span dicts
+_traces_lock = threading.Lock()
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+@contextmanager
+def span(name: str, **attrs):
+    """Child of the current span, or the root of a new trace when there isn't one."""
+    s = Span(name, _current_span.get(), attrs)
+    token = _current_span.set(s)
+    start = time.perf_counter()
+    try:
+        yield s
+    except BaseException as e:
+        s.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        s.duration = time.perf_counter() - start
+        _current_span.reset(token)
+        _record_span(s)
+
+def _record_span(s: Span):
+    with _traces_lock:
+        spans = _traces.get(s.trace_id)
+        if spans is None:
+            spans = _traces[s.trace_id] = []
+            while len(_traces) > TRACE_BUFFER:
+                _traces.popitem(last=False)
+        spans.append(s.as_dict())
+
+def recent_traces(limit: int = 20) -> List[Dict]:
+    """Newest first; each trace's spans ordered by start time."""
+    with _traces_lock:
+        items = [(t, list(spans)) for t, spans in list(_traces.items())[-limit:]]
+    return [{"trace_id": t, "spans": sorted(spans, key=lambda x: x["start"])} for t, spans in reversed(items)]
+
+def get_trace(trace_id: str) -> Optional[List[Dict]]:
+    with _traces_lock:
+        spans = _traces.get(trace_id)
+        return sorted(spans, key=lambda x: x["start"]) if spans is not None else None
+
+def clear_traces():
+    with _traces_lock:
+        _traces.clear()
+
+# --- Instrumentation helpers ---
+
+def traced_node(name: str, fn):
+    """Wraps a graph node: span + graph_node_duration_seconds. Keeps fn's signature (config)."""
+    @functools.wraps(fn)
+    async def run(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            with span(f"node:{name}"):
+                return await fn(*args, **kwargs)
+        finally:
+            NODE_SECONDS.observe(time.perf_counter() - start, name)
+    return run
+
+def timed_kg(op: str):
+    """Decorator for knowledge graph operations."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                KG_SECONDS.observe(elapsed, op)
+                parent = _current_span.get()
+                if parent is not None:
+                    kg_ms = parent.attrs.setdefault("kg_ms", {})
+                    kg_ms[op] = round(kg_ms.get(op, 0) + elapsed * 1000, 3)
+        return run
+    return wrap
+
+def record_llm_call(model: str, seconds: float, messages, response):
+    LLM_SECONDS.observe(seconds, model)
+    usage = getattr(response, "usage_metadata", None) or {}
+    prompt_tokens, completion_tokens = usage.get("input_tokens"), usage.get("output_tokens")
+    if prompt_tokens is None or completion_tokens is None:
+        # No usage reported (fake clients): estimate locally
+        from .context import count_text_tokens  # Import locally to avoid circular dep
+        contents = messages if isinstance(messages, list) else [messages]
+        prompt_tokens = sum(count_text_tokens(str(getattr(m, "content", m))) for m in contents)
+        completion_tokens = count_text_tokens(str(getattr(response, "content", "")))
+    LLM_TOKENS.inc(model, "prompt", amount=prompt_tokens)
+    LLM_TOKENS.inc(model, "completion", amount=completion_tokens)
+    s = _current_span.get()
+    if s is not None:
+        s.attrs.update(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+# --- DB statement counting ---
+
+_request_queries: ContextVar[Optional[list]] = ContextVar("request_queries", default=None)
+
+def _count_query(*args):
+    counter = _request_queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+def instrument_engine(engine):
+    """Counts SQL statements per request. Pass a sync Engine (async_engine.sync_engine for async)."""
+    from sqlalchemy import event
+    if not event.contains(engine, "before_cursor_execute", _count_query):
+        event.listen(engine, "before_cursor_execute", _count_query)
+
+# --- ASGI middleware ---
+
+class MetricsMiddleware:
+    """Root span, latency histogram and DB statement count per HTTP request."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        queries = [0]
+        queries_token = _request_queries.set(queries)
+        status = [500]
+        start = time.perf_counter()
+        with span(f"{scope['method']} {scope['path']}") as root:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    status[0] = message["status"]
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"x-trace-id", root.trace_id.encode())]
+                await send(message)
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                # Route template, not the raw path, to keep label cardinality bounded
+                route = scope.get("route")
+                path = getattr(route, "path", None) or "unmatched"
+                root.attrs.update(status=status[0], db_queries=queries[0])
+                HTTP_SECONDS.observe(time.perf_counter() - start, scope["method"], path, status[0])
+                DB_QUERIES.observe(queries[0], path)
+                _request_queries.reset(queries_token)
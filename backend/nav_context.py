@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+try:
+    from .graph_logic import GraphNavigator
+    from .knowledge_graph import get_graph
+except ImportError:
+    from graph_logic import GraphNavigator
+    from knowledge_graph import get_graph
+
+# Current / previous / next topic labels shown by the UI after every chat turn.
+#
+# Cached per TopicProgress row. An entry is reused while the row's current_node
+# and the grade it was computed for are unchanged; add_completed_nodes() and the
+# completed_nodes setter drop it when completions change. Completed nodes are only
+# loaded on a miss, so a normal chat turn is a dict lookup. The TTL bounds how
+# long another worker's write can go unnoticed by this process.
+#
+# Env:
+#   NAV_CONTEXT_CACHE_SIZE  - progress rows kept (default 4096)
+#   NAV_CONTEXT_TTL         - seconds an entry stays usable (default 300)
+
+NAV_CONTEXT_CACHE_SIZE = int(os.getenv("NAV_CONTEXT_CACHE_SIZE", "4096"))
+NAV_CONTEXT_TTL = float(os.getenv("NAV_CONTEXT_TTL", "300"))
+
+navigator = GraphNavigator()
+
+_cache: "OrderedDict[int, tuple]" = OrderedDict()  # progress_id -> (expires_at, signature, labels)
+_cache_lock = threading.Lock()
+
+def nav_labels(topic: str, current_node: Optional[str], completed: List[str], grade_level) -> Dict:
+    """current_node_label / prev_node_label / next_node_label for whichever are known."""
+    labels = {}
+    kg = get_graph(topic)
+
+    # Current
+    if current_node:
+        n = kg.get_node(current_node)
+        if n: labels["current_node_label"] = n.label
+
+    # Previous (last mastered topic)
+    if completed:
+        prev_n = kg.get_node(completed[-1])
+        if prev_n: labels["prev_node_label"] = prev_n.label
+
+    # Next (suggestion): what comes after the current node once it's done
+    upcoming = list(completed)
+    if current_node and current_node not in upcoming:
+        upcoming.append(current_node)
+    nav_options = navigator.get_next_options(upcoming, grade_level)
+    if nav_options:
+        # Paths look like ...->Label
+        labels["next_node_label"] = nav_options[0].split("->")[-1]
+    return labels
+
+def _signature(progress, grade_level) -> tuple:
+    return (progress.topic_name, progress.current_node, grade_level)
+
+def _cache_get(progress_id: int, signature: tuple) -> Optional[Dict]:
+    with _cache_lock:
+        entry = _cache.get(progress_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic() or entry[1] != signature:
+            del _cache[progress_id]
+            return None
+        _cache.move_to_end(progress_id)
+        return entry[2]
+
+def _cache_put(progress_id: int, signature: tuple, labels: Dict):
+    with _cache_lock:
+        _cache[progress_id] = (time.monotonic() + NAV_CONTEXT_TTL, signature, labels)
+        _cache.move_to_end(progress_id)
+        while len(_cache) > NAV_CONTEXT_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+def invalidate_nav_context(progress_id: int):
+    with _cache_lock:
+        _cache.pop(progress_id, None)
+
+def clear_nav_context():
+    with _cache_lock:
+        _cache.clear()
+
+async def get_nav_context(progress, grade_level, load_completed: Callable[[], Awaitable[List[str]]]) -> Dict:
+    """
+    Nav labels for a TopicProgress row. load_completed() (the row's completed node
+    ids, in order) is only awaited when the cached entry is missing or stale.
+    """
+    signature = _signature(progress, grade_level)
+    labels = _cache_get(progress.id, signature)
+    if labels is None:
+        labels = nav_labels(progress.topic_name, progress.current_node, await load_completed(), grade_level)
+        _cache_put(progress.id, signature, labels)
+    return dict(labels)
@@ -0,0 +1,146 @@
+import asyncio
+import os
+import threading
+import time
+from collections import Counter
+from typing import Awaitable, Callable, Dict
+
+# Speculative practice-problem prefetch.
+#
+# After an explanation the student usually asks "Quiz me" next, so teacher_node
+# starts generating that problem in the background. The result is kept per
+# graph thread and handed to problem_node if the student does ask; it is thrown
+# away if the thread's KG node changes, it is older than PREFETCH_TTL, or a new
+# explanation replaces it. Only the live-LLM path is prefetched - bank problems
+# (problem_bank.py) are already instant. Entries nobody took (student logged off)
+# are swept once expired, failed or orphaned by a closed loop.
+#
+# Env:
+#   PREFETCH_ENABLED          - "0" turns prefetching off (default on)
+#   PREFETCH_MAX_OUTSTANDING  - in-flight prefetches allowed per worker (default 32)
+#   PREFETCH_TTL              - seconds a prefetched problem stays usable (default 600)
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1") != "0"
+PREFETCH_MAX_OUTSTANDING = int(os.getenv("PREFETCH_MAX_OUTSTANDING", "32"))
+PREFETCH_TTL = float(os.getenv("PREFETCH_TTL", "600"))
+
+class Prefetch:
+    def __init__(self, node_id: str, task: asyncio.Task):
+        self.node_id = node_id
+        self.task = task
+        self.created_at = time.monotonic()
+
+_prefetches: Dict[str, Prefetch] = {}  # thread key -> Prefetch
+
+_stats_lock = threading.Lock()
+_stats = Counter()
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+def thread_key(config, state) -> str:
+    thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+    return str(thread_id) if thread_id else f"{state.get('username')}:{state.get('topic')}"
+
+def _running(prefetch: Prefetch) -> bool:
+    return not prefetch.task.done() and not prefetch.task.get_loop().is_closed()
+
+def _usable(prefetch: Prefetch, now: float) -> bool:
+    if now - prefetch.created_at > PREFETCH_TTL or prefetch.task.get_loop().is_closed():
+        return False
+    if prefetch.task.done():
+        return not prefetch.task.cancelled() and prefetch.task.exception() is None
+    return True
+
+def _sweep():
+    now = time.monotonic()
+    for key, prefetch in list(_prefetches.items()):
+        if not _usable(prefetch, now):
+            discard_prefetch(key)
+
+def outstanding() -> int:
+    _sweep()
+    return sum(1 for p in _prefetches.values() if _running(p))
+
+def schedule_prefetch(key: str, node_id: str, make: Callable[[], Awaitable]) -> bool:
+    """Starts make() in the background for this thread, replacing any earlier prefetch."""
+    if not PREFETCH_ENABLED:
+        return False
+    discard_prefetch(key)
+    if outstanding() >= PREFETCH_MAX_OUTSTANDING:
+        _count("skipped")
+        return False
+    _prefetches[key] = Prefetch(node_id, asyncio.create_task(make()))
+    _count("scheduled")
+    return True
+
+def discard_prefetch(key: str):
+    prefetch = _prefetches.pop(key, None)
+    if prefetch and _running(prefetch):
+        prefetch.task.cancel()
+        _count("cancelled")
+
+async def take_prefetch(key: str, node_id: str):
+    """
+    The prefetched result for this thread if it is still for node_id, else None.
+    Waits for one that is still running (it started earlier than a fresh call would).
+    """
+    prefetch = _prefetches.pop(key, None)
+    if prefetch is None:
+        _count("misses")
+        return None
+
+    stale = (
+        prefetch.node_id != node_id
+        or time.monotonic() - prefetch.created_at > PREFETCH_TTL
+        or prefetch.task.get_loop() is not asyncio.get_running_loop()
+    )
+    if stale:
+        if _running(prefetch):
+            prefetch.task.cancel()
+        _count("stale")
+        return None
+
+    _count("hits" if prefetch.task.done() else "hits_in_flight")
+    try:
+        return await prefetch.task
+    except asyncio.CancelledError:
+        # The prefetch itself was cancelled (shutdown); a cancelled caller re-raises
+        if not prefetch.task.cancelled():
+            raise
+        _count("errors")
+        return None
+    except Exception as e:
+        print(f"[Prefetch] Prefetched call failed: {e}")
+        _count("errors")
+        return None
+
+def cancel_all_prefetches():
+    for key in list(_prefetches):
+        discard_prefetch(key)
+
+def prefetch_stats() -> Dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    used = stats.get("hits", 0) + stats.get("hits_in_flight", 0)
+    lookups = used + stats.get("misses", 0) + stats.get("stale", 0)
+    return {
+        "scheduled": stats.get("scheduled", 0),
+        "hits": stats.get("hits", 0),
+        "hits_in_flight": stats.get("hits_in_flight", 0),
+        "misses": stats.get("misses", 0),
+        "stale": stats.get("stale", 0),
+        "cancelled": stats.get("cancelled", 0),
+        "skipped": stats.get("skipped", 0),
+        "errors": stats.get("errors", 0),
+        "outstanding": outstanding(),
+        # Share of problem turns that were served by a prefetch
+        "hit_rate": round(used / lookups, 3) if lookups else 0.0,
+        # Share of prefetches that ended up being used
+        "use_rate": round(used / stats["scheduled"], 3) if stats.get("scheduled") else 0.0,
+    }
+
+def reset_prefetch_stats():
+    with _stats_lock:
+        _stats.clear()
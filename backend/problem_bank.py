@@ -0,0 +1,209 @@
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from langchain_core.messages import SystemMessage
+
+from .database import AsyncSessionLocal, ProblemBankEntry, ServedProblem, insert_on_conflict
+from .knowledge_graph import get_graph
+from .llm import ainvoke_llm, get_llm
+from .prompts import PROBLEM_BANK_PROMPT
+
+# Pre-generated practice problems per KG concept (node id + grade).
+#
+# problem_node serves from the pool: problems the player hasn't seen yet, biased
+# toward their recorded mistakes. Serving a problem (or finding the pool empty)
+# queues a refill when the pool is low; the refiller task started in main's
+# lifespan tops pools up in the background within an hourly LLM budget. A miss
+# falls back to the live generator, so an empty bank only costs the old latency.
+#
+# Env:
+#   PROBLEM_BANK_LOW_WATERMARK   - refill a pool with fewer problems than this (default 8)
+#   PROBLEM_BANK_TARGET          - size a refill tops a pool up to (default 20)
+#   PROBLEM_BANK_MAX             - cap per pool; students who exhaust a pool grow it up to this (default 100)
+#   PROBLEM_BANK_BATCH           - problems asked for per LLM call (default 5)
+#   PROBLEM_BANK_LLM_BUDGET      - refill LLM calls allowed per hour (default 120)
+#   PROBLEM_BANK_REFILL_SECONDS  - refiller poll interval (default 5)
+
+LOW_WATERMARK = int(os.getenv("PROBLEM_BANK_LOW_WATERMARK", "8"))
+TARGET_SIZE = int(os.getenv("PROBLEM_BANK_TARGET", "20"))
+MAX_SIZE = int(os.getenv("PROBLEM_BANK_MAX", "100"))
+BATCH_SIZE = int(os.getenv("PROBLEM_BANK_BATCH", "5"))
+LLM_BUDGET_PER_HOUR = int(os.getenv("PROBLEM_BANK_LLM_BUDGET", "120"))
+REFILL_INTERVAL = float(os.getenv("PROBLEM_BANK_REFILL_SECONDS", "5"))
+
+# Unseen problems left for a player before their pool is grown
+MIN_UNSEEN = 2
+
+_pending = {}  # (topic, node_id, grade) -> wanted pool size
+_pending_lock = threading.Lock()
+_budget_lock = threading.Lock()
+_llm_calls = deque()  # monotonic timestamps of refill calls in the last hour
+
+def grade_number(grade_level) -> Optional[int]:
+    """ "Grade 5" / "5" / 5 -> 5, anything else -> None """
+    if isinstance(grade_level, int):
+        return grade_level
+    m = re.search(r"\d+", str(grade_level or ""))
+    return int(m.group()) if m else None
+
+def _words(text: str) -> set:
+    return {w for w in re.findall(r"[a-z]+", str(text).lower()) if len(w) > 3}
+
+def _mistake_score(entry: ProblemBankEntry, mistake_words: set) -> int:
+    if not mistake_words:
+        return 0
+    return len(mistake_words & (_words(entry.problem) | _words(" ".join(entry.skills or []))))
+
+def pool_size(db_session, node_id: str, grade: Optional[int]) -> int:
+    return db_session.query(ProblemBankEntry).filter(
+        ProblemBankEntry.node_id == node_id, ProblemBankEntry.grade == grade
+    ).count()
+
+def has_unseen_problem(db_session, player_id: int, node_id: str, grade: Optional[int]) -> bool:
+    seen = db_session.query(ServedProblem.problem_id).filter(ServedProblem.player_id == player_id)
+    return db_session.query(ProblemBankEntry.id).filter(
+        ProblemBankEntry.node_id == node_id,
+        ProblemBankEntry.grade == grade,
+        ProblemBankEntry.id.not_in(seen),
+    ).first() is not None
+
+def pick_problem(db_session, player_id: int, topic: str, node_id: str, grade: Optional[int], mistakes=None) -> Optional[Dict]:
+    """
+    Unseen bank problem for this player ({"id", "problem", "answer"}) and marks it
+    served, or None if the pool has nothing new. Queues a refill when low.
+    Writes in the caller's transaction; the caller commits.
+    """
+    seen = db_session.query(ServedProblem.problem_id).filter(ServedProblem.player_id == player_id)
+    candidates = db_session.query(ProblemBankEntry).filter(
+        ProblemBankEntry.node_id == node_id,
+        ProblemBankEntry.grade == grade,
+        ProblemBankEntry.id.not_in(seen),
+    ).all()
+
+    size = pool_size(db_session, node_id, grade)
+    if size < LOW_WATERMARK:
+        request_refill(topic, node_id, grade, TARGET_SIZE)
+    elif len(candidates) <= MIN_UNSEEN and size < MAX_SIZE:
+        # This player is running out; grow the pool for them
+        request_refill(topic, node_id, grade, min(size + BATCH_SIZE, MAX_SIZE))
+
+    if not candidates:
+        return None
+
+    # Recent mistakes first, random among equals so classmates don't march in lockstep
+    mistake_words = _words(" ".join(mistakes[-5:])) if mistakes else set()
+    scores = [_mistake_score(c, mistake_words) for c in candidates]
+    best = max(scores)
+    entry = random.choice([c for c, s in zip(candidates, scores) if s == best])
+
+    # A double "Quiz me" can pick the same problem in two turns; the second mark is a no-op
+    insert_on_conflict(db_session, ServedProblem, [{"player_id": player_id, "problem_id": entry.id}],
+                       ["player_id", "problem_id"])
+    return {"id": entry.id, "problem": entry.problem, "answer": entry.answer or ""}
+
+# --- Refill ---
+
+def request_refill(topic: str, node_id: str, grade: Optional[int], want: int = TARGET_SIZE):
+    with _pending_lock:
+        key = (topic, node_id, grade)
+        _pending[key] = max(_pending.get(key, 0), want)
+
+def _take_budget() -> bool:
+    now = time.monotonic()
+    with _budget_lock:
+        while _llm_calls and now - _llm_calls[0] > 3600:
+            _llm_calls.popleft()
+        if len(_llm_calls) >= LLM_BUDGET_PER_HOUR:
+            return False
+        _llm_calls.append(now)
+        return True
+
+def parse_problems(content: str) -> List[Dict]:
+    try:
+        data = json.loads(content)
+    except Exception:
+        print("[ProblemBank] JSON Parse Error")
+        return []
+    items = data.get("problems", []) if isinstance(data, dict) else data
+    problems = []
+    for item in items if isinstance(items, list) else []:
+        if isinstance(item, dict) and item.get("problem") and item.get("answer") is not None:
+            skills = item.get("skills") or []
+            problems.append({
+                "problem": str(item["problem"]).strip(),
+                "answer": str(item["answer"]).strip(),
+                "skills": [str(s) for s in skills] if isinstance(skills, list) else [],
+            })
+    return problems
+
+def _store_problems(db_session, topic: str, node_id: str, grade: Optional[int], problems: List[Dict]) -> int:
+    existing = {
+        p for (p,) in db_session.query(ProblemBankEntry.problem).filter(
+            ProblemBankEntry.node_id == node_id, ProblemBankEntry.grade == grade
+        )
+    }
+    added = 0
+    for p in problems:
+        if p["problem"] in existing:
+            continue
+        existing.add(p["problem"])
+        db_session.add(ProblemBankEntry(topic=topic, node_id=node_id, grade=grade, **p))
+        added += 1
+    db_session.commit()
+    return added
+
+async def refill_pool(topic: str, node_id: str, grade: Optional[int], want: int = TARGET_SIZE) -> int:
+    """Generates problems until the pool has `want` entries or the budget runs out."""
+    node = get_graph(topic).get_node(node_id)
+    if not node:
+        return 0
+
+    async with AsyncSessionLocal() as db:
+        size = await db.run_sync(lambda s: pool_size(s, node_id, grade))
+
+    bank_llm = get_llm("gpt-4o", response_format={"type": "json_object"})
+    grade_label = "Kindergarten" if grade == 0 else f"Grade {grade}" if grade is not None else "any grade"
+    added_total = 0
+    while size < want:
+        if not _take_budget():
+            print(f"[ProblemBank] LLM budget exhausted, leaving {node_id} at {size} problems")
+            break
+        prompt = PROBLEM_BANK_PROMPT.format(
+            topic=topic,
+            concept=f"{node.label} ({node.description})",
+            grade_level=grade_label,
+            count=min(BATCH_SIZE, want - size),
+        )
+        response = await ainvoke_llm(bank_llm, [SystemMessage(content=prompt)])
+        problems = parse_problems(response.content)
+
+        async with AsyncSessionLocal() as db:
+            added = await db.run_sync(lambda s: _store_problems(s, topic, node_id, grade, problems))
+        if not added:
+            break
+        size += added
+        added_total += added
+
+    if added_total:
+        print(f"[ProblemBank] Added {added_total} problems for {node_id} (grade {grade}), pool now {size}")
+    return added_total
+
+async def run_problem_refiller(interval: float = REFILL_INTERVAL):
+    """Background task for lifespan: drains refill requests queued by pick_problem."""
+    while True:
+        with _pending_lock:
+            work = list(_pending.items())
+            _pending.clear()
+        for (topic, node_id, grade), want in work:
+            try:
+                await refill_pool(topic, node_id, grade, want)
+            except Exception as e:
+                print(f"[ProblemBank] Refill failed for {node_id}: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,195 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Fast-path routing in front of the supervisor LLM.
+#
+# 1. Rules: Godot's action buttons, [System] triggers and bare answers to a
+#    PROBLEM_GIVEN turn map to a destination deterministically.
+# 2. Classifier: a small naive Bayes model trained offline from the Interaction
+#    table (scripts/train_router.py) covers common free-text phrasings. It only
+#    sees the message, so its VERIFIER guesses only count right after PROBLEM_GIVEN.
+# 3. Anything the classifier isn't confident about goes to the LLM router.
+#
+# Env:
+#   ROUTER_MODEL_PATH      - trained model JSON (default backend/data/router_model.json)
+#   ROUTER_MIN_CONFIDENCE  - classifier posterior needed to skip the LLM (default 0.85)
+
+DESTINATIONS = ["VERIFIER", "TEACHER", "PROBLEM_GENERATOR", "GENERAL_CHAT"]
+
+ROUTER_MODEL_PATH = os.getenv(
+    "ROUTER_MODEL_PATH", os.path.join(os.path.dirname(__file__), "data", "router_model.json")
+)
+ROUTER_MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.85"))
+
+# Interaction.source_node of the supervisor's routing log: user_query is the student's
+# message, agent_response the destination (training data for scripts/train_router.py)
+ROUTE_LOG_NODE = "supervisor"
+
+TEACHER_PHRASES = {
+    "teach me", "explain", "examples", "start lesson", "please start the lesson",
+    "guide me", "teach me more", "explain again", "show me an example",
+}
+PROBLEM_PHRASES = {
+    "quiz me", "practice", "give me a problem", "give me a question", "test me",
+    "another one", "another problem", "next problem", "more practice",
+}
+
+# Answers to a just-given problem: numbers, fractions, short expressions, MC letters
+ANSWER_PATTERNS = [
+    re.compile(r"^[-+]?\$?\d[\d,]*(\.\d+)?\s*(%|[a-z]{1,3})?$"),                # 42, -3.5, $12, 45%, 12 cm
+    re.compile(r"^[-+]?\d+\s*/\s*\d+$"),                                         # 3/4
+    re.compile(r"^[-+]?\d+\s+\d+\s*/\s*\d+$"),                                   # 1 3/4
+    re.compile(r"^\(?[a-d]\)?[.)]?$"),                                           # b, (c), d)
+    re.compile(r"^(the )?answer( is)?\s*:?\s*.{1,20}$"),                         # answer is 7
+    re.compile(r"^[a-z]\s*=\s*[-+]?[\d./]+$"),                                   # x = 4
+    re.compile(r"^[\d\s+\-*/^().=x]+$"),                                         # 2*3+1 = 7
+    re.compile(r"^(true|false)$"),
+]
+
+def _normalize(message: str) -> str:
+    return re.sub(r"\s+", " ", message.strip().lower()).strip(" .!?")
+
+def route_by_rules(message: str, last_action: str) -> Optional[str]:
+    text = _normalize(message)
+    if not text:
+        return None
+
+    # Godot context triggers are handled by the teacher (it rewrites them into directives)
+    if message.strip().startswith("[System] Update"):
+        return "TEACHER"
+
+    if text in TEACHER_PHRASES or text.startswith("teach me about "):
+        return "TEACHER"
+    if text in PROBLEM_PHRASES:
+        return "PROBLEM_GENERATOR"
+
+    if last_action == "PROBLEM_GIVEN" and any(p.match(text) for p in ANSWER_PATTERNS):
+        if re.search(r"[\da-z]", text):
+            return "VERIFIER"
+    return None
+
+# --- Classifier ---
+
+def tokenize(message: str) -> List[str]:
+    words = re.findall(r"[a-z]+|\d+(?:\.\d+)?", message.lower())
+    words = ["<num>" if w[0].isdigit() else w for w in words]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+class RouteClassifier:
+    """Multinomial naive Bayes over word unigrams + bigrams."""
+
+    def __init__(self, class_counts: Dict[str, int], token_counts: Dict[str, Dict[str, int]], alpha: float = 1.0):
+        self.class_counts = class_counts
+        self.token_counts = token_counts
+        self.alpha = alpha
+        self.vocab_size = len({t for counts in token_counts.values() for t in counts}) or 1
+        self.totals = {c: sum(token_counts.get(c, {}).values()) for c in class_counts}
+        n = sum(class_counts.values()) or 1
+        self.log_priors = {c: math.log(k / n) for c, k in class_counts.items() if k}
+
+    @classmethod
+    def train(cls, samples: Iterable[Tuple[str, str]], alpha: float = 1.0) -> "RouteClassifier":
+        class_counts = Counter()
+        token_counts: Dict[str, Counter] = {}
+        for text, label in samples:
+            class_counts[label] += 1
+            token_counts.setdefault(label, Counter()).update(tokenize(text))
+        return cls(dict(class_counts), {c: dict(t) for c, t in token_counts.items()}, alpha)
+
+    def predict(self, message: str) -> Tuple[Optional[str], float]:
+        tokens = tokenize(message)
+        if not tokens or not self.log_priors:
+            return None, 0.0
+        scores = {}
+        for c, prior in self.log_priors.items():
+            counts = self.token_counts.get(c, {})
+            denom = self.totals[c] + self.alpha * self.vocab_size
+            scores[c] = prior + sum(math.log((counts.get(t, 0) + self.alpha) / denom) for t in tokens)
+        best = max(scores, key=scores.get)
+        # Posterior of the winner (softmax over log scores)
+        top = scores[best]
+        z = sum(math.exp(s - top) for s in scores.values())
+        return best, 1.0 / z
+
+    def to_dict(self) -> Dict:
+        return {"version": 1, "alpha": self.alpha, "class_counts": self.class_counts, "token_counts": self.token_counts}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "RouteClassifier":
+        return cls(data["class_counts"], data["token_counts"], data.get("alpha", 1.0))
+
+    def save(self, path: str):
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, path)
+
+_classifier = None
+_classifier_loaded = False
+
+def get_classifier() -> Optional[RouteClassifier]:
+    global _classifier, _classifier_loaded
+    if not _classifier_loaded:
+        _classifier_loaded = True
+        if os.path.exists(ROUTER_MODEL_PATH):
+            try:
+                with open(ROUTER_MODEL_PATH) as f:
+                    _classifier = RouteClassifier.from_dict(json.load(f))
+                print(f"[Router] Loaded classifier from {ROUTER_MODEL_PATH}")
+            except Exception as e:
+                print(f"[Router] Could not load classifier: {e}")
+    return _classifier
+
+def set_classifier(classifier: Optional[RouteClassifier]):
+    global _classifier, _classifier_loaded
+    _classifier = classifier
+    _classifier_loaded = True
+
+# --- Metrics ---
+
+_stats_lock = threading.Lock()
+_stats = Counter()
+
+def record_route(source: str, decision: str):
+    with _stats_lock:
+        _stats["total"] += 1
+        _stats[f"source:{source}"] += 1
+        _stats[f"dest:{decision}"] += 1
+
+def router_stats() -> Dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    total = stats.get("total", 0)
+    by_source = {s: stats.get(f"source:{s}", 0) for s in ("rules", "classifier", "llm")}
+    return {
+        "total": total,
+        "by_source": by_source,
+        "by_destination": {d: stats.get(f"dest:{d}", 0) for d in DESTINATIONS},
+        # Share of turns that skipped the LLM router
+        "fast_path_hit_rate": round((by_source["rules"] + by_source["classifier"]) / total, 3) if total else 0.0,
+    }
+
+def reset_router_stats():
+    with _stats_lock:
+        _stats.clear()
+
+def fast_route(message: str, last_action: str) -> Tuple[Optional[str], Optional[str]]:
+    """(destination, source) without an LLM call, or (None, None) if the LLM should decide."""
+    decision = route_by_rules(message, last_action)
+    if decision:
+        return decision, "rules"
+
+    classifier = get_classifier()
+    if classifier:
+        decision, confidence = classifier.predict(message)
+        # Nothing to verify unless a problem is open
+        if decision == "VERIFIER" and last_action != "PROBLEM_GIVEN":
+            return None, None
+        if decision in DESTINATIONS and confidence >= ROUTER_MIN_CONFIDENCE:
+            return decision, "classifier"
+    return None, None
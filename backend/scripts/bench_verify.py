@@ -0,0 +1,134 @@
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+# Answer-path latency: split (verifier call, then adapter) vs fused (one structured call).
+#
+# Runs verifier_node + adapter_node over a mix of student answers against a local
+# fake LLM whose latency is a fixed round-trip plus a per-prompt-token cost, so
+# the history the split adapter re-sends shows up in the numbers. Uses a
+# throwaway SQLite database; no API key or network needed.
+#
+# Usage: python backend/scripts/bench_verify.py [--rounds 20] [--rtt 0.4] [--per-token 0.0002]
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+os.environ.setdefault("OPENAI_API_KEY", "bench-key")
+
+from langchain_core.messages import AIMessage, HumanMessage
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from backend import database, graph as agent_graph, turn_context
+from backend.context import count_text_tokens
+
+PROBLEM = "A baker has 24 cupcakes and puts them equally into 6 boxes. How many cupcakes are in each box?"
+
+# (student answer, what the fake LLM judges it as)
+ANSWERS = [
+    ("4", "CORRECT"),
+    ("there are 4 in each box", "CORRECT"),
+    ("5", "INCORRECT"),
+    ("I don't get it, is it 6?", "INCORRECT"),
+    ("can you give me a hint?", "UNCLEAR"),
+]
+
+class FakeLLM:
+    model_name = "bench-fake"
+
+    def __init__(self, rtt: float, per_token: float):
+        self.rtt = rtt
+        self.per_token = per_token
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        prompt = messages[0].content if isinstance(messages, list) else str(messages)
+        self.calls += 1
+        await asyncio.sleep(self.rtt + self.per_token * count_text_tokens(prompt))
+
+        judged = next((v for a, v in ANSWERS if f"Student Answer: {a}\n" in prompt), "UNCLEAR")
+        if '"verdict"' in prompt:
+            return AIMessage(content=json.dumps({
+                "verdict": judged,
+                "struggling": "don't get" in prompt,
+                "feedback": "Great thinking!" if judged == "CORRECT" else "Not quite - try splitting 24 into 6 equal groups.",
+            }))
+        if '"decision"' in prompt:
+            return AIMessage(content=json.dumps({"decision": "CONTINUE_PRACTICE", "reason": "bench", "remediation_topic": None}))
+        if judged == "UNCLEAR":
+            return AIMessage(content="Sure! Think about sharing 24 cupcakes between 6 boxes.")
+        return AIMessage(content=f"[{judged}] Keep going!")
+
+def history(turns: int):
+    messages = []
+    for i in range(turns):
+        messages.append(HumanMessage(content=f"Can you explain division example {i}? " + "Sharing equally means " * 20))
+        messages.append(AIMessage(content=f"Division example {i}: " + "we split a total into equal groups. " * 30))
+    return messages
+
+async def answer_turn(answer: str, prior):
+    state = {
+        "messages": prior + [AIMessage(content=PROBLEM), HumanMessage(content=answer)],
+        "last_problem": PROBLEM,
+        "expected_answer": "",
+        "username": "bench",
+        "topic": "Math",
+    }
+    start = time.perf_counter()
+    verified = await agent_graph.verifier_node(state)
+    state = {**state, "messages": state["messages"] + verified["messages"], "judged": verified["judged"]}
+    await agent_graph.adapter_node(state)
+    return time.perf_counter() - start
+
+async def bench(mode: str, rounds: int, llm: FakeLLM, prior):
+    with patch.object(agent_graph, "VERIFY_MODE", mode):
+        timings = []
+        for _ in range(rounds):
+            for answer, _ in ANSWERS:
+                timings.append(await answer_turn(answer, prior))
+    return timings
+
+def report(mode: str, timings, calls: int):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{mode:<6} turns={len(timings):<4} llm_calls/turn={calls / len(timings):.2f}  "
+          f"mean={statistics.mean(timings) * 1000:7.1f}ms  p50={statistics.median(timings) * 1000:7.1f}ms  p95={p95 * 1000:7.1f}ms")
+
+async def main(args):
+    tmp = tempfile.mkdtemp()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}")
+    Session = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(database.Base.metadata.create_all)
+    async with Session() as db:
+        player = database.Player(username="bench")
+        db.add(player)
+        await db.flush()
+        db.add(database.TopicProgress(player_id=player.id, topic_name="Math"))
+        await db.commit()
+
+    prior = history(args.history)
+    try:
+        with patch.object(database, "AsyncSessionLocal", Session), \
+             patch.object(turn_context, "AsyncSessionLocal", Session):
+            for mode in ("split", "fused"):
+                llm = FakeLLM(args.rtt, args.per_token)
+                with patch.object(agent_graph, "get_llm", lambda *a, **k: llm):
+                    timings = await bench(mode, args.rounds, llm, prior)
+                report(mode, timings, llm.calls)
+    finally:
+        await engine.dispose()
+        shutil.rmtree(tmp)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=20, help="passes over the answer mix")
+    parser.add_argument("--rtt", type=float, default=0.4, help="fake LLM round-trip seconds")
+    parser.add_argument("--per-token", type=float, default=0.0002, help="fake LLM seconds per prompt token")
+    parser.add_argument("--history", type=int, default=6, help="prior explanation turns in the session")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+
+# Compiles every data/knowledge_graphs/{State}/{Subject} directory into a binary
+# snapshot next to it (e.g. NH/Math.kgsnap) so workers can memory-map the graph
+# at startup instead of parsing the JSON files.
+#
+# Usage: python backend/scripts/build_kg_snapshots.py [STATE ...]
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from knowledge_graph import GRAPH_DIR, KnowledgeGraph
+from kg_snapshot import load_snapshot
+
+def build_state(state):
+    state_dir = os.path.join(GRAPH_DIR, state)
+    for subject in sorted(os.listdir(state_dir)):
+        subject_dir = os.path.join(state_dir, subject)
+        if not os.path.isdir(subject_dir):
+            continue
+
+        kg = KnowledgeGraph(subject, state, use_snapshot=False)
+        if len(kg) == 0:
+            print(f"  Skipping {state}/{subject}: no nodes parsed.")
+            continue
+
+        path = kg.save_snapshot()
+
+        start = time.perf_counter()
+        snapshot = load_snapshot(subject_dir)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if snapshot is None:
+            print(f"  ERROR: {path} failed verification after write.")
+            continue
+        print(f"  {path}: {snapshot.node_count} nodes, {snapshot.edge_count} edges, "
+              f"{os.path.getsize(path) / 1024:.0f} KB (load {elapsed_ms:.1f} ms)")
+
+if __name__ == "__main__":
+    states = sys.argv[1:] or sorted(
+        d for d in os.listdir(GRAPH_DIR) if os.path.isdir(os.path.join(GRAPH_DIR, d))
+    )
+    for state in states:
+        print(f"Building snapshots for {state}...")
+        build_state(state)
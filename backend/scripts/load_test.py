@@ -0,0 +1,287 @@
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+# Classroom load test for the tutoring API.
+#
+# Simulates --classrooms x --students concurrent students. Each one registers,
+# logs in, picks a book with /select_book, then loops teach / quiz / answer turns
+# on /chat, checking /get_topic_graph and /get_player_stats every few turns the
+# way the Godot client does. Reports p50/p95/p99 latency, error count and
+# throughput per endpoint, and writes them to a JSON file tagged with the git
+# commit so runs can be compared (--compare old.json prints the deltas).
+#
+# By default it starts its own uvicorn on a free port with LLM_BACKEND=synthetic
+# (see fake_llm.py) and a throwaway SQLite database, so no API key or network
+# is needed. LLM_FAKE_* in the environment tune the fake model's latency.
+# Use --url to point it at a server that's already running instead.
+#
+# Usage: python backend/scripts/load_test.py [--classrooms 2] [--students 15] [--turns 12]
+#            [--out load_results.json] [--compare previous.json] [--url http://127.0.0.1:8000]
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+PASSWORD = "load-test-pw"
+
+TEACH = ["Teach me", "Can you explain this?", "Start lesson", "Why does that work?"]
+QUIZ = ["Quiz me", "Give me a practice problem"]
+
+# --- Stats ---
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)  # endpoint -> seconds
+        self.errors = defaultdict(int)
+        self.error_samples = {}
+
+    def ok(self, endpoint: str, seconds: float):
+        self.latencies[endpoint].append(seconds)
+
+    def fail(self, endpoint: str, seconds: float, detail: str):
+        self.latencies[endpoint].append(seconds)
+        self.errors[endpoint] += 1
+        self.error_samples.setdefault(endpoint, detail[:200])
+
+def percentile(values, p: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+def summarize(latencies, errors: int, wall: float) -> dict:
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1) if latencies else 0.0,
+    }
+
+# --- Simulated student ---
+
+def answer_for(problem: str, rng: random.Random, correct_rate: float) -> str:
+    m = re.search(r"(\d+)\s*([-+x*])\s*(\d+)", problem or "")
+    if not m:
+        return str(rng.randint(1, 40))
+    a, op, b = int(m.group(1)), m.group(2), int(m.group(3))
+    right = a + b if op == "+" else a - b if op == "-" else a * b
+    return str(right if rng.random() < correct_rate else right + rng.randint(1, 3))
+
+async def call(client: httpx.AsyncClient, rec: Recorder, endpoint: str, payload: dict, token: str = None):
+    headers = {"Authorization": f"Bearer {token}"} if token else None
+    start = time.perf_counter()
+    try:
+        resp = await client.post(endpoint, json=payload, headers=headers)
+    except httpx.HTTPError as e:
+        rec.fail(endpoint, time.perf_counter() - start, f"{type(e).__name__}: {e}")
+        return None
+    elapsed = time.perf_counter() - start
+    if resp.status_code >= 400:
+        rec.fail(endpoint, elapsed, f"{resp.status_code}: {resp.text}")
+        return None
+    rec.ok(endpoint, elapsed)
+    return resp.json()
+
+async def student(client, rec: Recorder, name: str, args, rng: random.Random):
+    await asyncio.sleep(rng.uniform(0, args.ramp))
+    await call(client, rec, "/register", {
+        "username": name, "password": PASSWORD, "email": f"{name}@example.com",
+        "grade_level": args.grade, "location": "New Hampshire", "learning_style": "Visual",
+        "sex": "Not Specified", "role": "student", "birthday": "2015-01-01", "interests": "soccer",
+    })
+    login = await call(client, rec, "/login", {"username": name, "password": PASSWORD})
+    if not login:
+        return
+    token = login["access_token"]
+    topic = rng.choice(args.topics)
+
+    book = await call(client, rec, "/select_book", {"username": name, "topic": topic}, token)
+    if not book:
+        return
+    session_id = book["session_id"]
+    problem = None
+
+    for turn in range(args.turns):
+        await asyncio.sleep(rng.uniform(0, args.think))
+        step = turn % 3
+        if step == 0:
+            message = rng.choice(TEACH)
+        elif step == 1:
+            message = rng.choice(QUIZ)
+        else:
+            message = answer_for(problem, rng, args.correct_rate)
+        reply = await call(client, rec, "/chat", {"session_id": session_id, "message": message}, token)
+        if reply and step == 1:
+            problem = reply["response"]
+
+        if turn % args.poll_every == args.poll_every - 1:
+            await call(client, rec, "/get_topic_graph", {"topic": topic, "username": name})
+            await call(client, rec, "/get_player_stats", {"username": name})
+
+async def run_load(base_url: str, args) -> dict:
+    rec = Recorder()
+    run_id = datetime.datetime.now().strftime("%H%M%S")
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            student(client, rec, f"load_{run_id}_c{c}_s{s}", args, random.Random(f"{args.seed}:{c}:{s}"))
+            for c in range(args.classrooms) for s in range(args.students)
+        ])
+        wall = time.perf_counter() - start
+
+    endpoints = {ep: summarize(lat, rec.errors[ep], wall) for ep, lat in sorted(rec.latencies.items())}
+    everything = [x for lat in rec.latencies.values() for x in lat]
+    return {
+        "commit": git_commit(),
+        "started": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "classrooms": args.classrooms, "students": args.students, "turns": args.turns,
+            "think": args.think, "ramp": args.ramp, "topics": args.topics, "seed": args.seed,
+            "url": args.url or "local",
+            "llm_backend": os.getenv("LLM_BACKEND", "synthetic") if not args.url else "server",
+            "llm_fake": {k: v for k, v in os.environ.items() if k.startswith("LLM_FAKE_")},
+        },
+        "wall_seconds": round(wall, 2),
+        "endpoints": endpoints,
+        "overall": summarize(everything, sum(rec.errors.values()), wall),
+        "error_samples": rec.error_samples,
+    }
+
+# --- Local server ---
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(tmp: str, port: int, log_path: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "LLM_BACKEND": os.getenv("LLM_BACKEND", "synthetic"),
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "load-test-key"),
+        "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'load.db')}",
+        "INTERACTION_LOG_SPILL": os.path.join(tmp, "interaction_log_spill.jsonl"),
+    }
+    log = open(log_path, "w")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+async def wait_ready(base_url: str, server: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError("Server exited during startup")
+            try:
+                if (await client.get("/")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not come up")
+
+# --- Report ---
+
+def print_report(result: dict):
+    print(f"\n{'endpoint':<20} {'count':>6} {'err':>4} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    rows = list(result["endpoints"].items()) + [("overall", result["overall"])]
+    for ep, s in rows:
+        print(f"{ep:<20} {s['count']:>6} {s['errors']:>4} {s['throughput_rps']:>7} {s['p50_ms']:>8} {s['p95_ms']:>8} {s['p99_ms']:>8}")
+    for ep, detail in result["error_samples"].items():
+        print(f"  first error on {ep}: {detail}")
+
+def print_comparison(result: dict, previous: dict):
+    print(f"\nvs {previous.get('commit') or 'previous'} (p50 / p95 / p99 change):")
+    for ep, s in list(result["endpoints"].items()) + [("overall", result["overall"])]:
+        old = previous["overall"] if ep == "overall" else previous.get("endpoints", {}).get(ep)
+        if not old:
+            continue
+        deltas = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            pct = (s[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            deltas.append(f"{s[key] - old[key]:+.1f}ms ({pct:+.0f}%)")
+        print(f"{ep:<20} " + "  ".join(deltas))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--classrooms", type=int, default=2)
+    parser.add_argument("--students", type=int, default=15, help="students per classroom")
+    parser.add_argument("--turns", type=int, default=12, help="/chat turns per student")
+    parser.add_argument("--think", type=float, default=1.0, help="max seconds a student waits between turns")
+    parser.add_argument("--ramp", type=float, default=5.0, help="students start spread over this many seconds")
+    parser.add_argument("--poll-every", type=int, default=3, help="graph + stats requests every N turns")
+    parser.add_argument("--correct-rate", type=float, default=0.7)
+    parser.add_argument("--topics", nargs="+", default=["Math"])
+    parser.add_argument("--grade", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="running server to test (default: start one with the synthetic LLM)")
+    parser.add_argument("--out", default="load_results.json")
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    args = parser.parse_args()
+    args.poll_every = max(1, args.poll_every)
+
+    tmp = server = None
+    base_url = args.url
+    try:
+        if not base_url:
+            tmp = tempfile.mkdtemp()
+            port = free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            server = start_server(tmp, port, os.path.join(tmp, "server.log"))
+            asyncio.run(wait_ready(base_url, server))
+            print(f"Server up on {base_url} (LLM_BACKEND={os.getenv('LLM_BACKEND', 'synthetic')})")
+
+        total = args.classrooms * args.students
+        print(f"Running {total} students x {args.turns} turns...")
+        result = asyncio.run(run_load(base_url, args))
+    finally:
+        if server:
+            server.terminate()
+            try:
+                server.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                server.kill()
+            if server.returncode not in (0, -15):
+                print(f"Server log: {os.path.join(tmp, 'server.log')}")
+                tmp = None  # keep it for a look
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    print_report(result)
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(result, json.load(f))
+    with open(args.out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nWrote {args.out}")
+
+if __name__ == "__main__":
+    main()
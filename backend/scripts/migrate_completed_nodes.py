@@ -0,0 +1,24 @@
+import os
+import sys
+
+# One-off migration for databases created before completed nodes were normalized:
+# creates the completed_nodes table and backfills it from the JSON array that
+# used to live on topic_progress.completed_nodes. Same steps as init_db() at
+# startup (tables, added columns, backfill); this script is for doing it ahead
+# of a deploy and reporting how many rows moved.
+#
+# Usage: DATABASE_URL=... python backend/scripts/migrate_completed_nodes.py
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from database import Base, SessionLocal, engine, add_missing_columns, backfill_completed_nodes
+
+if __name__ == "__main__":
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+    db = SessionLocal()
+    try:
+        moved = backfill_completed_nodes(db)
+        print(f"Done. {moved} completed nodes migrated.")
+    finally:
+        db.close()
@@ -0,0 +1,66 @@
+import os
+import sys
+import zlib
+
+# Trains the supervisor fast-path classifier from logged interactions.
+#
+# Uses the supervisor's routing log (source_node ROUTE_LOG_NODE): what the student
+# typed (user_query) and the destination the rules or the LLM router picked
+# (agent_response). The answering nodes' own rows aren't used - they log system
+# triggers and tutor hand-offs, not the message that was routed.
+# System-generated queries ("[System ...") are skipped: the rules already cover them.
+#
+# Usage: DATABASE_URL=... python backend/scripts/train_router.py [output.json]
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from database import SessionLocal, Interaction
+from router import RouteClassifier, DESTINATIONS, ROUTE_LOG_NODE, ROUTER_MODEL_PATH, ROUTER_MIN_CONFIDENCE
+
+def load_samples(db):
+    samples = []
+    rows = db.query(Interaction.user_query, Interaction.agent_response).filter(
+        Interaction.source_node == ROUTE_LOG_NODE
+    )
+    for query, decision in rows:
+        text = (query or "").strip()
+        if not text or text.startswith("[System") or decision not in DESTINATIONS:
+            continue
+        samples.append((text, decision))
+    return samples
+
+def evaluate(classifier, samples):
+    confident = correct = 0
+    for text, label in samples:
+        decision, confidence = classifier.predict(text)
+        if confidence >= ROUTER_MIN_CONFIDENCE:
+            confident += 1
+            correct += decision == label
+    return confident, correct
+
+if __name__ == "__main__":
+    out_path = sys.argv[1] if len(sys.argv) > 1 else ROUTER_MODEL_PATH
+
+    db = SessionLocal()
+    try:
+        samples = load_samples(db)
+    finally:
+        db.close()
+
+    if not samples:
+        print("No labelled interactions found; nothing to train.")
+        sys.exit(1)
+
+    # Stable 80/20 split so reruns on the same data report the same numbers
+    train = [s for s in samples if zlib.crc32(s[0].encode()) % 5]
+    held_out = [s for s in samples if not zlib.crc32(s[0].encode()) % 5]
+
+    if held_out:
+        confident, correct = evaluate(RouteClassifier.train(train), held_out)
+        print(f"Held-out: {len(held_out)} samples, {confident} above confidence {ROUTER_MIN_CONFIDENCE} "
+              f"({confident / len(held_out):.0%} coverage), "
+              f"precision {correct / confident if confident else 0:.1%}")
+
+    classifier = RouteClassifier.train(samples)
+    classifier.save(out_path)
+    print(f"Trained on {len(samples)} samples {classifier.class_counts} -> {out_path}")
@@ -0,0 +1,62 @@
+import sys
+import os
+import asyncio
+import shutil
+import tempfile
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from backend import database, interaction_log, main, problem_bank, turn_context
+
+# Shared test fixtures.
+#
+# temp_db: a throwaway SQLite file with the schema created and AsyncSessionLocal
+# pointed at it in every module that keeps its own reference. unittest classes
+# opt in with @pytest.mark.usefixtures("temp_db"); it runs before setUp and sets
+# self.tmp, self.db_path, self.engine and self.Session. Seed rows come from class
+# attributes:
+#   seed_players        - usernames to create
+#   seed_player_fields  - extra Player columns for each of them
+#   seed_progress       - TopicProgress columns for each of them (None: no progress row)
+
+SESSION_MODULES = (database, turn_context, main, problem_bank, interaction_log)
+
+@pytest.fixture
+def temp_db(request):
+    test = request.instance
+    tmp = tempfile.mkdtemp()
+    db_path = os.path.join(tmp, "test.db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    Session = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    async def create():
+        async with engine.begin() as conn:
+            await conn.run_sync(database.Base.metadata.create_all)
+        async with Session() as db:
+            for name in getattr(test, "seed_players", ()):
+                player = database.Player(username=name, **getattr(test, "seed_player_fields", {}))
+                db.add(player)
+                await db.flush()
+                progress = getattr(test, "seed_progress", None)
+                if progress is not None:
+                    db.add(database.TopicProgress(player_id=player.id, **progress))
+            await db.commit()
+    asyncio.run(create())
+
+    test.tmp, test.db_path, test.engine, test.Session = tmp, db_path, engine, Session
+    patches = [patch.object(module, "AsyncSessionLocal", Session) for module in SESSION_MODULES]
+    for p in patches:
+        p.start()
+    try:
+        yield
+    finally:
+        for p in patches:
+            p.stop()
+        asyncio.run(engine.dispose())
+        shutil.rmtree(tmp)
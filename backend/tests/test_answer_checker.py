@@ -0,0 +1,162 @@
+import sys
+import os
+import asyncio
+import json
+import time
+import unittest
+from unittest.mock import patch
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from backend import graph as agent_graph
+from backend.answer_checker import check_answer
+from backend.llm import get_llm
+
+class TestCheckAnswer(unittest.TestCase):
+    def test_numbers_and_fractions(self):
+        self.assertTrue(check_answer("3/4", "0.75"))
+        self.assertTrue(check_answer("3/4", "6/8"))
+        self.assertTrue(check_answer("1 3/4", "7/4"))
+        self.assertTrue(check_answer("1,250", "1250"))
+        self.assertTrue(check_answer("$12", "12 dollars"))
+        self.assertTrue(check_answer("45%", "0.45"))
+        self.assertTrue(check_answer("-3.5", "-3.50"))
+        self.assertTrue(check_answer("7", "the answer is 7"))
+        self.assertTrue(check_answer("x = 4", "x = 4"))
+        self.assertTrue(check_answer("-3", "−3"))
+        self.assertFalse(check_answer("1/3", "0.5"))
+        # A number key wants a number; anything else needs judgement, not a wrong verdict
+        self.assertIsNone(check_answer("5", "3 + 2"))
+        self.assertIsNone(check_answer("7", "2*3+1"))
+        self.assertIsNone(check_answer("3/4", "6/8 * 1"))
+        self.assertIsNone(check_answer("10%", "10"))
+        self.assertIsNone(check_answer("1/3", "0.333"))
+        self.assertIsNone(check_answer("2/3", "0.67"))
+        self.assertFalse(check_answer("3/4", "1/2"))
+        self.assertFalse(check_answer("42", "41"))
+
+    def test_expressions(self):
+        self.assertTrue(check_answer("2x+6", "2(x+3)"))
+        self.assertTrue(check_answer("x^2-1", "(x+1)(x-1)"))
+        self.assertTrue(check_answer("x = 4", "4"))
+        self.assertFalse(check_answer("x+1", "x+2"))
+
+    def test_choices_and_booleans(self):
+        self.assertTrue(check_answer("b", "(B)"))
+        self.assertTrue(check_answer("b) triangle", "b."))
+        self.assertFalse(check_answer("b", "c"))
+        self.assertTrue(check_answer("yes", "Yes."))
+        self.assertFalse(check_answer("true", "false"))
+
+    def test_units(self):
+        self.assertTrue(check_answer("12 cm", "12"))
+        self.assertFalse(check_answer("12 m", "13"))
+        # Different units need judgement
+        self.assertIsNone(check_answer("12 cm", "12 m"))
+
+    def test_unknown_goes_to_llm(self):
+        self.assertIsNone(check_answer("4", "I think it is four because there are four sides"))
+        self.assertIsNone(check_answer("triangle", "a shape with three sides"))
+        self.assertIsNone(check_answer("b) triangle", "triangle"))
+        self.assertIsNone(check_answer("", "4"))
+        self.assertIsNone(check_answer("1/0", "1"))
+
+    def test_huge_input_is_not_evaluated(self):
+        start = time.perf_counter()
+        self.assertIsNone(check_answer("2x", "((((9^99)^99)^99)^9)"))
+        self.assertIsNone(check_answer("5", "1" * 500))
+        self.assertLess(time.perf_counter() - start, 1)
+
+class VerifierLLM:
+    model_name = "fake-verifier"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        return AIMessage(content="[CORRECT] Great explanation!")
+
+class TestVerifierNode(unittest.TestCase):
+    def run_verifier(self, answer, expected):
+        state = {
+            "messages": [AIMessage(content="What is 3/4 as a decimal?"), HumanMessage(content=answer)],
+            "last_problem": "What is 3/4 as a decimal?",
+            "expected_answer": expected,
+            "username": "vic",
+            "topic": "Math",
+        }
+        self.llm = VerifierLLM()
+        with patch.object(agent_graph, "get_llm", lambda model, **kwargs: self.llm if model == "gpt-4o" and not kwargs else get_llm(model, **kwargs)), \
+             patch.object(agent_graph, "queue_interaction", self.noop):
+            return asyncio.run(agent_graph.verifier_node(state))
+
+    @staticmethod
+    def noop(*args, **kwargs):
+        pass
+
+    def test_keyed_answers_skip_llm(self):
+        result = self.run_verifier("0.75", "3/4")
+        self.assertIn("[CORRECT]", result["messages"][0].content)
+        self.assertEqual(self.llm.calls, 0)
+
+        result = self.run_verifier("0.7", "3/4")
+        self.assertIn("[INCORRECT]", result["messages"][0].content)
+        self.assertEqual(self.llm.calls, 0)
+        self.assertEqual(result["next_dest"], "ADAPTER")
+
+    def test_falls_back_to_llm(self):
+        self.run_verifier("three quarters, so seventy-five hundredths", "3/4")
+        self.assertEqual(self.llm.calls, 1)
+        # Live-generated problems have no key
+        self.run_verifier("0.75", "")
+        self.assertEqual(self.llm.calls, 1)
+
+class FusedLLM:
+    model_name = "fake-fused"
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        return AIMessage(content=json.dumps(self.reply))
+
+class TestFusedVerifier(unittest.TestCase):
+    @staticmethod
+    def noop(*args, **kwargs):
+        pass
+
+    def run_fused(self, reply, answer="three quarters"):
+        state = {
+            "messages": [AIMessage(content="What is 3/4 as a decimal?"), HumanMessage(content=answer)],
+            "last_problem": "What is 3/4 as a decimal?",
+            "username": "vic",
+            "topic": "Math",
+        }
+        self.llm = FusedLLM(reply)
+        with patch.object(agent_graph, "VERIFY_MODE", "fused"), \
+             patch.object(agent_graph, "get_llm", lambda *args, **kwargs: self.llm), \
+             patch.object(agent_graph, "queue_interaction", self.noop):
+            return asyncio.run(agent_graph.verifier_node(state))
+
+    def test_one_call_gives_feedback_and_verdict(self):
+        result = self.run_fused({"verdict": "CORRECT", "struggling": False, "feedback": "Outstanding!"})
+        self.assertEqual(result["messages"][0].content, "[CORRECT] Outstanding!")
+        self.assertTrue(result["judged"])
+        self.assertEqual(self.llm.calls, 1)
+
+    def test_struggling_non_answer_counts_as_miss(self):
+        result = self.run_fused({"verdict": "UNCLEAR", "struggling": True, "feedback": "Let's break it down."}, "I don't get it")
+        self.assertTrue(result["messages"][0].content.startswith("[INCORRECT]"))
+
+        result = self.run_fused({"verdict": "UNCLEAR", "struggling": False, "feedback": "Give it a try!"}, "hint?")
+        self.assertEqual(result["messages"][0].content, "Give it a try!")
+
+if __name__ == '__main__':
+    unittest.main()
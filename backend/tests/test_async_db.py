@@ -0,0 +1,54 @@
+import sys
+import os
+import asyncio
+import unittest
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+
+from backend.database import (
+    Base, Player, TopicProgress, add_completed_nodes, _async_url,
+    get_player_async, get_progress_async, get_completed_nodes_async
+)
+
+class TestAsyncDB(unittest.TestCase):
+    def test_async_url(self):
+        self.assertEqual(_async_url("sqlite:///./learning_data.db"), "sqlite+aiosqlite:///./learning_data.db")
+        self.assertEqual(_async_url("postgresql://u:p@h/db"), "postgresql+asyncpg://u:p@h/db")
+        self.assertEqual(_async_url("postgresql+psycopg2://u:p@h/db"), "postgresql+asyncpg://u:p@h/db")
+
+    def test_async_session_roundtrip(self):
+        async def run():
+            engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            Session = async_sessionmaker(engine, expire_on_commit=False)
+
+            async with Session() as db:
+                player = Player(username="async_user")
+                db.add(player)
+                await db.commit()
+                db.add(TopicProgress(player_id=player.id, topic_name="Math"))
+                await db.commit()
+
+            async with Session() as db:
+                player = await get_player_async(db, "async_user")
+                prog = await get_progress_async(db, player.id, "Math")
+                # Sync helpers run on the async session through run_sync
+                added = await db.run_sync(add_completed_nodes, prog, ["A->B", "A->C"])
+                await db.commit()
+                completed = await get_completed_nodes_async(db, prog.id)
+                missing = await get_player_async(db, "nobody")
+
+            await engine.dispose()
+            return added, completed, missing
+
+        added, completed, missing = asyncio.run(run())
+        self.assertEqual(added, ["A->B", "A->C"])
+        self.assertEqual(completed, ["A->B", "A->C"])
+        self.assertIsNone(missing)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+import sys
+import os
+import asyncio
+import json
+import unittest
+from itertools import cycle
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from backend import graph as agent_graph, main
+
+REPLY = "Fractions are parts of a whole"
+
+def fake_model(text):
+    # Streams one chunk per whitespace-separated token
+    return GenericFakeChatModel(messages=cycle([AIMessage(content=text)]))
+
+def parse_sse(body):
+    frames = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        frames.append((lines["event"], json.loads(lines["data"])))
+    return frames
+
+@pytest.mark.usefixtures("temp_db")
+class TestChatStream(unittest.TestCase):
+    seed_players = ("streamer",)
+
+    def setUp(self):
+        self.patches = [
+            patch.object(agent_graph, "get_llm", lambda model, **kwargs: fake_model(REPLY if model == "gpt-4o" and not kwargs else "GENERAL_CHAT")),
+        ]
+        for p in self.patches:
+            p.start()
+
+        async def override_db():
+            async with self.Session() as db:
+                yield db
+        main.app.dependency_overrides[main.get_db_async] = override_db
+        main.graph = agent_graph.create_graph().compile(checkpointer=MemorySaver())
+        self.token = main.create_access_token({"sub": "streamer"})
+
+        async def seed():
+            await main.graph.aupdate_state({"configurable": {"thread_id": "stream-1"}},
+                                           {"topic": "Math", "username": "streamer", "messages": []})
+        asyncio.run(seed())
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        main.app.dependency_overrides.clear()
+
+    def test_sse_emits_tokens_then_final(self):
+        async def run():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                r = await client.post("/chat_stream", json={"session_id": "stream-1", "message": "hi"},
+                                      headers={"Authorization": f"Bearer {self.token}"})
+                return r.status_code, r.headers["content-type"], r.text
+
+        status, content_type, body = asyncio.run(run())
+        self.assertEqual(status, 200)
+        self.assertTrue(content_type.startswith("text/event-stream"))
+
+        frames = parse_sse(body)
+        tokens = [data for event, data in frames if event == "token"]
+        self.assertGreater(len(tokens), 1)
+        # Router output is not streamed to the student
+        self.assertTrue(all(t["node"] == "general_chat" for t in tokens))
+        self.assertEqual("".join(t["delta"] for t in tokens), REPLY)
+
+        event, final = frames[-1]
+        self.assertEqual(event, "final")
+        self.assertEqual(final["response"], REPLY)
+        self.assertIn("current_action", final["state_snapshot"])
+
+    def test_sse_unknown_session(self):
+        async def run():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                r = await client.post("/chat_stream", json={"session_id": "missing", "message": "hi"},
+                                      headers={"Authorization": f"Bearer {self.token}"})
+                return r.text
+
+        frames = parse_sse(asyncio.run(run()))
+        self.assertEqual(frames, [("error", {"type": "error", "status": 404, "detail": "Session not found."})])
+
+    def test_websocket_multiple_turns(self):
+        client = TestClient(main.app)
+        with client.websocket_connect(f"/chat_ws?token={self.token}") as ws:
+            for _ in range(2):
+                ws.send_json({"session_id": "stream-1", "message": "hi"})
+                frames = []
+                while True:
+                    frame = ws.receive_json()
+                    frames.append(frame)
+                    if frame["type"] in ("final", "error"):
+                        break
+                self.assertEqual(frames[-1]["type"], "final")
+                self.assertEqual("".join(f["delta"] for f in frames if f["type"] == "token"), REPLY)
+
+    def failing_chat_model(self, failures):
+        # gpt-4o raises for the first `failures` turns, then replies normally
+        calls = []
+        class BrokenModel:
+            model_name = "broken"
+            async def ainvoke(self, messages):
+                raise RuntimeError("model exploded")
+
+        def get_llm(model, **kwargs):
+            if model == "gpt-4o" and not kwargs:
+                calls.append(model)
+                return BrokenModel() if len(calls) <= failures else fake_model(REPLY)
+            return fake_model("GENERAL_CHAT")
+        return patch.object(agent_graph, "get_llm", get_llm)
+
+    def test_sse_model_error_ends_with_error_frame(self):
+        async def run():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                r = await client.post("/chat_stream", json={"session_id": "stream-1", "message": "hi"},
+                                      headers={"Authorization": f"Bearer {self.token}"})
+                return r.status_code, r.text
+
+        with self.failing_chat_model(1):
+            status, body = asyncio.run(run())
+        self.assertEqual(status, 200)
+        event, data = parse_sse(body)[-1]
+        self.assertEqual((event, data["status"]), ("error", 500))
+
+    def test_websocket_survives_a_failed_turn(self):
+        client = TestClient(main.app)
+        with self.failing_chat_model(1), client.websocket_connect(f"/chat_ws?token={self.token}") as ws:
+            ends = []
+            for _ in range(2):
+                ws.send_json({"session_id": "stream-1", "message": "hi"})
+                while True:
+                    frame = ws.receive_json()
+                    if frame["type"] in ("final", "error"):
+                        ends.append(frame)
+                        break
+        self.assertEqual([(f["type"], f.get("status")) for f in ends], [("error", 500), ("final", None)])
+        self.assertEqual(ends[1]["response"], REPLY)
+
+    def test_websocket_rejects_bad_token(self):
+        client = TestClient(main.app)
+        with self.assertRaises(Exception):
+            with client.websocket_connect("/chat_ws?token=bogus") as ws:
+                ws.receive_json()
+
+if __name__ == '__main__':
+    unittest.main()
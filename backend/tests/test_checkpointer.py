@@ -0,0 +1,122 @@
+import sys
+import os
+import asyncio
+import datetime
+import operator
+import unittest
+from typing import TypedDict, List, Annotated
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, BaseMessage
+from langgraph.graph import StateGraph, END
+from sqlalchemy import create_engine, update, func, select
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+
+from backend.database import GraphCheckpoint
+from backend.checkpointer import SQLCheckpointSaver
+
+class EchoState(TypedDict):
+    messages: Annotated[List[BaseMessage], operator.add]
+    turns: int
+
+async def echo_node(state: EchoState):
+    return {"messages": [AIMessage(content=f"echo: {state['messages'][-1].content}")], "turns": state.get("turns", 0) + 1}
+
+def build_graph(checkpointer):
+    builder = StateGraph(EchoState)
+    builder.add_node("echo", echo_node)
+    builder.set_entry_point("echo")
+    builder.add_edge("echo", END)
+    return builder.compile(checkpointer=checkpointer)
+
+@pytest.mark.usefixtures("temp_db")
+class TestSQLCheckpointSaver(unittest.TestCase):
+    def setUp(self):
+        # Same file through both drivers, the way the app wires it
+        self.aio_engine = self.engine
+        self.engine = create_engine(f"sqlite:///{self.db_path}")
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def saver(self, **kwargs):
+        return SQLCheckpointSaver(sync_engine=self.engine, aio_engine=self.aio_engine, **kwargs)
+
+    def checkpoint_count(self, thread_id):
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(GraphCheckpoint.__table__).where(
+                GraphCheckpoint.__table__.c.thread_id == thread_id
+            )).scalar()
+
+    def test_state_survives_restart(self):
+        config = {"configurable": {"thread_id": "session-1"}}
+
+        async def first_worker():
+            graph = build_graph(self.saver())
+            for text in ["one", "two", "three"]:
+                await graph.ainvoke({"messages": [HumanMessage(content=text)]}, config)
+
+        async def second_worker():
+            # Fresh saver instance, same database: like a restart or another uvicorn worker
+            graph = build_graph(self.saver())
+            await graph.ainvoke({"messages": [HumanMessage(content="four")]}, config)
+            return (await graph.aget_state(config)).values
+
+        asyncio.run(first_worker())
+        values = asyncio.run(second_worker())
+        self.assertEqual(values["turns"], 4)
+        self.assertEqual([m.content for m in values["messages"]][-2:], ["four", "echo: four"])
+        self.assertEqual(len(values["messages"]), 8)
+
+        # Sync API sees the same thread
+        graph = build_graph(self.saver())
+        self.assertEqual(graph.get_state(config).values["turns"], 4)
+
+    def test_checkpoints_capped_per_thread(self):
+        config = {"configurable": {"thread_id": "capped"}}
+
+        async def run():
+            graph = build_graph(self.saver(max_per_thread=3))
+            for i in range(10):
+                await graph.ainvoke({"messages": [HumanMessage(content=str(i))]}, config)
+            return (await graph.aget_state(config)).values
+
+        values = asyncio.run(run())
+        self.assertEqual(values["turns"], 10)
+        self.assertEqual(self.checkpoint_count("capped"), 3)
+
+    def test_idle_threads_evicted(self):
+        async def run():
+            saver = self.saver(ttl_seconds=3600)
+            graph = build_graph(saver)
+            for thread_id in ["idle", "active"]:
+                await graph.ainvoke({"messages": [HumanMessage(content="hi")]}, {"configurable": {"thread_id": thread_id}})
+
+            with self.engine.begin() as conn:
+                conn.execute(update(GraphCheckpoint.__table__).where(
+                    GraphCheckpoint.__table__.c.thread_id == "idle"
+                ).values(created_at=datetime.datetime.utcnow() - datetime.timedelta(hours=2)))
+
+            return await saver.asweep()
+
+        result = asyncio.run(run())
+        self.assertEqual(result["evicted_threads"], 1)
+        self.assertEqual(self.checkpoint_count("idle"), 0)
+        self.assertGreater(self.checkpoint_count("active"), 0)
+
+    def test_delete_thread(self):
+        config = {"configurable": {"thread_id": "gone"}}
+
+        async def run():
+            saver = self.saver()
+            graph = build_graph(saver)
+            await graph.ainvoke({"messages": [HumanMessage(content="hi")]}, config)
+            await saver.adelete_thread("gone")
+            return await saver.aget_tuple(config)
+
+        self.assertIsNone(asyncio.run(run()))
+
+if __name__ == '__main__':
+    unittest.main()
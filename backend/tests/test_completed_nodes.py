@@ -0,0 +1,107 @@
+import sys
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+
+from backend.database import (
+    Base, Player, TopicProgress, CompletedNode,
+    add_completed_nodes, is_node_completed, get_completed_nodes,
+    get_node_completions, backfill_completed_nodes
+)
+
+class TestCompletedNodes(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+        self.db = sessionmaker(bind=engine)()
+
+        self.player = Player(username="completed_user")
+        self.db.add(self.player)
+        self.db.commit()
+        self.prog = TopicProgress(player_id=self.player.id, topic_name="Math")
+        self.db.add(self.prog)
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_bulk_insert_skips_existing(self):
+        self.assertEqual(add_completed_nodes(self.db, self.prog, ["A->B", "A->C", "A->B"]), ["A->B", "A->C"])
+        self.assertEqual(add_completed_nodes(self.db, self.prog, ["A->C", "A->D"]), ["A->D"])
+        self.db.commit()
+
+        self.assertEqual(self.prog.completed_nodes, ["A->B", "A->C", "A->D"])
+        self.assertEqual(self.db.query(CompletedNode).count(), 3)
+        self.assertTrue(is_node_completed(self.db, self.prog.id, "A->C"))
+        self.assertFalse(is_node_completed(self.db, self.prog.id, "A->E"))
+        self.assertEqual(get_completed_nodes(self.db, [self.prog.id]), {self.prog.id: ["A->B", "A->C", "A->D"]})
+
+    def test_who_completed_node(self):
+        other = Player(username="other_user")
+        self.db.add(other)
+        self.db.commit()
+        other_prog = TopicProgress(player_id=other.id, topic_name="Math")
+        self.db.add(other_prog)
+        self.db.commit()
+
+        add_completed_nodes(self.db, self.prog, ["A->B"])
+        add_completed_nodes(self.db, other_prog, ["A->B", "A->C"])
+        self.db.commit()
+
+        players = [row.player_id for row in get_node_completions(self.db, "A->B")]
+        self.assertEqual(sorted(players), sorted([self.player.id, other.id]))
+        self.assertEqual(get_node_completions(self.db, "A->B", topic="ELA"), [])
+
+    def test_backfill_from_json_column(self):
+        add_completed_nodes(self.db, self.prog, ["A->B"])
+        self.prog.legacy_completed_nodes = ["A->B", "A->C", "A->D"]
+        self.db.commit()
+
+        self.assertEqual(backfill_completed_nodes(self.db), 2)
+        self.assertEqual(self.prog.completed_nodes, ["A->B", "A->C", "A->D"])
+        self.assertIsNone(self.prog.legacy_completed_nodes)
+
+        # Idempotent
+        self.assertEqual(backfill_completed_nodes(self.db), 0)
+
+class TestMigrationScript(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.url = f"sqlite:///{os.path.join(self.tmp, 'old.db')}"
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_migrates_old_schema(self):
+        # A database from before the streak columns and completed_nodes table
+        engine = create_engine(self.url)
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE completed_nodes"))
+            conn.execute(text("ALTER TABLE topic_progress DROP COLUMN correct_streak"))
+            conn.execute(text("ALTER TABLE topic_progress DROP COLUMN incorrect_streak"))
+            conn.execute(text("INSERT INTO players (id, username) VALUES (1, 'old_user')"))
+            conn.execute(text("INSERT INTO topic_progress (player_id, topic_name, completed_nodes) VALUES (1, 'Math', '[\"A->B\", \"A->C\"]')"))
+        engine.dispose()
+
+        script = os.path.join(os.path.dirname(__file__), "..", "scripts", "migrate_completed_nodes.py")
+        result = subprocess.run([sys.executable, script], env={**os.environ, "DATABASE_URL": self.url},
+                                capture_output=True, text=True, timeout=120)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("2 completed nodes migrated", result.stdout)
+
+        engine = create_engine(self.url)
+        with engine.connect() as conn:
+            self.assertEqual(conn.execute(text("SELECT count(*) FROM completed_nodes")).scalar(), 2)
+            self.assertEqual(conn.execute(text("SELECT correct_streak FROM topic_progress")).scalar(), 0)
+        engine.dispose()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import sys
+import os
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langgraph.graph.message import add_messages
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from backend import context, graph as agent_graph
+
+class SummaryLLM:
+    model_name = "fake-summary"
+
+    def __init__(self):
+        self.prompts = []
+
+    async def ainvoke(self, messages):
+        self.prompts.append(messages[0].content)
+        return AIMessage(content="Student learned fractions and missed 3/4 vs 2/3.")
+
+def long_history(turns, words=60):
+    messages = []
+    for i in range(turns):
+        messages.append(HumanMessage(content=f"question {i} " + "word " * words, id=f"h{i}"))
+        messages.append(AIMessage(content=f"answer {i} " + "word " * words, id=f"a{i}"))
+    return messages
+
+class TestBudgets(unittest.TestCase):
+    def test_recent_messages_fit_budget(self):
+        messages = long_history(10)
+        per_message = context.count_tokens(messages[0])
+        recent = context.recent_messages(messages, per_message * 3)
+        self.assertEqual(recent, messages[-3:])
+
+        # The latest message is kept even if it alone is over budget
+        self.assertEqual(context.recent_messages(messages, 1), messages[-1:])
+
+    def test_build_context_includes_summary(self):
+        messages = long_history(10)
+        with patch.dict(os.environ, {"CONTEXT_BUDGET_GENERAL_CHAT": "300"}):
+            built = context.build_context(messages, "general_chat", "Earlier we did fractions.")
+        self.assertIsInstance(built[0], SystemMessage)
+        self.assertIn("Earlier we did fractions.", built[0].content)
+        self.assertEqual(built[-1], messages[-1])
+        self.assertLessEqual(sum(context.count_tokens(m) for m in built), 300)
+
+    def test_token_counts_are_cached(self):
+        message = HumanMessage(content="cache me " * 20)
+        context.count_tokens(message)
+        with patch.object(context, "count_text_tokens", side_effect=AssertionError("recounted")):
+            context.count_tokens(HumanMessage(content="cache me " * 20))
+
+class TestCompaction(unittest.TestCase):
+    def setUp(self):
+        self.llm = SummaryLLM()
+        self.patches = [
+            patch.object(context, "get_llm", lambda *args, **kwargs: self.llm),
+            patch.object(context, "HISTORY_MAX_TOKENS", 1000),
+            patch.object(context, "HISTORY_KEEP_TOKENS", 400),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def test_short_history_untouched(self):
+        self.assertEqual(asyncio.run(context.compact_history(long_history(2))), {})
+        self.assertEqual(self.llm.prompts, [])
+
+    def test_old_turns_folded_into_summary(self):
+        messages = long_history(12)
+        update = asyncio.run(context.compact_history(messages, "Previously: counting."))
+        self.assertIn("fractions", update["summary"])
+        self.assertIn("Previously: counting.", self.llm.prompts[0])
+
+        # Applying the update the way the graph does leaves a bounded history
+        remaining = add_messages(messages, update["messages"])
+        self.assertEqual(remaining, messages[-len(remaining):])
+        self.assertGreaterEqual(len(remaining), context.MIN_KEEP_MESSAGES)
+        self.assertLessEqual(sum(context.count_tokens(m) for m in remaining), 1000)
+
+    def test_supervisor_compacts_while_routing(self):
+        messages = long_history(12) + [HumanMessage(content="quiz me", id="last")]
+        result = asyncio.run(agent_graph.supervisor_node({"messages": messages, "current_action": "IDLE"}))
+        self.assertEqual(result["next_dest"], "PROBLEM_GENERATOR")
+        self.assertIn("summary", result)
+        self.assertTrue(result["messages"])
+
+if __name__ == '__main__':
+    unittest.main()
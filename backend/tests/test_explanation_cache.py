@@ -0,0 +1,185 @@
+import sys
+import os
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from backend import graph as agent_graph, explanation_cache, prefetch
+from backend.database import ExplanationCache
+from backend.llm import get_llm
+
+class CountingLLM:
+    model_name = "fake-teacher"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        return AIMessage(content=f"Explanation #{self.calls}")
+
+def teacher_state(username, message=None, style="Visual", role="Student"):
+    return {
+        "messages": [HumanMessage(content=message)] if message else [],
+        "username": username,
+        "topic": "Math",
+        "grade_level": "Grade 3",
+        "learning_style": style,
+        "location": "New Hampshire",
+        "role": role,
+        "view_as_student": False,
+    }
+
+class TestLessonTrigger(unittest.TestCase):
+    def test_only_openers_are_cacheable(self):
+        self.assertEqual(explanation_cache.lesson_trigger([]), "start")
+        self.assertEqual(explanation_cache.lesson_trigger([HumanMessage(content="Please start the lesson.")]), "start")
+        self.assertEqual(explanation_cache.lesson_trigger([HumanMessage(content="[System] Update Role Context.")]), "role")
+        self.assertIsNone(explanation_cache.lesson_trigger([HumanMessage(content="why is 3/4 bigger than 2/3?")]))
+        # "start" mid-conversation is a real turn, not an opener
+        history = [HumanMessage(content="hi"), AIMessage(content="hello"), HumanMessage(content="start lesson")]
+        self.assertIsNone(explanation_cache.lesson_trigger(history))
+
+    def test_key_normalizes_inputs(self):
+        a = explanation_cache.explanation_params("A->B", "Grade 3", "Visual", "Student", False, "New Hampshire", "start")
+        b = explanation_cache.explanation_params("A->B", " grade  3", "visual", "Student", False, "new hampshire", "start")
+        self.assertEqual(explanation_cache.explanation_key(a), explanation_cache.explanation_key(b))
+
+        # Teachers previewing as a student share the student entry
+        c = explanation_cache.explanation_params("A->B", "Grade 3", "Visual", "Teacher", True, "New Hampshire", "start")
+        self.assertEqual(explanation_cache.explanation_key(a), explanation_cache.explanation_key(c))
+        d = explanation_cache.explanation_params("A->B", "Grade 3", "Auditory", "Student", False, "New Hampshire", "start")
+        self.assertNotEqual(explanation_cache.explanation_key(a), explanation_cache.explanation_key(d))
+
+@pytest.mark.usefixtures("temp_db")
+class TestTeacherCache(unittest.TestCase):
+    seed_players = ("ann", "ben", "cam")
+    seed_progress = {"topic_name": "Math"}
+
+    def setUp(self):
+        self.llm = CountingLLM()
+        self.patches = [
+            patch.object(agent_graph, "get_llm", lambda model, **kwargs: self.llm if model == "gpt-4o" and not kwargs else get_llm(model, **kwargs)),
+            # Only count the teacher's own calls
+            patch.object(prefetch, "PREFETCH_ENABLED", False),
+        ]
+        for p in self.patches:
+            p.start()
+        explanation_cache.clear_explanation_cache()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        explanation_cache.clear_explanation_cache()
+
+    def test_lesson_start_reuses_explanation(self):
+        first = asyncio.run(agent_graph.teacher_node(teacher_state("ann", "Please start the lesson.")))
+        second = asyncio.run(agent_graph.teacher_node(teacher_state("ben", "Please start the lesson.")))
+        self.assertEqual(self.llm.calls, 1)
+        self.assertEqual(first["messages"][0].content, second["messages"][0].content)
+
+        # Survives a restart (memory cleared, row still there)
+        explanation_cache.clear_explanation_cache()
+        third = asyncio.run(agent_graph.teacher_node(teacher_state("cam", "Please start the lesson.")))
+        self.assertEqual(self.llm.calls, 1)
+        self.assertEqual(third["messages"][0].content, first["messages"][0].content)
+
+        async def rows():
+            async with self.Session() as db:
+                return await db.run_sync(lambda s: s.query(ExplanationCache).all())
+        saved = asyncio.run(rows())
+        self.assertEqual(len(saved), 1)
+        self.assertEqual(saved[0].hits, 0)  # reads don't write
+
+    def test_prune_records_hits_and_keeps_hot_rows(self):
+        keys = []
+        for node in ("A->B", "B->C", "C->D"):
+            params = explanation_cache.explanation_params(node, "Grade 3", "Visual", "Student", False, "NH", "start")
+            keys.append((explanation_cache.explanation_key(params), params))
+
+        async def run():
+            async with self.Session() as db:
+                for key, params in keys:
+                    await db.run_sync(lambda s, key=key, params=params: explanation_cache.store_explanation(s, key, params, "Hello"))
+                await db.commit()
+            # The first-stored lesson is the one students keep opening
+            explanation_cache.clear_explanation_cache()
+            async with self.Session() as db:
+                for _ in range(3):
+                    await db.run_sync(lambda s: explanation_cache.get_cached_explanation(s, keys[0][0]))
+            with patch.object(explanation_cache, "EXPLANATION_CACHE_MAX_ROWS", 2):
+                async with self.Session() as db:
+                    removed = await db.run_sync(explanation_cache.prune_explanations)
+                    await db.commit()
+            async with self.Session() as db:
+                rows = await db.run_sync(lambda s: s.query(ExplanationCache).all())
+            return removed, {r.cache_key: r.hits for r in rows}
+
+        removed, hits = asyncio.run(run())
+        self.assertEqual(removed, 1)
+        self.assertEqual(hits[keys[0][0]], 3)
+        self.assertNotIn(keys[1][0], hits)  # Least recently used, not oldest
+
+    def test_helpers_leave_commit_to_caller(self):
+        params = explanation_cache.explanation_params("A->B", "Grade 3", "Visual", "Student", False, "NH", "start")
+        key = explanation_cache.explanation_key(params)
+
+        async def run():
+            async with self.Session() as db:
+                await db.run_sync(lambda s: explanation_cache.store_explanation(s, key, params, "Hello"))
+                await db.rollback()
+            async with self.Session() as db:
+                return await db.run_sync(lambda s: s.query(ExplanationCache).count())
+        self.assertEqual(asyncio.run(run()), 0)
+
+    def test_simultaneous_openers_both_succeed(self):
+        # Both students miss the cache and reach the LLM before either stores
+        started, release = [], asyncio.Event()
+
+        class GatedLLM:
+            model_name = "fake-teacher"
+            async def ainvoke(self, messages):
+                started.append(1)
+                if len(started) == 2:
+                    release.set()
+                await release.wait()
+                return AIMessage(content=f"Explanation #{len(started)}")
+
+        async def run():
+            gated = GatedLLM()
+            with patch.object(agent_graph, "get_llm", lambda model, **kwargs: gated):
+                return await asyncio.gather(
+                    agent_graph.teacher_node(teacher_state("ann", "Please start the lesson.")),
+                    agent_graph.teacher_node(teacher_state("ben", "Please start the lesson.")),
+                )
+
+        results = asyncio.run(run())
+        self.assertTrue(all(r["messages"][0].content for r in results))
+
+        async def rows():
+            async with self.Session() as db:
+                return await db.run_sync(lambda s: s.query(ExplanationCache).count())
+        self.assertEqual(asyncio.run(rows()), 1)
+
+    def test_follow_up_questions_bypass_cache(self):
+        asyncio.run(agent_graph.teacher_node(teacher_state("ann", "Please start the lesson.")))
+        asyncio.run(agent_graph.teacher_node(teacher_state("ben", "can you explain that differently?")))
+        asyncio.run(agent_graph.teacher_node(teacher_state("cam", "Please start the lesson.", style="Auditory")))
+        self.assertEqual(self.llm.calls, 3)
+
+    def test_expired_entries_regenerate(self):
+        asyncio.run(agent_graph.teacher_node(teacher_state("ann", "Please start the lesson.")))
+        explanation_cache.clear_explanation_cache()
+        with patch.object(explanation_cache, "EXPLANATION_CACHE_TTL", -1):
+            asyncio.run(agent_graph.teacher_node(teacher_state("ben", "Please start the lesson.")))
+        self.assertEqual(self.llm.calls, 2)
+
+if __name__ == '__main__':
+    unittest.main()
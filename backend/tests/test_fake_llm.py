@@ -0,0 +1,138 @@
+import sys
+import os
+import asyncio
+import json
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from backend import fake_llm, llm
+from backend.fake_llm import FakeChatModel
+from backend.prompts import ADAPTER_PROMPT, PROBLEM_BANK_PROMPT, SUPERVISOR_PROMPT, VERIFIER_PROMPT
+
+class RealLLM:
+    """Stands in for the ChatOpenAI a recording client wraps."""
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        return self.invoke(messages)
+
+    def invoke(self, messages):
+        self.calls += 1
+        return AIMessage(content=self.reply)
+
+def instant(**kwargs):
+    return FakeChatModel(latency="0", tokens_per_sec=0, **kwargs)
+
+def ask(model, prompt, user="hi"):
+    return asyncio.run(model.ainvoke([SystemMessage(content=prompt), HumanMessage(content=user)])).content
+
+class TestFakeLLM(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cassette = os.path.join(self.tmp, "cassette.jsonl")
+
+    def tearDown(self):
+        fake_llm._cassettes.clear()
+        shutil.rmtree(self.tmp)
+
+    def test_record_then_replay(self):
+        real = RealLLM("Fractions are parts of a whole.")
+        recorder = instant(mode="record", inner=real, cassette_path=self.cassette)
+        self.assertEqual(ask(recorder, "You are a Teacher Agent.", "fractions?"), "Fractions are parts of a whole.")
+        self.assertEqual(real.calls, 1)
+
+        # A fresh process only has the file
+        fake_llm._cassettes.clear()
+        player = instant(mode="replay", cassette_path=self.cassette)
+        self.assertEqual(ask(player, "You are a Teacher Agent.", "fractions?"), "Fractions are parts of a whole.")
+
+        # Different prompt or model is a miss
+        with patch.object(fake_llm, "REPLAY_MISS", "error"):
+            with self.assertRaises(KeyError):
+                ask(player, "You are a Teacher Agent.", "decimals?")
+            with self.assertRaises(KeyError):
+                ask(instant(mode="replay", model_name="gpt-4o-mini", cassette_path=self.cassette),
+                    "You are a Teacher Agent.", "fractions?")
+        self.assertTrue(ask(player, "You are a Teacher Agent.", "decimals?"))
+
+    def test_synthetic_agent_replies(self):
+        model = instant()
+        route = SUPERVISOR_PROMPT.format(last_message="12", last_action="PROBLEM_GIVEN")
+        self.assertEqual(ask(model, route), "VERIFIER")
+        route = SUPERVISOR_PROMPT.format(last_message="Give me a practice problem", last_action="EXPLAINING")
+        self.assertEqual(ask(model, route), "PROBLEM_GENERATOR")
+
+        verify = VERIFIER_PROMPT.format(last_problem="What is 7 + 5?", last_answer="12")
+        self.assertIn("[CORRECT]", ask(model, verify))
+        verify = VERIFIER_PROMPT.format(last_problem="What is 7 + 5?", last_answer="13")
+        self.assertIn("[INCORRECT]", ask(model, verify))
+
+        adapter = ADAPTER_PROMPT.format(topic="Addition", history="AI: [CORRECT] yes\nAI: [CORRECT] yes")
+        self.assertEqual(json.loads(ask(model, adapter))["decision"], "MASTERED")
+
+        bank = PROBLEM_BANK_PROMPT.format(topic="Math", concept="Addition", grade_level=2, count=3)
+        problems = json.loads(ask(model, bank))["problems"]
+        self.assertEqual(len(problems), 3)
+        self.assertTrue(all(p["problem"] and p["answer"] for p in problems))
+
+        # Same prompt, same reply
+        self.assertEqual(ask(model, "You are a Teacher Agent.", "fractions?"), ask(model, "You are a Teacher Agent.", "fractions?"))
+
+    def test_sync_invoke_matches_async(self):
+        model = instant()
+        messages = [SystemMessage(content="You are a Teacher Agent."), HumanMessage(content="fractions?")]
+        self.assertEqual(model.invoke(messages).content, asyncio.run(model.ainvoke(messages)).content)
+
+        real = RealLLM("Halves are two equal parts.")
+        recorder = instant(mode="record", inner=real, cassette_path=self.cassette)
+        self.assertEqual(recorder.invoke(messages).content, "Halves are two equal parts.")
+        fake_llm._cassettes.clear()
+        self.assertEqual(instant(mode="replay", cassette_path=self.cassette).invoke(messages).content, "Halves are two equal parts.")
+
+    def test_streaming_is_paced(self):
+        model = FakeChatModel(latency="const:0.05", tokens_per_sec=200)
+        messages = [SystemMessage(content="You are a Teacher Agent."), HumanMessage(content="fractions?")]
+
+        async def run():
+            start = time.perf_counter()
+            first, chunks = None, []
+            async for chunk in model.astream(messages):
+                first = first or time.perf_counter() - start
+                chunks.append(chunk.content)
+            return first, time.perf_counter() - start, "".join(chunks)
+
+        with patch.object(fake_llm, "FAKE_OUTPUT_TOKENS", 40):
+            first, total, text = asyncio.run(run())
+        self.assertGreaterEqual(first, 0.05)
+        self.assertGreaterEqual(total, 0.05 + 40 / 200 * 0.9)
+        self.assertGreater(len(text.split()), 10)
+
+    def test_latency_specs(self):
+        rng = fake_llm.random.Random(1)
+        self.assertEqual(fake_llm.parse_latency("0.3")(rng), 0.3)
+        self.assertTrue(0.2 <= fake_llm.parse_latency("uniform:0.2,0.4")(rng) <= 0.4)
+        self.assertGreater(fake_llm.parse_latency("lognormal:-0.7,0.4")(rng), 0)
+        with self.assertRaises(ValueError):
+            fake_llm.parse_latency("poisson:1")
+
+    def test_backend_switch(self):
+        with patch.object(llm, "LLM_BACKEND", "synthetic"), patch.object(llm, "_clients", {}):
+            client = llm.get_llm("gpt-4o-mini", temperature=0)
+            self.assertIsInstance(client, FakeChatModel)
+            self.assertEqual(llm.model_name(client), "gpt-4o-mini")
+            self.assertFalse(llm.get_llm("gpt-4o", response_format={"type": "text"}).json_mode)
+            self.assertTrue(llm.get_llm("gpt-4o", response_format={"type": "json_object"}).json_mode)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import sys
+import os
+import random
+import unittest
+
+# Add backend directory
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from knowledge_graph import KnowledgeGraph
+
+def brute_force_learnable(kg, completed, target_grade=None):
+    # Reference implementation: full scan over every concept
+    g = kg.graph
+    out = []
+    for n in g.nodes():
+        if n in completed or g.nodes[n].get("type") != "concept":
+            continue
+        if all(p in completed for p in g.predecessors(n) if g.nodes[p].get("type") == "concept"):
+            out.append(n)
+    if target_grade is not None:
+        out.sort(key=lambda n: (abs(g.nodes[n]["grade_level"] - target_grade), g.nodes[n]["grade_level"], n))
+    else:
+        out.sort(key=lambda n: (g.nodes[n]["grade_level"], n))
+    return out
+
+class TestLearnerFrontier(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.kg = KnowledgeGraph("math")
+
+    def test_incremental_matches_full_scan(self):
+        kg = self.kg
+        rng = random.Random(7)
+        completed = []
+        learner = "frontier-test"
+
+        for step in range(120):
+            # Learn something on the frontier most of the time, occasionally jump ahead
+            ready = [n.id for n in kg.get_next_learnable_nodes(completed, learner_key=learner)]
+            pool = ready if ready and rng.random() < 0.8 else kg.node_ids()
+            completed.append(rng.choice(pool))
+
+            target = rng.choice([None, 1, 4, 8])
+            expected = brute_force_learnable(kg, set(completed), target)
+            got = [n.id for n in kg.get_next_learnable_nodes(completed, target_grade=target, learner_key=learner)]
+            self.assertEqual(got, expected, f"step {step}")
+
+            top = [n.id for n in kg.get_next_learnable_nodes(completed, target_grade=target, limit=3, learner_key=learner)]
+            self.assertEqual(top, expected[:3])
+
+    def test_rewritten_history_rebuilds(self):
+        kg = self.kg
+        first = kg.get_next_learnable_nodes([], target_grade=2, limit=1, learner_key="rewrite")[0].id
+        kg.get_next_learnable_nodes([first], learner_key="rewrite")
+
+        # Same learner, different history (e.g. progress reset): must not reuse stale counts
+        got = [n.id for n in kg.get_next_learnable_nodes([], target_grade=2, learner_key="rewrite")]
+        self.assertIn(first, got)
+        self.assertEqual(got, brute_force_learnable(kg, set(), 2))
+
+    def test_mark_complete_updates_ready_set(self):
+        kg = self.kg
+        frontier = kg.new_frontier()
+        node = kg.get_next_learnable_nodes([], target_grade=2, limit=1)[0]
+        self.assertTrue(frontier.is_ready(node.id))
+        self.assertTrue(frontier.mark_complete(node.id))
+        self.assertFalse(frontier.mark_complete(node.id))
+        self.assertFalse(frontier.is_ready(node.id))
+        self.assertTrue(frontier.is_completed(node.id))
+
+class TestCompletionStats(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.kg = KnowledgeGraph("english")
+
+    def reference_stats(self, completed, subtree_root=None):
+        g = self.kg.graph
+        scope = [
+            n for n in g.nodes()
+            if not subtree_root or n == subtree_root or n.startswith(subtree_root + "->")
+        ]
+        core = {n for n in scope if g.nodes[n].get("type") == "concept" and g.nodes[n].get("node_type") == "core"}
+        if not core:
+            return 0, 0
+        return len(core & set(completed)), len(core)
+
+    def test_subtree_ranges_match_path_scan(self):
+        kg = self.kg
+        rng = random.Random(3)
+        ids = kg.node_ids()
+        for trial in range(50):
+            completed = rng.sample(ids, rng.randint(0, 300))
+            root = "->".join(rng.choice(ids).split("->")[:-1]) or None
+            expected = self.reference_stats(completed, root)
+            self.assertEqual(kg.get_completion_stats(completed, root), expected)
+            self.assertEqual(kg.get_completion_stats(completed, root, learner_key=f"stats-{trial % 4}"), expected)
+
+    def test_subtree_is_contiguous_range(self):
+        kg = self.kg
+        ids = kg.node_ids()
+        root = "Writing_Standards"
+        start, end = kg.subtree_range(root)
+        self.assertEqual(ids[start], root)
+        inside = [n for n in ids if n == root or n.startswith(root + "->")]
+        self.assertEqual(ids[start:end], inside)
+        # Sibling topics sharing a string prefix are not part of the subtree
+        self.assertTrue(all(n.startswith(root + "->") for n in ids[start + 1:end]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import sys
+import os
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import event
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from backend import interaction_log
+from backend.database import Interaction
+
+class BrokenSession:
+    async def __aenter__(self):
+        raise ConnectionError("database is down")
+
+    async def __aexit__(self, *exc):
+        return False
+
+@pytest.mark.usefixtures("temp_db")
+class TestInteractionLog(unittest.TestCase):
+    def setUp(self):
+        self.commits = 0
+        def count_commit(conn):
+            self.commits += 1
+        event.listen(self.engine.sync_engine, "commit", count_commit)
+
+        self.spill = os.path.join(self.tmp, "spill.jsonl")
+        self.patches = [
+            patch.object(interaction_log, "SPILL_PATH", self.spill),
+        ]
+        for p in self.patches:
+            p.start()
+        interaction_log._pending.clear()
+        interaction_log._stats.clear()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        interaction_log._pending.clear()
+        interaction_log._stats.clear()
+
+    def log(self, n, prefix="q"):
+        for i in range(n):
+            interaction_log.queue_interaction("lee", "Math", f"{prefix}{i}", "a", "teacher")
+
+    def rows(self):
+        async def load():
+            async with self.Session() as db:
+                return await db.run_sync(lambda s: [i.user_query for i in s.query(Interaction).order_by(Interaction.id)])
+        return asyncio.run(load())
+
+    def test_one_commit_per_batch(self):
+        self.log(30)
+        self.assertEqual(asyncio.run(interaction_log.flush_interactions()), 30)
+        self.assertEqual(self.commits, 1)
+        self.assertEqual(self.rows(), [f"q{i}" for i in range(30)])
+        # Nothing left, nothing written
+        self.assertEqual(asyncio.run(interaction_log.flush_interactions()), 0)
+        self.assertEqual(self.commits, 1)
+
+    def test_overflow_spills_then_replays(self):
+        with patch.object(interaction_log, "MAX_PENDING", 5):
+            self.log(8)
+        self.assertEqual(interaction_log.interaction_log_stats()["pending"], 5)
+        self.assertTrue(os.path.exists(self.spill))
+
+        self.assertEqual(asyncio.run(interaction_log.flush_interactions()), 8)
+        self.assertEqual(sorted(self.rows()), sorted(f"q{i}" for i in range(8)))
+        self.assertFalse(os.path.exists(self.spill))
+
+    def test_failed_flush_keeps_rows(self):
+        self.log(3)
+        with patch.object(interaction_log, "AsyncSessionLocal", BrokenSession):
+            self.assertEqual(asyncio.run(interaction_log.flush_interactions()), 0)
+        self.assertEqual(interaction_log.interaction_log_stats()["failed_flushes"], 1)
+        self.log(1, prefix="late")
+        self.assertEqual(asyncio.run(interaction_log.flush_interactions()), 4)
+        self.assertEqual(self.rows(), ["q0", "q1", "q2", "late0"])
+
+    def test_drops_without_spill_file(self):
+        with patch.object(interaction_log, "MAX_PENDING", 2), patch.object(interaction_log, "SPILL_PATH", ""):
+            self.log(5)
+        self.assertEqual(interaction_log.interaction_log_stats()["dropped"], 3)
+
+    def test_logger_flushes_full_batch_early(self):
+        async def run():
+            logger = asyncio.create_task(interaction_log.run_interaction_logger(interval=60))
+            await asyncio.sleep(0)
+            with patch.object(interaction_log, "BATCH_SIZE", 4):
+                self.log(4)
+            for _ in range(50):
+                if interaction_log.interaction_log_stats()["written"]:
+                    break
+                await asyncio.sleep(0.01)
+            logger.cancel()
+        asyncio.run(run())
+        self.assertEqual(len(self.rows()), 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+
+# Add backend directory
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import knowledge_graph
+from knowledge_graph import KnowledgeGraph
+from kg_snapshot import load_snapshot, snapshot_path
+
+class TestKGSnapshot(unittest.TestCase):
+    def setUp(self):
+        # Work on a private copy of the Math graph so real snapshots are untouched
+        self.tmp = tempfile.mkdtemp()
+        shutil.copytree(os.path.join(knowledge_graph.GRAPH_DIR, "NH", "Math"),
+                        os.path.join(self.tmp, "NH", "Math"))
+        self._orig_dir = knowledge_graph.GRAPH_DIR
+        knowledge_graph.GRAPH_DIR = self.tmp
+        self.subject_dir = os.path.join(self.tmp, "NH", "Math")
+
+    def tearDown(self):
+        knowledge_graph.GRAPH_DIR = self._orig_dir
+        shutil.rmtree(self.tmp)
+
+    def test_snapshot_matches_json(self):
+        from_json = KnowledgeGraph("math", use_snapshot=False)
+        from_json.save_snapshot()
+        self.assertIsNotNone(load_snapshot(self.subject_dir))
+
+        from_snap = KnowledgeGraph("math")
+
+        self.assertEqual(list(from_json.graph.nodes(data=True)), list(from_snap.graph.nodes(data=True)))
+        self.assertEqual(set(from_json.graph.edges()), set(from_snap.graph.edges()))
+        for n in from_json.graph:
+            self.assertEqual(list(from_json.graph.predecessors(n)), list(from_snap.graph.predecessors(n)))
+            self.assertEqual(from_json.get_prerequisites(n), from_snap.get_prerequisites(n))
+
+        self.assertEqual(
+            [c.id for c in from_json.get_next_learnable_nodes([], target_grade=3)],
+            [c.id for c in from_snap.get_next_learnable_nodes([], target_grade=3)]
+        )
+
+    def test_stale_snapshot_falls_back_to_json(self):
+        KnowledgeGraph("math")  # JSON load writes the snapshot
+        self.assertIsNotNone(load_snapshot(self.subject_dir))
+
+        # Touching the sources invalidates the digest
+        with open(os.path.join(self.subject_dir, "03_Math.json"), "a") as f:
+            f.write("\n")
+        self.assertIsNone(load_snapshot(self.subject_dir))
+
+        kg = KnowledgeGraph("math")
+        self.assertGreater(len(kg), 0)
+        self.assertIsNotNone(load_snapshot(self.subject_dir), "JSON fallback should refresh the snapshot")
+
+    def test_read_paths_skip_networkx(self):
+        kg = KnowledgeGraph("math")
+        candidates = kg.get_next_learnable_nodes([], target_grade=2)
+        self.assertTrue(candidates)
+        kg.get_completion_stats([candidates[0].id])
+        kg.get_window(candidates[0].id)
+        kg.get_prerequisites(candidates[0].id)
+        self.assertIsNone(kg._nx_graph, "networkx view should only be built on demand")
+        self.assertGreater(len(kg.graph), 0)
+
+    def test_corrupt_snapshot_rejected(self):
+        KnowledgeGraph("math")
+        path = snapshot_path(self.subject_dir)
+        with open(path, "r+b") as f:
+            f.seek(-8, os.SEEK_END)
+            f.write(b"\xff" * 8)
+        self.assertIsNone(load_snapshot(self.subject_dir))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import sys
+import os
+import asyncio
+import time
+import unittest
+from unittest.mock import patch
+
+import httpx
+import pytest
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from backend import graph as agent_graph, main, llm
+from backend.llm import ainvoke_llm, set_model_concurrency
+
+LLM_DELAY = 0.2
+
+class FakeLLM:
+    """Stands in for ChatOpenAI: fixed reply after a fixed delay, counts peak concurrency."""
+    def __init__(self, reply, model_name="fake-model", delay=LLM_DELAY):
+        self.reply = reply
+        self.model_name = model_name
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+
+    async def ainvoke(self, messages):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        return AIMessage(content=self.reply)
+
+class TestLLMLimits(unittest.TestCase):
+    def test_concurrency_cap_per_model(self):
+        fake = FakeLLM("ok", model_name="capped-model", delay=0.05)
+        set_model_concurrency("capped-model", 2)
+
+        async def run():
+            await asyncio.gather(*[ainvoke_llm(fake, []) for _ in range(6)])
+
+        asyncio.run(run())
+        self.assertEqual(fake.peak, 2)
+
+    def test_timeout(self):
+        fake = FakeLLM("late", model_name="slow-model", delay=1.0)
+
+        async def run():
+            await ainvoke_llm(fake, [], timeout=0.05)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(run())
+
+class TestClientRegistry(unittest.TestCase):
+    def tearDown(self):
+        asyncio.run(llm.aclose_llm_clients())
+
+    def test_clients_are_shared_per_config(self):
+        a = llm.get_llm("gpt-4o")
+        self.assertIs(a, llm.get_llm("gpt-4o"))
+        json_mode = llm.get_llm("gpt-4o", response_format={"type": "json_object"})
+        self.assertIsNot(a, json_mode)
+        self.assertIsNot(llm.get_llm("gpt-4o-mini", temperature=0), llm.get_llm("gpt-4o-mini"))
+
+        # every client rides on the same keep-alive pool
+        self.assertIs(a.http_async_client, json_mode.http_async_client)
+        self.assertIs(a.http_client, llm.get_llm("gpt-4o-mini").http_client)
+
+    def test_model_limits_from_env(self):
+        self.assertEqual(llm._parse_model_limits("gpt-4o=16, gpt-4o-mini=48"), {"gpt-4o": 16, "gpt-4o-mini": 48})
+        self.assertEqual(llm._parse_model_limits(""), {})
+
+@pytest.mark.usefixtures("temp_db")
+class TestConcurrentChat(unittest.TestCase):
+    def setUp(self):
+        self.chat_llm = FakeLLM("Hello there!", model_name="fake-gpt-4o")
+        self.router_llm = FakeLLM("GENERAL_CHAT", model_name="fake-router")
+        self.patches = [
+            patch.object(agent_graph, "get_llm", lambda model, **kwargs: self.chat_llm if model == "gpt-4o" and not kwargs else self.router_llm),
+        ]
+        for p in self.patches:
+            p.start()
+
+        async def override_db():
+            async with self.Session() as db:
+                yield db
+        main.app.dependency_overrides[main.get_db_async] = override_db
+        main.app.dependency_overrides[main.get_current_user] = lambda: None
+        main.graph = agent_graph.create_graph().compile(checkpointer=MemorySaver())
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        main.app.dependency_overrides.clear()
+
+    def test_concurrent_chats_overlap(self):
+        n = 8
+
+        async def run():
+            sessions = []
+            for i in range(n):
+                config = {"configurable": {"thread_id": f"concurrency-{i}"}}
+                await main.graph.aupdate_state(config, {"topic": "Math", "username": f"student{i}", "messages": []})
+                sessions.append(f"concurrency-{i}")
+
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                start = time.perf_counter()
+                responses = await asyncio.gather(*[
+                    client.post("/chat", json={"session_id": sid, "message": "hi"}) for sid in sessions
+                ])
+                return time.perf_counter() - start, responses
+
+        elapsed, responses = asyncio.run(run())
+        for r in responses:
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.json()["response"], "Hello there!")
+
+        # Each turn is two sequential LLM calls (router + chat). Run serially that's n * 2 * delay.
+        one_turn = 2 * LLM_DELAY
+        self.assertLess(elapsed, one_turn * 2.5, f"{n} concurrent turns took {elapsed:.2f}s")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import sys
+import os
+import asyncio
+import json
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from sqlalchemy import create_engine, inspect, text
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from backend import database, graph as agent_graph
+from backend.mastery_policy import verdict_of, is_confused, update_streaks, decide
+
+NODE = "G->Reason_with_shapes_and_their_attributes->3.G.1"
+
+class AdapterLLM:
+    model_name = "fake-adapter"
+
+    def __init__(self, decision="CONTINUE_PRACTICE"):
+        self.decision = decision
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        return AIMessage(content=json.dumps({"decision": self.decision, "reason": "test", "remediation_topic": None}))
+
+class TestPolicy(unittest.TestCase):
+    def test_verdicts(self):
+        self.assertEqual(verdict_of("[CORRECT] Outstanding!"), "CORRECT")
+        self.assertEqual(verdict_of("[INCORRECT] Not quite"), "INCORRECT")
+        self.assertIsNone(verdict_of("Let's look at this again"))
+        self.assertIsNone(verdict_of("[CORRECT] part one, [INCORRECT] part two"))
+
+    def test_streak_rules(self):
+        c, i = update_streaks(0, 0, "CORRECT")
+        self.assertEqual(decide(c, i), "CONTINUE_PRACTICE")
+        c, i = update_streaks(c, i, "CORRECT")
+        self.assertEqual(decide(c, i), "MASTERED")
+
+        # A wrong answer breaks the correct streak
+        c, i = update_streaks(1, 0, "INCORRECT")
+        self.assertEqual((c, i), (0, 1))
+        c, i = update_streaks(c, i, "INCORRECT")
+        self.assertEqual(decide(c, i), "REMEDIATE")
+
+    def test_confusion(self):
+        self.assertTrue(is_confused("I don't get it"))
+        self.assertTrue(is_confused("im confused, why is it 4?"))
+        self.assertFalse(is_confused("4"))
+        self.assertFalse(is_confused("the answer is 3/4"))
+
+@pytest.mark.usefixtures("temp_db")
+class TestAdapterNode(unittest.TestCase):
+    seed_players = ("ada",)
+    seed_progress = {"topic_name": "Math", "current_node": NODE}
+
+    def setUp(self):
+        self.llm = AdapterLLM()
+        self.patches = [
+            patch.object(agent_graph, "get_llm", lambda *args, **kwargs: self.llm),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def answer_turn(self, answer, verdict):
+        state = {
+            "messages": [HumanMessage(content=answer), AIMessage(content=verdict)],
+            "username": "ada",
+            "topic": "Math",
+        }
+        return asyncio.run(agent_graph.adapter_node(state))
+
+    def progress(self):
+        async def load():
+            async with self.Session() as db:
+                prog = await database.get_progress_async(db, 1, "Math")
+                return prog, await database.get_completed_nodes_async(db, prog.id)
+        return asyncio.run(load())
+
+    def test_two_correct_masters_without_llm(self):
+        result = self.answer_turn("4", "[CORRECT] Outstanding!")
+        self.assertEqual(result["next_dest"], "PROBLEM_GENERATOR")
+        self.assertEqual(result["correct_streak"], 1)
+        prog, _ = self.progress()
+        self.assertEqual(prog.correct_streak, 1)
+
+        result = self.answer_turn("6", "[CORRECT] Nailed it!")
+        self.assertEqual(result["correct_streak"], 0)
+        self.assertIn("mastered", result["messages"][0].content)
+        prog, completed = self.progress()
+        self.assertEqual(completed, [NODE])
+        self.assertEqual(self.llm.calls, 0)
+
+    def test_incorrect_resets_correct_streak(self):
+        self.answer_turn("4", "[CORRECT] Outstanding!")
+        self.answer_turn("5", "[INCORRECT] Not quite")
+        result = self.answer_turn("4", "[CORRECT] Outstanding!")
+        self.assertEqual(result["next_dest"], "PROBLEM_GENERATOR")
+        self.assertEqual(self.progress()[1], [])
+        self.assertEqual(self.llm.calls, 0)
+
+    def test_ambiguous_turns_ask_llm(self):
+        self.answer_turn("I don't understand, can you help?", "[INCORRECT] Let's try again")
+        self.answer_turn("4", "Hmm, can you tell me more?")
+        self.assertEqual(self.llm.calls, 2)
+
+    def test_judged_turns_skip_llm(self):
+        # Fused/local verdicts are final, even for a confused-sounding answer
+        state = {
+            "messages": [HumanMessage(content="I don't get it"), AIMessage(content="[INCORRECT] Let's break it down.")],
+            "username": "ada", "topic": "Math", "judged": True,
+        }
+        result = asyncio.run(agent_graph.adapter_node(state))
+        self.assertEqual(result["incorrect_streak"], 1)
+        self.assertEqual(self.llm.calls, 0)
+
+class TestAddMissingColumns(unittest.TestCase):
+    def test_old_database_gets_streak_columns(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'old.db')}")
+            with engine.begin() as conn:
+                conn.execute(text("CREATE TABLE topic_progress (id INTEGER PRIMARY KEY, topic_name VARCHAR)"))
+            database.add_missing_columns(engine)
+            columns = {c["name"] for c in inspect(engine).get_columns("topic_progress")}
+            self.assertIn("correct_streak", columns)
+            self.assertIn("incorrect_streak", columns)
+            # Second run is a no-op
+            database.add_missing_columns(engine)
+            engine.dispose()
+        finally:
+            shutil.rmtree(tmp)
+
+if __name__ == '__main__':
+    unittest.main()
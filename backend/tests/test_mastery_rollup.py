@@ -0,0 +1,78 @@
+import sys
+import os
+import unittest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+
+from backend.database import Base, Player, TopicProgress, MasteryRollup
+from backend.knowledge_graph import get_graph
+from backend import mastery_rollup
+from backend.mastery_rollup import get_mastery_rollup, refresh_mastery_rollup, compute_mastery_rollup
+
+class TestMasteryRollup(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+        self.db = sessionmaker(bind=engine)()
+        mastery_rollup._cache.clear()
+
+        self.player = Player(username="rollup_user", grade_level=3)
+        self.db.add(self.player)
+        self.db.commit()
+
+        self.kg = get_graph("Math")
+        self.nodes = [n.id for n in self.kg.get_next_learnable_nodes([], target_grade=3, limit=5)]
+        self.prog = TopicProgress(player_id=self.player.id, topic_name="Math", completed_nodes=self.nodes[:2])
+        self.db.add(self.prog)
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_rollup_matches_direct_stats(self):
+        stats = get_mastery_rollup(self.player.id, self.db)
+        done, total = self.kg.get_completion_stats(self.nodes[:2])
+        self.assertEqual(stats["subjects"]["Math"], [done, total])
+        self.assertEqual(stats["overall"][0], 2)
+        self.assertEqual(sum(b[0] for b in stats["grade_bands"].values()), 2)
+        self.assertEqual(sum(b[1] for b in stats["grade_bands"].values()), stats["overall"][1])
+
+        # Materialized alongside progress
+        row = self.db.query(MasteryRollup).filter(MasteryRollup.player_id == self.player.id).first()
+        self.assertEqual(row.stats["overall"], stats["overall"])
+
+    def test_refresh_on_write_invalidates_cache(self):
+        self.assertEqual(get_mastery_rollup(self.player.id, self.db)["overall"][0], 2)
+
+        self.prog.completed_nodes = self.nodes[:4]
+        refresh_mastery_rollup(self.player.id, self.db)
+        self.db.commit()
+
+        self.assertEqual(get_mastery_rollup(self.player.id, self.db)["overall"][0], 4)
+        self.assertEqual(compute_mastery_rollup(self.player.id, self.db)["overall"][0], 4)
+
+    def test_read_leaves_transaction_to_caller(self):
+        self.player.xp = 99  # caller's pending work
+        get_mastery_rollup(self.player.id, self.db)
+        self.db.rollback()
+        self.assertEqual(self.db.query(Player).filter(Player.username == "rollup_user").first().xp, 0)
+        self.assertEqual(self.db.query(MasteryRollup).count(), 0)
+
+    def test_rebuild_over_existing_row(self):
+        # Another request already stored a row for this player
+        get_mastery_rollup(self.player.id, self.db)
+        self.db.commit()
+        mastery_rollup._cache.clear()
+        self.prog.completed_nodes = self.nodes[:3]
+        refresh_mastery_rollup(self.player.id, self.db)
+        self.db.commit()
+        self.db.expire_all()
+        rows = self.db.query(MasteryRollup).filter(MasteryRollup.player_id == self.player.id).all()
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0].stats["overall"][0], 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import sys
+import os
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import httpx
+import pytest
+from langgraph.checkpoint.memory import MemorySaver
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from backend import graph as agent_graph, main, metrics
+from backend.fake_llm import FakeChatModel
+
+def fake_model(name):
+    return FakeChatModel(model_name=name, latency="0", tokens_per_sec=0)
+
+class TestHistogram(unittest.TestCase):
+    def test_render_is_cumulative(self):
+        h = metrics.Histogram("demo_seconds", "Demo.", ("node",), buckets=(0.1, 1.0))
+        for v in (0.05, 0.5, 0.5, 3.0):
+            h.observe(v, 'te"st')
+        lines = h.render()
+        self.assertIn('demo_seconds_bucket{node="te\\"st",le="0.1"} 1', lines)
+        self.assertIn('demo_seconds_bucket{node="te\\"st",le="1"} 3', lines)
+        self.assertIn('demo_seconds_bucket{node="te\\"st",le="+Inf"} 4', lines)
+        self.assertIn('demo_seconds_count{node="te\\"st"} 4', lines)
+        self.assertIn('demo_seconds_sum{node="te\\"st"} 4.05', lines)
+
+@pytest.mark.usefixtures("temp_db")
+class TestRequestTracing(unittest.TestCase):
+    seed_players = ("tracer",)
+
+    def setUp(self):
+        metrics.instrument_engine(self.engine.sync_engine)
+
+        self.patches = [
+            patch.object(agent_graph, "get_llm", lambda model, **kwargs: fake_model("gpt-4o" if model == "gpt-4o" and not kwargs else "gpt-4o-mini")),
+            patch.object(agent_graph, "queue_interaction", lambda *args, **kwargs: None),
+        ]
+        for p in self.patches:
+            p.start()
+
+        async def override_db():
+            async with self.Session() as db:
+                yield db
+        main.app.dependency_overrides[main.get_db_async] = override_db
+        main.graph = agent_graph.create_graph().compile(checkpointer=MemorySaver())
+        self.token = main.create_access_token({"sub": "tracer"})
+
+        async def seed():
+            await main.graph.aupdate_state({"configurable": {"thread_id": "trace-1"}},
+                                           {"topic": "Math", "username": "tracer", "messages": []})
+        asyncio.run(seed())
+        metrics.clear_traces()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        main.app.dependency_overrides.clear()
+
+    def request(self, method, url, **kwargs):
+        async def run():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await client.request(method, url, **kwargs)
+        return asyncio.run(run())
+
+    def test_chat_trace_links_nodes(self):
+        db_before = metrics.DB_QUERIES.count("/chat")
+        r = self.request("POST", "/chat", json={"session_id": "trace-1", "message": "hello there"},
+                         headers={"Authorization": f"Bearer {self.token}"})
+        self.assertEqual(r.status_code, 200)
+        trace_id = r.headers["x-trace-id"]
+
+        spans = self.request("GET", "/traces", params={"trace_id": trace_id}).json()["spans"]
+        by_id = {s["span_id"]: s for s in spans}
+        root = next(s for s in spans if s["parent_id"] is None)
+        self.assertEqual(root["name"], "POST /chat")
+        self.assertGreater(root["attrs"]["db_queries"], 0)
+
+        nodes = [s for s in spans if s["name"].startswith("node:")]
+        self.assertIn("node:supervisor", [s["name"] for s in nodes])
+        self.assertTrue(all(s["parent_id"] == root["span_id"] for s in nodes))
+        # LLM calls hang off the node that made them
+        llm_spans = [s for s in spans if s["name"] == "llm"]
+        self.assertTrue(llm_spans)
+        self.assertTrue(all(by_id[s["parent_id"]]["name"].startswith("node:") for s in llm_spans))
+        self.assertGreater(llm_spans[0]["attrs"]["completion_tokens"], 0)
+
+        text = self.request("GET", "/metrics").text
+        self.assertIn('http_request_duration_seconds_count{method="POST",path="/chat",status="200"}', text)
+        self.assertIn('graph_node_duration_seconds_count{node="supervisor"}', text)
+        self.assertIn('llm_tokens_total{model="gpt-4o', text)
+        self.assertEqual(metrics.DB_QUERIES.count("/chat"), db_before + 1)
+
+    def test_unknown_trace(self):
+        self.assertEqual(self.request("GET", "/traces", params={"trace_id": "nope"}).status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import sys
+import os
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from backend import database, nav_context
+
+NODE = "G->Reason_with_shapes_and_their_attributes->3.G.1"
+
+class TestNavContext(unittest.TestCase):
+    def setUp(self):
+        nav_context.clear_nav_context()
+        self.loads = 0
+
+    def tearDown(self):
+        nav_context.clear_nav_context()
+
+    def nav(self, progress, completed=(), grade=3):
+        async def load():
+            self.loads += 1
+            return list(completed)
+        return asyncio.run(nav_context.get_nav_context(progress, grade, load))
+
+    def test_repeat_turns_are_lookups(self):
+        prog = SimpleNamespace(id=1, topic_name="Math", current_node=NODE)
+        first = self.nav(prog)
+        self.assertEqual(first["current_node_label"], nav_context.get_graph("Math").get_node(NODE).label)
+        self.assertEqual(self.nav(prog), first)
+        self.assertEqual(self.loads, 1)
+
+        # Moving on, or a different grade, recomputes
+        prog.current_node = None
+        self.assertNotIn("current_node_label", self.nav(prog))
+        self.nav(prog, grade=4)
+        self.assertEqual(self.loads, 3)
+
+    def test_ttl(self):
+        prog = SimpleNamespace(id=2, topic_name="Math", current_node=NODE)
+        with patch.object(nav_context, "NAV_CONTEXT_TTL", -1):
+            self.nav(prog)
+            self.nav(prog)
+        self.assertEqual(self.loads, 2)
+
+    @pytest.mark.usefixtures("temp_db")
+    def test_completing_a_node_invalidates(self):
+        engine = create_engine(f"sqlite:///{self.db_path}")
+        db = sessionmaker(bind=engine)()
+        try:
+            player = database.Player(username="nia")
+            db.add(player)
+            db.flush()
+            prog = database.TopicProgress(player_id=player.id, topic_name="Math", current_node=NODE)
+            db.add(prog)
+            db.commit()
+
+            self.nav(prog)
+            self.assertNotIn("prev_node_label", self.nav(prog))
+            database.add_completed_nodes(db, prog, [NODE])
+            db.commit()
+            self.assertIn("prev_node_label", self.nav(prog, completed=[NODE]))
+            self.assertEqual(self.loads, 2)
+        finally:
+            db.close()
+            engine.dispose()
+
+if __name__ == '__main__':
+    unittest.main()
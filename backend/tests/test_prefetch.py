@@ -0,0 +1,158 @@
+import sys
+import os
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from backend import graph as agent_graph, prefetch, problem_bank
+from backend.llm import get_llm
+
+class SlowLLM:
+    model_name = "fake-prefetch"
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = []
+
+    async def ainvoke(self, messages):
+        self.calls.append(messages[0].content)
+        await asyncio.sleep(self.delay)
+        return AIMessage(content=f"Reply #{len(self.calls)}")
+
+class TestPrefetchRegistry(unittest.TestCase):
+    def setUp(self):
+        prefetch.reset_prefetch_stats()
+
+    def tearDown(self):
+        prefetch._prefetches.clear()
+        prefetch.reset_prefetch_stats()
+
+    def test_hit_and_stale(self):
+        async def run():
+            async def make():
+                return "problem"
+            prefetch.schedule_prefetch("t1", "A->B", make)
+            await asyncio.sleep(0)
+            hit = await prefetch.take_prefetch("t1", "A->B")
+
+            prefetch.schedule_prefetch("t1", "A->B", make)
+            # Student moved to another node: not usable
+            stale = await prefetch.take_prefetch("t1", "A->C")
+            miss = await prefetch.take_prefetch("t1", "A->B")
+            return hit, stale, miss
+
+        self.assertEqual(asyncio.run(run()), ("problem", None, None))
+        stats = prefetch.prefetch_stats()
+        self.assertEqual((stats["hits"], stats["stale"], stats["misses"]), (1, 1, 1))
+        self.assertEqual(stats["use_rate"], 0.5)
+
+    def test_replace_cancels_and_cap_skips(self):
+        async def run():
+            started = []
+
+            async def make():
+                started.append(1)
+                await asyncio.sleep(10)
+
+            with patch.object(prefetch, "PREFETCH_MAX_OUTSTANDING", 2):
+                prefetch.schedule_prefetch("t1", "A", make)
+                first = prefetch._prefetches["t1"].task
+                prefetch.schedule_prefetch("t1", "A", make)  # replaces t1
+                prefetch.schedule_prefetch("t2", "A", make)
+                capped = prefetch.schedule_prefetch("t3", "A", make)
+            await asyncio.sleep(0)
+            self.assertTrue(first.cancelled())
+            prefetch.cancel_all_prefetches()
+            return capped
+
+        self.assertFalse(asyncio.run(run()))
+        stats = prefetch.prefetch_stats()
+        self.assertEqual(stats["skipped"], 1)
+        self.assertEqual(stats["cancelled"], 3)
+        self.assertEqual(stats["outstanding"], 0)
+
+    def test_abandoned_entries_are_swept(self):
+        async def run():
+            async def make():
+                return "problem"
+
+            async def fail():
+                raise RuntimeError("llm down")
+
+            async def hang():
+                await asyncio.sleep(10)
+
+            prefetch.schedule_prefetch("done", "A", make)
+            prefetch.schedule_prefetch("failed", "A", fail)
+            prefetch.schedule_prefetch("old", "A", hang)
+            await asyncio.sleep(0)
+            prefetch._prefetches["old"].created_at -= prefetch.PREFETCH_TTL + 1
+            prefetch.schedule_prefetch("new", "A", make)
+            return sorted(prefetch._prefetches)
+
+        self.assertEqual(asyncio.run(run()), ["done", "new"])
+
+        # Left over from a loop that has since closed
+        self.assertEqual(prefetch.outstanding(), 0)
+        self.assertEqual(prefetch._prefetches, {})
+
+@pytest.mark.usefixtures("temp_db")
+class TestTeacherPrefetch(unittest.TestCase):
+    seed_players = ("quinn",)
+    seed_progress = {"topic_name": "Math", "mistakes": []}
+
+    def setUp(self):
+        self.llm = SlowLLM()
+        self.patches = [
+            patch.object(agent_graph, "get_llm", lambda model, **kwargs: self.llm if model == "gpt-4o" and not kwargs else get_llm(model, **kwargs)),
+        ]
+        for p in self.patches:
+            p.start()
+        prefetch.reset_prefetch_stats()
+        problem_bank._pending.clear()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        prefetch._prefetches.clear()
+        prefetch.reset_prefetch_stats()
+        problem_bank._pending.clear()
+
+    def state(self, message):
+        return {
+            "messages": [HumanMessage(content=message)], "username": "quinn", "topic": "Math",
+            "grade_level": "Grade 3", "role": "Student", "view_as_student": False,
+        }
+
+    def test_quiz_after_explanation_uses_prefetch(self):
+        config = {"configurable": {"thread_id": "quinn-1"}}
+
+        async def run():
+            await agent_graph.teacher_node(self.state("can you explain shapes?"), config)
+            await asyncio.sleep(0.1)  # student reads the explanation
+            return await agent_graph.problem_node(self.state("quiz me"), config)
+
+        result = asyncio.run(run())
+        # One teacher call, one (prefetched) problem call, nothing extra on "quiz me"
+        self.assertEqual(len(self.llm.calls), 2)
+        self.assertIn("Problem Generator", self.llm.calls[1])
+        self.assertEqual(result["last_problem"], "Reply #2")
+        self.assertEqual(prefetch.prefetch_stats()["hits"], 1)
+
+    def test_other_thread_does_not_consume(self):
+        async def run():
+            await agent_graph.teacher_node(self.state("can you explain shapes?"), {"configurable": {"thread_id": "a"}})
+            return await agent_graph.problem_node(self.state("quiz me"), {"configurable": {"thread_id": "b"}})
+
+        asyncio.run(run())
+        self.assertEqual(prefetch.prefetch_stats()["misses"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
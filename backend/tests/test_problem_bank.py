@@ -0,0 +1,146 @@
+import sys
+import os
+import asyncio
+import json
+import unittest
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from backend import database, graph as agent_graph, problem_bank
+from backend.database import ProblemBankEntry
+from backend.llm import get_llm
+
+NODE = "G->Reason_with_shapes_and_their_attributes->3.G.1"
+
+class BankLLM:
+    """Returns numbered JSON problems, counts calls."""
+    model_name = "fake-bank"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        problems = [
+            {"problem": f"Batch {self.calls} problem {i}: how many sides?", "answer": str(i), "skills": ["counting sides"]}
+            for i in range(problem_bank.BATCH_SIZE)
+        ]
+        return AIMessage(content=json.dumps({"problems": problems}))
+
+class LiveLLM:
+    model_name = "fake-live"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        return AIMessage(content="Live problem: what is 2 + 2?")
+
+@pytest.mark.usefixtures("temp_db")
+class TestProblemBank(unittest.TestCase):
+    seed_players = ("pat",)
+    seed_progress = {"topic_name": "Math", "current_node": NODE, "mistakes": []}
+
+    def setUp(self):
+        self.bank_llm = BankLLM()
+        self.live_llm = LiveLLM()
+        self.patches = [
+            patch.object(problem_bank, "get_llm", lambda *args, **kwargs: self.bank_llm),
+            patch.object(agent_graph, "get_llm", lambda model, **kwargs: self.live_llm if model == "gpt-4o" and not kwargs else get_llm(model, **kwargs)),
+        ]
+        for p in self.patches:
+            p.start()
+        problem_bank._pending.clear()
+        problem_bank._llm_calls.clear()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        problem_bank._pending.clear()
+        problem_bank._llm_calls.clear()
+
+    def problem_turn(self):
+        state = {"messages": [HumanMessage(content="quiz me")], "username": "pat", "topic": "Math", "grade_level": "Grade 3"}
+        return asyncio.run(agent_graph.problem_node(state))
+
+    def bank_rows(self):
+        async def rows():
+            async with self.Session() as db:
+                return await db.run_sync(lambda s: s.query(ProblemBankEntry).all())
+        return asyncio.run(rows())
+
+    def test_empty_pool_falls_back_and_queues_refill(self):
+        result = self.problem_turn()
+        self.assertEqual(self.live_llm.calls, 1)
+        self.assertEqual(result["expected_answer"], "")
+        self.assertIn(("Math", NODE, 3), problem_bank._pending)
+
+    def test_refill_then_serve_without_repeats(self):
+        added = asyncio.run(problem_bank.refill_pool("Math", NODE, 3, want=10))
+        self.assertEqual(added, 10)
+        self.assertEqual(self.bank_llm.calls, 2)
+
+        served = set()
+        for _ in range(10):
+            result = self.problem_turn()
+            self.assertTrue(result["expected_answer"])
+            served.add(result["last_problem"])
+        self.assertEqual(len(served), 10)
+        self.assertEqual(self.live_llm.calls, 0)
+
+        # Pool exhausted for this player: live generator again
+        self.problem_turn()
+        self.assertEqual(self.live_llm.calls, 1)
+
+    def test_refill_respects_budget(self):
+        with patch.object(problem_bank, "LLM_BUDGET_PER_HOUR", 1):
+            added = asyncio.run(problem_bank.refill_pool("Math", NODE, 3, want=20))
+        self.assertEqual(added, problem_bank.BATCH_SIZE)
+        self.assertEqual(self.bank_llm.calls, 1)
+
+    def test_prefers_problems_matching_mistakes(self):
+        async def seed():
+            async with self.Session() as db:
+                db.add(ProblemBankEntry(topic="Math", node_id=NODE, grade=3, problem="Count the corners of a square", answer="4", skills=["vertices"]))
+                db.add(ProblemBankEntry(topic="Math", node_id=NODE, grade=3, problem="Is a rhombus a quadrilateral?", answer="yes", skills=["quadrilateral classification"]))
+                prog = (await db.execute(database.select(database.TopicProgress))).scalars().first()
+                prog.mistakes = ["Confused a rhombus with a quadrilateral family"]
+                await db.commit()
+        asyncio.run(seed())
+
+        result = self.problem_turn()
+        self.assertEqual(result["expected_answer"], "yes")
+
+    def test_pick_leaves_commit_to_caller(self):
+        async def run():
+            async with self.Session() as db:
+                db.add(ProblemBankEntry(topic="Math", node_id=NODE, grade=3, problem="How many sides on a triangle?", answer="3", skills=[]))
+                await db.commit()
+                player = (await db.execute(database.select(database.Player))).scalars().first()
+                picked = await db.run_sync(lambda s: problem_bank.pick_problem(s, player.id, "Math", NODE, 3))
+                self.assertEqual(picked["answer"], "3")
+                await db.rollback()
+                # Rolled back with the turn, so it's still unseen
+                again = await db.run_sync(lambda s: problem_bank.pick_problem(s, player.id, "Math", NODE, 3))
+                self.assertEqual(again["id"], picked["id"])
+                # A second mark of the same problem is a no-op, not an IntegrityError
+                await db.run_sync(lambda s: database.insert_on_conflict(
+                    s, database.ServedProblem, [{"player_id": player.id, "problem_id": picked["id"]}], ["player_id", "problem_id"]))
+                await db.commit()
+                return await db.run_sync(lambda s: s.query(database.ServedProblem).count())
+        self.assertEqual(asyncio.run(run()), 1)
+
+    def test_parse_problems_skips_bad_items(self):
+        content = json.dumps({"problems": [{"problem": "1+1?", "answer": 2}, {"problem": "no answer"}, "junk"]})
+        self.assertEqual(problem_bank.parse_problems(content), [{"problem": "1+1?", "answer": "2", "skills": []}])
+        self.assertEqual(problem_bank.parse_problems("not json"), [])
+
+if __name__ == '__main__':
+    unittest.main()
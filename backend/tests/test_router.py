@@ -0,0 +1,123 @@
+import sys
+import os
+import asyncio
+import unittest
+from unittest.mock import patch
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from langchain_core.messages import AIMessage, HumanMessage
+from backend import router, graph as agent_graph
+from backend.router import route_by_rules, fast_route, RouteClassifier, router_stats, reset_router_stats, set_classifier
+
+class TestRules(unittest.TestCase):
+    def test_buttons_and_triggers(self):
+        self.assertEqual(route_by_rules("Teach Me", "IDLE"), "TEACHER")
+        self.assertEqual(route_by_rules("Quiz Me", "EXPLAINING"), "PROBLEM_GENERATOR")
+        self.assertEqual(route_by_rules("Explain", "PROBLEM_GIVEN"), "TEACHER")
+        self.assertEqual(route_by_rules("Please start the lesson.", "IDLE"), "TEACHER")
+        self.assertEqual(route_by_rules("Teach me about Fractions", "IDLE"), "TEACHER")
+        self.assertEqual(route_by_rules("[System] Update Grade Level Context.", "PROBLEM_GIVEN"), "TEACHER")
+
+    def test_answers_only_after_problem(self):
+        for answer in ["42", "-3.5", "3/4", "1 3/4", "x = 4", "b", "(c)", "12 cm", "2*3+1 = 7", "The answer is 9"]:
+            self.assertEqual(route_by_rules(answer, "PROBLEM_GIVEN"), "VERIFIER", answer)
+            self.assertIsNone(route_by_rules(answer, "EXPLAINING"), answer)
+
+    def test_free_text_left_alone(self):
+        self.assertIsNone(route_by_rules("why do we flip the second fraction?", "PROBLEM_GIVEN"))
+        self.assertIsNone(route_by_rules("I can't do this", "IDLE"))
+        self.assertIsNone(route_by_rules("", "IDLE"))
+
+class TestClassifier(unittest.TestCase):
+    def setUp(self):
+        samples = [
+            ("what is a fraction", "TEACHER"), ("explain how division works", "TEACHER"),
+            ("how do fractions work", "TEACHER"), ("what does numerator mean", "TEACHER"),
+            ("hello there", "GENERAL_CHAT"), ("what is your name", "GENERAL_CHAT"),
+            ("tell me a joke", "GENERAL_CHAT"), ("hello how are you", "GENERAL_CHAT"),
+        ]
+        self.classifier = RouteClassifier.train(samples)
+
+    def tearDown(self):
+        set_classifier(None)
+        router._classifier_loaded = False
+
+    def test_predicts_and_roundtrips(self):
+        label, confidence = self.classifier.predict("explain how fractions work")
+        self.assertEqual(label, "TEACHER")
+        self.assertGreater(confidence, 0.5)
+
+        restored = RouteClassifier.from_dict(self.classifier.to_dict())
+        self.assertEqual(restored.predict("tell me a joke"), self.classifier.predict("tell me a joke"))
+
+    def test_low_confidence_falls_through(self):
+        set_classifier(self.classifier)
+        with patch.object(router, "ROUTER_MIN_CONFIDENCE", 0.999999):
+            self.assertEqual(fast_route("zebra", "IDLE"), (None, None))
+        with patch.object(router, "ROUTER_MIN_CONFIDENCE", 0.5):
+            self.assertEqual(fast_route("explain how fractions work", "IDLE"), ("TEACHER", "classifier"))
+
+    def test_verifier_needs_an_open_problem(self):
+        classifier = RouteClassifier.train([
+            ("i think it is seven", "VERIFIER"), ("my answer is nine", "VERIFIER"),
+            ("i think it is four", "VERIFIER"), ("tell me a joke", "GENERAL_CHAT"),
+        ])
+        set_classifier(classifier)
+        with patch.object(router, "ROUTER_MIN_CONFIDENCE", 0.5):
+            self.assertEqual(fast_route("i think it is five", "PROBLEM_GIVEN"), ("VERIFIER", "classifier"))
+            self.assertEqual(fast_route("i think it is five", "EXPLAINING"), (None, None))
+
+class TestSupervisorFastPath(unittest.TestCase):
+    def setUp(self):
+        reset_router_stats()
+        set_classifier(None)
+
+    def tearDown(self):
+        router._classifier_loaded = False
+
+    def test_rules_skip_llm(self):
+        def no_llm(*args, **kwargs):
+            raise AssertionError("LLM router should not be called")
+
+        with patch.object(agent_graph, "get_llm", no_llm):
+            state = {"messages": [HumanMessage(content="Quiz Me")], "current_action": "EXPLAINING"}
+            result = asyncio.run(agent_graph.supervisor_node(state))
+        self.assertEqual(result["next_dest"], "PROBLEM_GENERATOR")
+
+        stats = router_stats()
+        self.assertEqual(stats["total"], 1)
+        self.assertEqual(stats["by_source"]["rules"], 1)
+        self.assertEqual(stats["fast_path_hit_rate"], 1.0)
+
+    def test_routes_are_logged_for_training(self):
+        logged = []
+        def log(*args):
+            logged.append(args)
+
+        class RouterLLM:
+            model_name = "fake-router"
+            async def ainvoke(self, messages):
+                return AIMessage(content="PROBLEM_GENERATOR")
+
+        classifier = RouteClassifier.train([("tell me a joke", "GENERAL_CHAT"), ("hello there", "GENERAL_CHAT")])
+        with patch.object(agent_graph, "queue_interaction", log), \
+             patch.object(agent_graph, "get_llm", lambda *args, **kwargs: RouterLLM()):
+            for text in ["Quiz Me", "can I get a practice question"]:
+                state = {"messages": [HumanMessage(content=text)], "current_action": "EXPLAINING", "username": "rio", "topic": "Math"}
+                asyncio.run(agent_graph.supervisor_node(state))
+            # The classifier's own picks aren't fed back into its training data
+            set_classifier(classifier)
+            with patch.object(router, "ROUTER_MIN_CONFIDENCE", 0.5):
+                state = {"messages": [HumanMessage(content="tell me a joke")], "current_action": "IDLE", "username": "rio", "topic": "Math"}
+                self.assertEqual(asyncio.run(agent_graph.supervisor_node(state))["next_dest"], "GENERAL_CHAT")
+
+        self.assertEqual(logged, [
+            ("rio", "Math", "Quiz Me", "PROBLEM_GENERATOR", router.ROUTE_LOG_NODE),
+            ("rio", "Math", "can I get a practice question", "PROBLEM_GENERATOR", router.ROUTE_LOG_NODE),
+        ])
+
+if __name__ == '__main__':
+    unittest.main()
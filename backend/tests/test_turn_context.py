@@ -0,0 +1,164 @@
+import sys
+import os
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import MemorySaver
+from sqlalchemy import event
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from backend import database, graph as agent_graph, main, prefetch, turn_context, interaction_log
+from backend.database import Interaction
+
+NODE = "G->Reason_with_shapes_and_their_attributes->3.G.1"
+
+class RouteLLM:
+    model_name = "fake-turn"
+
+    def __init__(self, reply, on_call=None):
+        self.reply = reply
+        self.on_call = on_call
+
+    async def ainvoke(self, messages):
+        if self.on_call:
+            self.on_call()
+        return AIMessage(content=self.reply)
+
+@pytest.mark.usefixtures("temp_db")
+class TestTurnScope(unittest.TestCase):
+    seed_players = ("tia",)
+
+    def test_nested_scopes_share_the_turn(self):
+        async def run():
+            async with turn_context.begin_turn() as turn:
+                async with turn_context.turn_scope() as inner:
+                    same = inner is turn
+                    first = await inner.player("tia")
+                async with turn_context.turn_scope() as again:
+                    second = await again.player("tia")
+            async with turn_context.turn_scope() as outside:
+                fresh = outside is not turn
+            return same, first is second, fresh
+        self.assertEqual(asyncio.run(run()), (True, True, True))
+
+    def test_failed_turn_rolls_back(self):
+        async def run():
+            try:
+                async with turn_context.begin_turn() as turn:
+                    (await turn.player("tia")).xp = 50
+                    raise RuntimeError("node failed")
+            except RuntimeError:
+                pass
+            async with turn_context.begin_turn() as turn:
+                (await turn.player("tia")).learning_style = "Auditory"
+            async with self.Session() as db:
+                player = await database.get_player_async(db, "tia")
+                return player.xp, player.learning_style
+        self.assertEqual(asyncio.run(run()), (0, "Auditory"))
+
+    def test_failed_statement_does_not_poison_the_turn(self):
+        async def run():
+            async with turn_context.begin_turn():
+                try:
+                    async with turn_context.turn_scope() as scope:
+                        scope.db.add(database.Player(username="tia"))  # duplicate username
+                        await scope.db.flush()
+                except Exception:
+                    pass  # optional DB work, like the explanation cache lookup
+                async with turn_context.turn_scope() as scope:
+                    (await scope.player("tia")).xp = 7
+            async with self.Session() as db:
+                return (await database.get_player_async(db, "tia")).xp
+        self.assertEqual(asyncio.run(run()), 7)
+
+@pytest.mark.usefixtures("temp_db")
+class TestChatTurnRoundTrips(unittest.TestCase):
+    seed_players = ("tia",)
+    seed_player_fields = {"grade_level": 3}
+    seed_progress = {"topic_name": "Math", "current_node": NODE}
+
+    def setUp(self):
+        self.sessions = 0
+        def counting_session():
+            self.sessions += 1
+            return self.Session()
+
+        self.held_during_llm = []
+        self.statements = []
+        event.listen(self.engine.sync_engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: self.statements.append(statement))
+
+        self.patches = [
+            patch.object(database, "AsyncSessionLocal", counting_session),
+            patch.object(turn_context, "AsyncSessionLocal", counting_session),
+            patch.object(main, "AsyncSessionLocal", counting_session),
+            patch.object(agent_graph, "get_llm", lambda model, **kwargs: RouteLLM(
+                "Shapes with 4 sides are quadrilaterals." if model == "gpt-4o" and not kwargs else "TEACHER", self.llm_called)),
+            patch.object(prefetch, "PREFETCH_ENABLED", False),
+        ]
+        for p in self.patches:
+            p.start()
+        interaction_log._pending.clear()
+
+        async def override_db():
+            async with counting_session() as db:
+                yield db
+        main.app.dependency_overrides[main.get_db_async] = override_db
+        main.graph = agent_graph.create_graph().compile(checkpointer=MemorySaver())
+        self.token = main.create_access_token({"sub": "tia"})
+
+        async def seed():
+            await main.graph.aupdate_state({"configurable": {"thread_id": "turn-1"}}, {
+                "topic": "Math", "username": "tia", "grade_level": "Grade 3", "messages": [],
+            })
+        asyncio.run(seed())
+
+    def llm_called(self):
+        self.held_during_llm.append(self.engine.pool.checkedout())
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        main.app.dependency_overrides.clear()
+
+    def test_teacher_turn_uses_one_session(self):
+        client = TestClient(main.app)
+        headers = {"Authorization": f"Bearer {self.token}"}
+        # First turn also builds the player's mastery rollup; measure the steady state
+        for message in ("can you explain shapes?", "explain it again please"):
+            self.sessions, self.statements[:] = 0, []
+            resp = client.post("/chat", json={"message": message, "session_id": "turn-1"}, headers=headers)
+            self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["response"], "Shapes with 4 sides are quadrilaterals.")
+
+        # The endpoint's session is the turn's session
+        self.assertEqual(self.sessions, 1)
+        selects = [s for s in self.statements if s.lstrip().upper().startswith("SELECT")]
+        players = [s for s in selects if "FROM players" in s]
+        self.assertEqual(len(players), 1)  # auth loads the player; nodes and snapshot reuse it
+        # player, progress, completed nodes (+ the rollup row if its LRU entry is gone)
+        self.assertLessEqual(len(selects), 4)
+
+        async def logged():
+            await interaction_log.flush_interactions()
+            async with self.Session() as db:
+                return await db.run_sync(lambda s: [i.source_node for i in s.query(Interaction)])
+        self.assertEqual(asyncio.run(logged()), ["supervisor", "teacher", "supervisor", "teacher"])
+
+    def test_no_connection_held_across_llm_calls(self):
+        client = TestClient(main.app)
+        headers = {"Authorization": f"Bearer {self.token}"}
+        resp = client.post("/chat", json={"message": "can you explain shapes?", "session_id": "turn-1"}, headers=headers)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(self.held_during_llm)
+        self.assertEqual(set(self.held_during_llm), {0})
+
+if __name__ == '__main__':
+    unittest.main()
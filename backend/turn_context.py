@@ -0,0 +1,149 @@
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from .database import (
+    AsyncSessionLocal, Player, TopicProgress,
+    get_player_async, get_progress_async, get_completed_nodes_async
+)
+
+# One DB session per chat turn (unit of work).
+#
+# The chat endpoints open a turn around graph.ainvoke/astream with begin_turn().
+# Nodes get it back with turn_scope() and share its session plus the Player /
+# TopicProgress rows it has already loaded, instead of each opening a session and
+# re-querying by username. AgentState carries player_id/progress_id so those rows
+# come straight from the session's identity map.
+#
+# No connection is held across an LLM call: the endpoint calls release() once
+# the rows are loaded, and every turn_scope() block ends its transaction on exit
+# (commit, or rollback if the block raised), which hands the pooled connection
+# back until the next DB section. A write transaction held open across an LLM
+# call would also lock SQLite for every other player. expire_on_commit=False
+# keeps the cached rows usable after a commit; a rollback expires them, so the
+# caches are dropped and the rows reloaded on next use.
+#
+# Outside a turn (nodes called directly, background tasks) turn_scope() opens a
+# one-off turn for the block, so nodes behave the same either way. Background
+# work started mid-turn (prefetch) must open its own turn: a session can't be
+# used by two tasks at once.
+
+_current_turn: ContextVar[Optional["TurnContext"]] = ContextVar("current_turn", default=None)
+
+class TurnContext:
+    def __init__(self, db):
+        self.db = db
+        self._players: Dict[str, Player] = {}
+        self._progress: Dict[tuple, TopicProgress] = {}
+        self._completed: Dict[int, List[str]] = {}
+
+    def remember_player(self, player: Player):
+        if player is not None:
+            self._players[player.username] = player
+
+    async def player(self, username: str) -> Optional[Player]:
+        if username not in self._players:
+            self._players[username] = await get_player_async(self.db, username)
+        return self._players[username]
+
+    async def progress(self, player_id: int, topic: str) -> Optional[TopicProgress]:
+        key = (player_id, topic)
+        if self._progress.get(key) is None:
+            self._progress[key] = await get_progress_async(self.db, player_id, topic)
+        return self._progress[key]
+
+    async def completed(self, progress_id: int) -> List[str]:
+        if progress_id not in self._completed:
+            self._completed[progress_id] = await get_completed_nodes_async(self.db, progress_id)
+        return list(self._completed[progress_id])
+
+    def forget_completed(self, progress_id: int):
+        # Call after add_completed_nodes so the next read sees the new rows
+        self._completed.pop(progress_id, None)
+
+    async def player_for(self, state) -> Optional[Player]:
+        if state.get("player_id"):
+            player = await self.db.get(Player, state["player_id"])  # identity map, no query once loaded
+            if player is not None:
+                self.remember_player(player)
+                return player
+        return await self.player(state.get("username"))
+
+    async def progress_for(self, state) -> Optional[TopicProgress]:
+        topic = state.get("topic")
+        if state.get("progress_id"):
+            prog = await self.db.get(TopicProgress, state["progress_id"])
+            # select_book can switch topic on the same thread; ignore a stale id
+            if prog is not None and prog.topic_name == topic:
+                self._progress[(prog.player_id, topic)] = prog
+                return prog
+        player = await self.player_for(state)
+        return await self.progress(player.id, topic) if player else None
+
+    async def save(self):
+        await self.db.commit()
+
+    async def release(self):
+        """Ends the open transaction so the connection goes back to the pool (before long awaits)."""
+        await self.db.commit()
+
+    async def rollback(self):
+        # A failed statement leaves the session unusable until rolled back; the
+        # rollback expires every loaded row, so forget them
+        await self.db.rollback()
+        self._players.clear()
+        self._progress.clear()
+        self._completed.clear()
+
+    def ids(self, state) -> dict:
+        """player_id/progress_id for AgentState from rows this turn has loaded."""
+        out = {}
+        player = self._players.get(state.get("username"))
+        if player is not None:
+            out["player_id"] = player.id
+            prog = self._progress.get((player.id, state.get("topic")))
+            if prog is not None:
+                out["progress_id"] = prog.id
+        return out
+
+@asynccontextmanager
+async def begin_turn(db=None, player: Player = None):
+    """
+    Binds a turn for the duration of the block. Pass the endpoint's session (and
+    the authenticated player, already loaded on it) or let it open one.
+    """
+    own_session = db is None
+    if own_session:
+        db = AsyncSessionLocal()
+    turn = TurnContext(db)
+    turn.remember_player(player)
+    token = _current_turn.set(turn)
+    try:
+        yield turn
+        await db.commit()
+    except BaseException:
+        await turn.rollback()
+        raise
+    finally:
+        _current_turn.reset(token)
+        if own_session:
+            await db.close()
+
+@asynccontextmanager
+async def turn_scope():
+    """
+    The current turn, or a one-off turn with its own session outside of one.
+    Either way the block's transaction ends with it (see above).
+    """
+    turn = _current_turn.get()
+    if turn is not None:
+        try:
+            yield turn
+        except BaseException:
+            await turn.rollback()
+            raise
+        await turn.release()
+        return
+    async with AsyncSessionLocal() as db:
+        yield TurnContext(db)
+        await db.commit()